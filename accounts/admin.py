@@ -1,6 +1,7 @@
 # accounts/admin.py
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from membres.onboarding import resend_activation_links
 from .models import User
 
 @admin.register(User)
@@ -23,7 +24,7 @@ class UserAdmin(BaseUserAdmin):
     fieldsets = (
         (None, {'fields': ('username', 'password')}),
         ('Informations personnelles', {'fields': ('first_name', 'last_name', 'email', 'phone', 'role', 'is_active_membre')}),
-        ('Permissions', {'fields': ('is_active', 'is_staff', 'is_superuser', 'groups', 'user_permissions')}),
+        ('Permissions', {'fields': ('is_active', 'must_change_password', 'is_staff', 'is_superuser', 'groups', 'user_permissions')}),
         ('Dates importantes', {'fields': ('last_login', 'created_at', 'updated_at')}),
     )
     
@@ -34,9 +35,23 @@ class UserAdmin(BaseUserAdmin):
     add_fieldsets = (
         (None, {
             'classes': ('wide',),
-            'fields': ('username', 'email', 'first_name', 'last_name', 'phone', 'role', 'password1', 'password2', 'is_active', 'is_active_membre')
+            'fields': ('username', 'email', 'first_name', 'last_name', 'phone', 'role', 'password1', 'password2', 'must_change_password', 'is_active', 'is_active_membre')
         }),
     )
     
     ordering = ('username',)
     filter_horizontal = ('groups', 'user_permissions',)
+    actions = ['resend_activation']
+
+    @admin.action(description="Renvoyer le lien d'activation")
+    def resend_activation(self, request, queryset):
+        # Lien expiré (PASSWORD_RESET_TIMEOUT) : seuls les comptes jamais activés sont concernés
+        sent = resend_activation_links(queryset)
+        skipped = len(queryset) - sent
+        self.message_user(request, f"{sent} lien(s) d'activation envoyé(s).", messages.SUCCESS)
+        if skipped:
+            self.message_user(
+                request,
+                f"{skipped} compte(s) ignoré(s) : déjà activé, inactif ou sans email.",
+                messages.WARNING,
+            )
@@ -0,0 +1,11 @@
+from django.utils.functional import SimpleLazyObject
+
+from .permissions import get_permissions
+
+
+def access(request):
+    """
+    Droits de l'utilisateur dans tous les gabarits : {% if access.finance %}.
+    Paresseux : une page qui ne les lit pas ne charge pas l'utilisateur.
+    """
+    return {'access': SimpleLazyObject(lambda: get_permissions(request.user))}
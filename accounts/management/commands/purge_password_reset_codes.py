@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts.models import PasswordResetCode
+
+
+class Command(BaseCommand):
+    help = "Supprime les codes de réinitialisation expirés (à planifier, ex. toutes les heures)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=0,
+                            help="Ne supprime que les codes expirés depuis plus de N minutes")
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(minutes=options['older_than'])
+        deleted = PasswordResetCode.purge_expired(before)
+        self.stdout.write(f"{deleted} code(s) expiré(s) supprimé(s)")
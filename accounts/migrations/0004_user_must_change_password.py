@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-19 12:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_alter_passwordresetcode_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='must_change_password',
+            field=models.BooleanField(default=False, verbose_name='Changement de mot de passe obligatoire'),
+        ),
+    ]
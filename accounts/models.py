@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils.functional import cached_property
 
 class User(AbstractUser):
     ROLE_CHOICES = [
@@ -35,6 +36,10 @@ class User(AbstractUser):
         verbose_name="Dernière modification"  # Corrigé l'accent
     )
     is_validated = models.BooleanField(default=False, verbose_name="Compte validé")
+    must_change_password = models.BooleanField(
+        default=False,
+        verbose_name="Changement de mot de passe obligatoire"
+    )
 
     class Meta:
         verbose_name = "Utilisateur"
@@ -43,23 +48,28 @@ class User(AbstractUser):
     def __str__(self):
         return f"{self.get_full_name()} - {self.get_role_display()}"
 
+    @cached_property
+    def permissions(self):
+        """Droits du rôle (accounts.permissions), calculés une fois par requête"""
+        from .permissions import Permissions
+        return Permissions(self)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Rôle ou statut superutilisateur modifié : droits recalculés au prochain accès
+        self.__dict__.pop('permissions', None)
+
     # Vérifie si l'utilisateur a accès admin
     def has_admin_access(self):
-        if self.is_superuser:  # Superuser Django natif
-            return True
-        return self.role in ['admin']
+        return self.permissions.admin
 
     # Vérifie si l'utilisateur a accès finance
     def has_finance_access(self):
-        if self.is_superuser:
-            return True
-        return self.role in ['admin', 'treasurer']
+        return self.permissions.finance
 
     # Vérifie si l'utilisateur peut gérer les membres (corrigé le nom)
     def has_membres_management_access(self):
-        if self.is_superuser:
-            return True
-        return self.role in ['admin', 'secretary', 'leader']
+        return self.permissions.membres
     
 
 # models.py
@@ -95,6 +105,12 @@ class PasswordResetCode(models.Model):
             self.expires_at = timezone.now() + timedelta(minutes=10)
         super().save(*args, **kwargs)
 
+    @classmethod
+    def purge_expired(cls, before=None):
+        """Supprime les codes expirés avant `before` (maintenant par défaut), en une requête sur l'index expires_at"""
+        deleted, _ = cls.objects.filter(expires_at__lt=before or timezone.now()).delete()
+        return deleted
+
     def is_expired(self):
         return timezone.now() > self.expires_at
 
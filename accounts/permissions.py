@@ -0,0 +1,122 @@
+"""
+Droits d'accès par rôle, calculés une fois par requête.
+
+Trois accès, chacun ouvert à une liste de rôles (superutilisateur : tous) :
+- 'admin'   : administration de l'église, événements, paramètres, comptes
+- 'finance' : transactions, budgets, tableau de bord financier
+- 'membres' : gestion des membres, groupes, ministères, familles
+
+    @require_role('finance')
+    def transaction_list(request): ...
+
+    class EventUpdate(RoleRequiredMixin, UpdateView):
+        required_roles = ('admin',)
+
+    {% if access.finance %} ... {% endif %}
+
+Les droits sont mémorisés sur l'utilisateur (User.permissions) : il est
+chargé une fois par requête, les vues et les gabarits lisent ensuite de
+simples attributs.
+"""
+import asyncio
+from functools import wraps
+
+from django.contrib import messages
+from django.contrib.auth.views import redirect_to_login
+from django.http import JsonResponse
+from django.shortcuts import redirect
+
+ROLE_ACCESS = {
+    'admin': ('admin',),
+    'finance': ('admin', 'treasurer'),
+    'membres': ('admin', 'secretary', 'leader'),
+}
+
+DENIED_MESSAGE = "Vous n'avez pas l'autorisation d'accéder à cette page."
+
+
+class Permissions:
+    """Accès d'un utilisateur : attributs admin, finance, membres et role"""
+
+    __slots__ = ('role', 'is_authenticated', 'admin', 'finance', 'membres')
+
+    def __init__(self, user):
+        self.is_authenticated = user.is_authenticated
+        self.role = getattr(user, 'role', None) if self.is_authenticated else None
+        superuser = self.is_authenticated and user.is_superuser
+        for access, roles in ROLE_ACCESS.items():
+            setattr(self, access, superuser or self.role in roles)
+
+    def has(self, *accesses):
+        """Vrai si l'utilisateur a au moins un des accès donnés"""
+        unknown = set(accesses) - set(ROLE_ACCESS)
+        if unknown:
+            raise ValueError(f"Accès inconnu : {', '.join(sorted(unknown))}")
+        return any(getattr(self, access) for access in accesses)
+
+    def __repr__(self):
+        granted = [access for access in ROLE_ACCESS if getattr(self, access)]
+        return f"<Permissions {self.role or 'anonyme'}: {', '.join(granted) or 'aucun accès'}>"
+
+
+def get_permissions(user):
+    """Droits de `user`, y compris un visiteur anonyme"""
+    permissions = getattr(user, 'permissions', None)
+    return permissions if permissions is not None else Permissions(user)
+
+
+def _denied(request, message, redirect_to, json):
+    if json:
+        return JsonResponse({'error': 'Non autorisé'}, status=403)
+    messages.error(request, message)
+    return redirect(redirect_to)
+
+
+def require_role(*accesses, redirect_to='dashboard', message=DENIED_MESSAGE, json=False):
+    """
+    Réserve une vue (synchrone ou async) aux utilisateurs connectés ayant
+    l'un des accès donnés ; remplace @login_required. Un visiteur anonyme
+    est renvoyé vers la connexion, un utilisateur sans droit vers
+    `redirect_to` avec `message` (ou reçoit un 403 JSON si json=True).
+    Sans accès, la vue est ouverte à tout utilisateur connecté.
+    """
+    unknown = set(accesses) - set(ROLE_ACCESS)
+    if unknown:
+        raise ValueError(f"Accès inconnu : {', '.join(sorted(unknown))}")
+
+    def decorator(view_func):
+        if asyncio.iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def wrapper(request, *args, **kwargs):
+                user = await request.auser()
+                if not user.is_authenticated:
+                    return redirect_to_login(request.get_full_path())
+                request.user = user
+                if accesses and not get_permissions(user).has(*accesses):
+                    return _denied(request, message, redirect_to, json)
+                return await view_func(request, *args, **kwargs)
+        else:
+            @wraps(view_func)
+            def wrapper(request, *args, **kwargs):
+                if not request.user.is_authenticated:
+                    return redirect_to_login(request.get_full_path())
+                if accesses and not get_permissions(request.user).has(*accesses):
+                    return _denied(request, message, redirect_to, json)
+                return view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class RoleRequiredMixin:
+    """Équivalent de @require_role pour les vues classes"""
+
+    required_roles = ('admin',)
+    permission_denied_url = 'dashboard'
+    permission_denied_message = DENIED_MESSAGE
+
+    def dispatch(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        if not get_permissions(request.user).has(*self.required_roles):
+            return _denied(request, self.permission_denied_message, self.permission_denied_url, False)
+        return super().dispatch(request, *args, **kwargs)
@@ -0,0 +1,12 @@
+from django.contrib.auth.signals import user_logged_in
+from django.dispatch import receiver
+
+# Lu par membres.middleware.ForcePasswordChangeMiddleware : aucune requête par page
+MUST_CHANGE_PASSWORD_SESSION_KEY = 'must_change_password'
+
+
+@receiver(user_logged_in)
+def remember_password_change(sender, request, user, **kwargs):
+    """Note en session, à la connexion, que l'utilisateur doit changer son mot de passe"""
+    if request is not None and getattr(user, 'must_change_password', False):
+        request.session[MUST_CHANGE_PASSWORD_SESSION_KEY] = True
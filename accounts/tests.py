@@ -1,3 +1,248 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from membres.middleware import ForcePasswordChangeMiddleware
+from membres.models import Member
+from membres.onboarding import activation_link
+from notifications.models import OutboundEmail
+from .models import PasswordResetCode, User
+from .permissions import ROLE_ACCESS, get_permissions
+from .signals import MUST_CHANGE_PASSWORD_SESSION_KEY
+
+
+@override_settings(EMAIL_OUTBOX_DISPATCH='worker', SITE_URL='')
+class AccountActivationTests(TestCase):
+    def setUp(self):
+        self.member = Member.objects.create(
+            first_name='Awa', last_name='Moussa', gender='F', date_of_birth='1990-01-01',
+            marital_status='single', address='Niamey', email='awa@example.com',
+        )
+        self.user = self.member.user
+
+    def test_member_account_created_without_password_hash(self):
+        self.assertIsNotNone(self.user)
+        self.assertFalse(self.user.has_usable_password())
+        email = OutboundEmail.objects.get(to=['awa@example.com'])
+        self.assertIn(activation_link(self.user), email.body)
+
+    def test_activation_link_sets_password_once(self):
+        link = activation_link(self.user)
+        response = self.client.get(link)
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.post(link, {'password1': 'NouveauMdp123', 'password2': 'NouveauMdp123'})
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('NouveauMdp123'))
+
+        # Le jeton dépend du mot de passe : le lien ne sert qu'une fois
+        self.client.logout()
+        response = self.client.get(link)
+        self.assertRedirects(response, reverse('accounts:login'), fetch_redirect_response=False)
+
+    def test_admin_resends_activation_link(self):
+        activated = User.objects.create_user(username='actif', password='secret', email='actif@example.com')
+        admin_user = User.objects.create_superuser(username='root', password='secret', email='root@example.com')
+        self.client.force_login(admin_user)
+        response = self.client.post(reverse('admin:accounts_user_changelist'), {
+            'action': 'resend_activation',
+            '_selected_action': [self.user.pk, activated.pk],
+        })
+        self.assertEqual(response.status_code, 302)
+        emails = OutboundEmail.objects.filter(to=['awa@example.com'])
+        self.assertEqual(emails.count(), 2)  # bienvenue + nouveau lien
+        self.assertIn(activation_link(self.user), emails.latest('pk').body)
+        self.assertFalse(OutboundEmail.objects.filter(to=['actif@example.com']).exists())
+
+    def test_invalid_token_is_rejected(self):
+        response = self.client.get(reverse('accounts:activate', args=['MQ', 'jeton-invalide']))
+        self.assertRedirects(response, reverse('accounts:login'), fetch_redirect_response=False)
+        self.assertFalse(User.objects.get(pk=self.user.pk).has_usable_password())
+
+
+class PermissionTests(TestCase):
+    """Droits par rôle, calculés une fois et vérifiés par @require_role"""
+
+    def setUp(self):
+        self.users = {
+            role: User.objects.create_user(username=role, password='secret', role=role)
+            for role, _ in User.ROLE_CHOICES
+        }
+        self.member = Member.objects.create(
+            first_name='Awa', last_name='Moussa', gender='F', date_of_birth='1990-01-01',
+            marital_status='single', address='Niamey',
+        )
+
+    def test_access_by_role(self):
+        granted = {
+            role: [access for access in ROLE_ACCESS if getattr(user.permissions, access)]
+            for role, user in self.users.items()
+        }
+        self.assertEqual(granted, {
+            'admin': ['admin', 'finance', 'membres'],
+            'secretary': ['membres'],
+            'treasurer': ['finance'],
+            'leader': ['membres'],
+            'membre': [],
+        })
+        superuser = User.objects.create_superuser(username='root', password='secret', role='membre')
+        self.assertTrue(superuser.permissions.has('admin'))
+
+    def test_permissions_computed_once_per_user(self):
+        user = self.users['treasurer']
+        self.assertIs(user.permissions, user.permissions)
+        user.role = 'admin'
+        user.save()
+        self.assertTrue(user.has_admin_access())
+
+    def test_anonymous_has_no_access(self):
+        permissions = get_permissions(AnonymousUser())
+        self.assertFalse(permissions.has('admin', 'finance', 'membres'))
+        with self.assertRaises(ValueError):
+            permissions.has('tresorerie')
+
+    def test_anonymous_redirected_to_login(self):
+        url = reverse('finance:transaction_list')
+        response = self.client.get(url)
+        self.assertRedirects(response, f"{reverse('accounts:login')}?next={url}", fetch_redirect_response=False)
+
+    def test_missing_role_redirected_with_message(self):
+        self.client.force_login(self.users['secretary'])
+        response = self.client.get(reverse('finance:transaction_list'))
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+        self.assertIn("Vous n'avez pas l'autorisation d'accéder aux finances.",
+                      [message.message for message in get_messages(response.wsgi_request)])
+
+    def test_json_endpoint_returns_403(self):
+        self.client.force_login(self.users['treasurer'])
+        response = self.client.get(reverse('events:whatsapp_audience', args=[1]))
+        self.assertEqual(response.status_code, 403)
+
+    def test_secretary_can_delete_member(self):
+        # Auparavant : has_member_management_access() n'existait pas (erreur 500)
+        self.client.force_login(self.users['secretary'])
+        response = self.client.post(reverse('membres:delete', args=[self.member.pk]))
+        self.assertRedirects(response, reverse('membres:list'), fetch_redirect_response=False)
+        self.assertFalse(Member.objects.filter(pk=self.member.pk).exists())
+
+    def test_templates_receive_access(self):
+        self.client.force_login(self.users['treasurer'])
+        response = self.client.get(reverse('accounts:profile'))
+        self.assertTrue(response.context['access'].finance)
+        self.assertFalse(response.context['access'].admin)
+
+
+class ForcePasswordChangeTests(TestCase):
+    """Changement de mot de passe obligatoire : drapeau lu en session, pas en base"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='nouveau', password='Provisoire123', role='membre', must_change_password=True,
+        )
+
+    def test_flagged_user_redirected_until_password_changed(self):
+        self.client.force_login(self.user)
+        self.assertTrue(self.client.session[MUST_CHANGE_PASSWORD_SESSION_KEY])
+        change_url = reverse('accounts:change_password')
+        response = self.client.get(reverse('accounts:profile'))
+        self.assertRedirects(response, change_url, fetch_redirect_response=False)
+        self.assertEqual(self.client.get(change_url).status_code, 200)
+
+        response = self.client.post(change_url, {
+            'old_password': 'Provisoire123',
+            'new_password1': 'NouveauMdp123!',
+            'new_password2': 'NouveauMdp123!',
+        })
+        self.assertRedirects(response, reverse('accounts:profile'), fetch_redirect_response=False)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.must_change_password)
+        self.assertNotIn(MUST_CHANGE_PASSWORD_SESSION_KEY, self.client.session)
+        self.assertEqual(self.client.get(reverse('accounts:profile')).status_code, 200)
+
+    def test_logout_and_static_paths_allowed(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('accounts:logout'))
+        self.assertRedirects(response, reverse('accounts:login'), fetch_redirect_response=False)
+
+        middleware = ForcePasswordChangeMiddleware(lambda request: None)
+        request = RequestFactory().get(f"/{settings.STATIC_URL.lstrip('/')}css/app.css")
+        request.session = {MUST_CHANGE_PASSWORD_SESSION_KEY: True}
+        self.assertIsNone(middleware.process_view(request, None, (), {}))
+
+    def test_unflagged_request_does_not_load_user(self):
+        middleware = ForcePasswordChangeMiddleware(lambda request: None)
+        request = RequestFactory().get(reverse('accounts:profile'))
+        request.session = {}
+        # Pas de request.user : le middleware ne doit ni le lire ni interroger la base
+        with self.assertNumQueries(0):
+            self.assertIsNone(middleware.process_view(request, None, (), {}))
+
+
+class RateLimitTests(TestCase):
+    """Connexion et réinitialisation limitées par IP et par compte, avant la base"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='awa', password='secret', email='awa@example.com', role='membre',
+        )
+
+    def test_login_throttled_after_failed_attempts(self):
+        url = reverse('accounts:login')
+        for _ in range(5):
+            response = self.client.post(url, {'username': 'awa', 'password': 'mauvais'})
+            self.assertEqual(response.status_code, 200)
+        # Même le bon mot de passe est refusé, sans requête en base
+        with self.assertNumQueries(0):
+            response = self.client.post(url, {'username': 'awa', 'password': 'secret'})
+        self.assertEqual(response.status_code, 429)
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+    def test_successful_login_clears_account_attempts(self):
+        url = reverse('accounts:login')
+        for _ in range(4):
+            self.client.post(url, {'username': 'awa', 'password': 'mauvais'})
+        self.client.post(url, {'username': 'awa', 'password': 'secret'})
+        self.client.logout()
+        response = self.client.post(url, {'username': 'awa', 'password': 'mauvais'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_password_reset_request_throttled_by_email(self):
+        url = reverse('accounts:password_reset_request')
+        for _ in range(3):
+            self.client.post(url, {'email': 'awa@example.com'})
+        self.client.cookies.clear()  # script sans session : rien n'est lu en base
+        with self.assertNumQueries(0):
+            response = self.client.post(url, {'email': 'AWA@example.com'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(PasswordResetCode.objects.filter(user=self.user).count(), 1)
+
+    def test_password_reset_verify_throttled_per_code(self):
+        self.client.post(reverse('accounts:password_reset_request'), {'email': 'awa@example.com'})
+        url = reverse('accounts:password_reset_verify')
+        for _ in range(5):
+            self.client.post(url, {'code': '000000'})
+        response = self.client.post(url, {'code': PasswordResetCode.objects.get().code})
+        self.assertEqual(response.status_code, 429)
+        self.assertNotIn('reset_user_id', self.client.session)
+
+    def test_purge_expired_codes(self):
+        now = timezone.now()
+        PasswordResetCode.objects.create(user=self.user, code='111111', expires_at=now - timedelta(hours=2))
+        PasswordResetCode.objects.create(user=self.user, code='222222', expires_at=now - timedelta(minutes=5))
+        fresh = PasswordResetCode.objects.create(user=self.user, code='333333')
+
+        out = StringIO()
+        call_command('purge_password_reset_codes', '--older-than', '60', stdout=out)
+        self.assertIn('1 code(s)', out.getvalue())
+        self.assertEqual(PasswordResetCode.purge_expired(), 1)
+        self.assertEqual(list(PasswordResetCode.objects.all()), [fresh])
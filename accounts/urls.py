@@ -20,5 +20,7 @@ urlpatterns = [
     path('password-reset/', views.password_reset_request, name='password_reset_request'),
     path('password-reset/verify/', views.password_reset_verify, name='password_reset_verify'),
     path('password-reset/new/', views.password_reset_new_password, name='password_reset_new_password'),
+
+    path('activate/<uidb64>/<token>/', views.activate_account, name='activate'),
 ]
 
@@ -5,6 +5,8 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
 from django.urls import reverse, reverse_lazy
 from django.contrib.auth.decorators import login_required
+from .permissions import require_role
+from .signals import MUST_CHANGE_PASSWORD_SESSION_KEY
 from django.views.generic import CreateView
 from .forms import CustomUserCreationForm, LoginForm, PasswordResetCodeForm, PasswordResetEmailForm, UserProfileForm, NewPasswordForm
 import membres
@@ -12,9 +14,20 @@ from .models import PasswordResetCode, User
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib.auth import update_session_auth_hash
 from django.core.mail import send_mail
+from apps import ratelimit
+
+
+THROTTLED_MESSAGE = "Trop de tentatives. Veuillez réessayer dans quelques minutes."
 
 
 def login_views(request):
+    # Rafale de tentatives : refusée avant toute lecture en base (session, utilisateur)
+    if request.method == 'POST' and ratelimit.is_limited(
+            'login', request, account=request.POST.get('username')):
+        messages.error(request, THROTTLED_MESSAGE)
+        return render(request, 'accounts/login.html',
+                      {'form': LoginForm(request.POST), 'title': 'Connexion'}, status=429)
+
     # Si l'utilisateur est déjà connecté
     if request.user.is_authenticated:
         if request.user.has_admin_access():
@@ -30,6 +43,7 @@ def login_views(request):
             user = authenticate(request, username=username, password=password)
 
             if user is not None:
+                ratelimit.clear('login', username)
                 login(request, user)
                 messages.success(request, f'Bienvenue {user.get_full_name() or user.username}')
 
@@ -47,6 +61,7 @@ def login_views(request):
                 else:
                     return redirect('accounts:profile')
             else:
+                ratelimit.record('login', request, account=username)
                 messages.error(request, "Nom d'utilisateur ou mot de passe incorrect.")
         else:
             messages.error(request, "Formulaire invalide. Veuillez vérifier vos informations.")
@@ -117,8 +132,11 @@ def change_password_views(request):
     if request.method == 'POST':
         form = PasswordChangeForm(request.user, request.POST)
         if form.is_valid():
-            user = form.save()
+            user = form.save(commit=False)
+            user.must_change_password = False
+            user.save()
             update_session_auth_hash(request, user)  # évite la déconnexion
+            request.session.pop(MUST_CHANGE_PASSWORD_SESSION_KEY, None)
             messages.success(request, 'Votre mot de passe a été mis à jour avec succès.')
             return redirect('accounts:profile')
         else:
@@ -134,13 +152,9 @@ def change_password_views(request):
     return render(request, 'accounts/change_password.html', context)
 
 
-@login_required
+@require_role('admin', message="Vous n'avez pas la permission d'accéder à cette page.")
 def user_list_view(request):
     """Vue pour lister les utilisateurs"""
-    if not request.user.has_admin_access():
-        messages.error(request, "Vous n'avez pas la permission d'accéder à cette page.")
-        return redirect('dashboard')
-
     users = User.objects.all().order_by('-created_at')
 
     # Comptages par rôle
@@ -162,13 +176,9 @@ def user_list_view(request):
 
 
 
-@login_required
+@require_role('admin', message="Vous n'avez pas la permission d'accéder à cette page.")
 def toggle_user_status(request, user_id):
     """Vue pour activer/désactiver un utilisateur"""
-    if not request.user.has_admin_access():
-        messages.error(request, 'Vous n\'avez pas la permission d\'accéder à cette page.')
-        return redirect('dashboard:home')
-    
     try:
         user = User.objects.get(id=user_id)
         if user != request.user:
@@ -185,13 +195,9 @@ def toggle_user_status(request, user_id):
     return redirect('accounts:user_list')
 
 
-@login_required
+@require_role('admin', message="Vous n'avez pas la permission d'accéder à cette page.")
 def assign_role(request, user_id):
     """Attribuer un rôle à un utilisateur (admin uniquement)"""
-    if not request.user.has_admin_access():
-        messages.error(request, "Vous n'avez pas la permission d'accéder à cette page.")
-        return redirect('dashboard')
-
     user = get_object_or_404(User, id=user_id)
 
     if request.method == 'POST':
@@ -207,12 +213,9 @@ def assign_role(request, user_id):
 
 
 
+@require_role('admin', message="Vous n'avez pas la permission d'accéder à cette page.")
 def validate_user(request, user_id):
     """Valider ou rejeter un compte utilisateur"""
-    if not request.user.has_admin_access():
-        messages.error(request, "Vous n'avez pas la permission d'accéder à cette page.")
-        return redirect('dashboard')
-
     user = get_object_or_404(User, id=user_id)
 
     action = request.GET.get('action')  # 'validate' ou 'reject'
@@ -237,9 +240,12 @@ from django.contrib import messages
 from django.contrib.auth import get_user_model, login
 from django.contrib.auth.hashers import make_password
 from django.shortcuts import render, redirect, get_object_or_404
-from django.core.mail import send_mail
 from django.utils import timezone
 from django.urls import reverse
+from django.contrib.auth.tokens import default_token_generator
+from django.utils.encoding import force_str
+from django.utils.http import urlsafe_base64_decode
+from notifications.outbox import queue_email
 from .models import PasswordResetCode
 
 
@@ -248,8 +254,13 @@ User = get_user_model()
 def password_reset_request(request):
     if request.method == "POST":
         form = PasswordResetEmailForm(request.POST)
+        # Chaque demande écrit un code et envoie un email : limitée par IP et par adresse
+        if ratelimit.is_limited('password_reset', request, account=request.POST.get('email')):
+            messages.error(request, THROTTLED_MESSAGE)
+            return render(request, "accounts/password_reset_email.html", {"form": form}, status=429)
         if form.is_valid():
             email = form.cleaned_data["email"]
+            ratelimit.record('password_reset', request, account=email)
             users = User.objects.filter(email=email, is_active=True)
 
             if users.exists():
@@ -264,13 +275,12 @@ def password_reset_request(request):
                     code=code
                 )
 
-                # Envoyer l'email
-                send_mail(
+                # Email mis en file : envoyé après la réponse
+                queue_email(
                     subject="Code de réinitialisation de mot de passe",
-                    message=f"Votre code de vérification est : {code}\nValable 10 minutes.",
+                    body=f"Votre code de vérification est : {code}\nValable 10 minutes.",
+                    to=[user.email],
                     from_email="noreply@egliselagrace.com",
-                    recipient_list=[user.email],
-                    fail_silently=False,
                 )
 
                 # Stocker le token dans la session (pas le code !)
@@ -291,6 +301,12 @@ def password_reset_verify(request):
         messages.error(request, "Session expirée. Veuillez recommencer.")
         return redirect('accounts:password_reset_request')
 
+    # Codes essayés en rafale : refusés avant la lecture du code en base
+    if request.method == "POST" and ratelimit.is_limited('password_reset_verify', request, account=token):
+        messages.error(request, THROTTLED_MESSAGE)
+        return render(request, "accounts/password_reset_verify.html",
+                      {"form": PasswordResetCodeForm(request.POST)}, status=429)
+
     try:
         reset_code = PasswordResetCode.objects.get(token=token)
     except PasswordResetCode.DoesNotExist:
@@ -303,6 +319,7 @@ def password_reset_verify(request):
 
     if request.method == "POST":
         form = PasswordResetCodeForm(request.POST)
+        ratelimit.record('password_reset_verify', request, account=token)
         if form.is_valid():
             input_code = form.cleaned_data['code']
             if input_code == reset_code.code:
@@ -337,6 +354,7 @@ def password_reset_new_password(request):
         form = NewPasswordForm(request.POST)
         if form.is_valid():
             user.password = make_password(form.cleaned_data['password1'])
+            user.must_change_password = False
             user.save()
             del request.session['reset_user_id']
             messages.success(request, "Mot de passe réinitialisé avec succès !")
@@ -345,4 +363,30 @@ def password_reset_new_password(request):
     else:
         form = NewPasswordForm()
 
-    return render(request, "accounts/password_reset_new.html", {"form": form})
\ No newline at end of file
+    return render(request, "accounts/password_reset_new.html", {"form": form})
+
+def activate_account(request, uidb64, token):
+    """Activation d'un compte créé sans mot de passe : le membre choisit le sien"""
+    try:
+        user = User.objects.get(pk=force_str(urlsafe_base64_decode(uidb64)))
+    except (TypeError, ValueError, OverflowError, User.DoesNotExist):
+        user = None
+
+    # Le jeton dépend du mot de passe : il devient invalide une fois utilisé
+    if user is None or not default_token_generator.check_token(user, token):
+        messages.error(request, "Ce lien d'activation est invalide ou a déjà été utilisé.")
+        return redirect('accounts:login')
+
+    if request.method == "POST":
+        form = NewPasswordForm(request.POST)
+        if form.is_valid():
+            user.set_password(form.cleaned_data['password1'])
+            user.must_change_password = False
+            user.save()
+            messages.success(request, "Compte activé ! Bienvenue.")
+            login(request, user)
+            return redirect('dashboard')
+    else:
+        form = NewPasswordForm()
+
+    return render(request, "accounts/activate_account.html", {"form": form, "account": user})
@@ -0,0 +1,13 @@
+from django.apps import AppConfig
+
+
+class ProjectConfig(AppConfig):
+    """Modules communs du projet (apps/) : réglages de connexion à la base"""
+    name = 'apps'
+    verbose_name = "Projet"
+
+    def ready(self):
+        from . import database
+
+        # Pragmas SQLite et vérifications des réglages de connexion
+        database.connect_database_signals()
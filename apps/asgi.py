@@ -3,6 +3,14 @@ ASGI config for apps project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Servi en ASGI, le projet utilise les vues async des tableaux de bord
+(ASYNC_VIEWS, voir apps/fanout.py) : leurs agrégats indépendants partent
+en parallèle au lieu de s'enchaîner.
+
+    gunicorn apps.asgi:application -k uvicorn.workers.UvicornWorker -w 4
+
+Le déploiement WSGI (apps.wsgi) garde les vues synchrones.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -12,5 +20,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'apps.settings')
+os.environ.setdefault('ASYNC_VIEWS', 'true')
 
 application = get_asgi_application()
@@ -0,0 +1,397 @@
+"""
+Suite de benchmarks : chronomètre les vues et services clés sur la base courante.
+
+Chaque benchmark est une fonction enregistrée avec @benchmark('nom') qui reçoit
+un BenchmarkContext et exécute l'opération une fois. Le lanceur (commande
+run_benchmarks) la répète et mesure temps et nombre de requêtes SQL.
+
+Les benchmarks « load: » envoient des requêtes simultanées : seules les
+requêtes SQL du thread principal sont comptées, le temps est celui du lot.
+"""
+import statistics
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """Enregistre une fonction dans la suite de benchmarks"""
+    def decorator(func):
+        BENCHMARKS[name] = func
+        return func
+    return decorator
+
+
+class BenchmarkContext:
+    """Client authentifié et objets d'exemple partagés par les benchmarks"""
+
+    def __init__(self):
+        from accounts.models import User
+        from membres.models import Member
+        from events.models import Event
+        from finance.models import FinancialTransaction, Budget
+
+        self.user, _ = User.objects.get_or_create(
+            username='benchmark-admin',
+            defaults={'role': 'admin', 'first_name': 'Benchmark', 'last_name': 'Admin'},
+        )
+        host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost'
+        self.client = Client(HTTP_HOST=host)
+        self.client.force_login(self.user)
+
+        self.member = Member.objects.order_by('pk').first()
+        # L'événement le plus fréquenté : le pire cas pour les pages de détail
+        self.event = Event.objects.annotate(
+            attendance_count=Count('attendances')
+        ).order_by('-attendance_count', 'pk').first()
+        self.transaction = FinancialTransaction.objects.order_by('pk').first()
+        self.budget = Budget.objects.order_by('-year', '-month').first()
+
+    def get(self, url):
+        response = self.client.get(url)
+        if getattr(response, 'streaming', False):
+            b''.join(response.streaming_content)
+        if response.status_code != 200:
+            raise RuntimeError(f'{url} a répondu {response.status_code}')
+        return response
+
+
+# ----------------------------------------------------------------------
+# Vues
+# ----------------------------------------------------------------------
+@benchmark('view:dashboard')
+def bench_dashboard(ctx):
+    """Fragments en cache (régime normal : le tour d'échauffement les remplit)"""
+    ctx.get(reverse('dashboard'))
+
+
+@benchmark('view:dashboard_cold')
+def bench_dashboard_cold(ctx):
+    """Fragments périmés avant chaque rendu : tous les widgets sont recalculés"""
+    from .fragments import bump_fragment_version
+
+    bump_fragment_version()
+    ctx.get(reverse('dashboard'))
+
+
+@benchmark('view:member_list')
+def bench_member_list(ctx):
+    ctx.get(reverse('membres:list'))
+
+
+@benchmark('view:member_detail')
+def bench_member_detail(ctx):
+    ctx.get(reverse('membres:detail', args=[ctx.member.pk]))
+
+
+@benchmark('view:group_list')
+def bench_group_list(ctx):
+    ctx.get(reverse('membres:group_list'))
+
+
+@benchmark('view:family_list')
+def bench_family_list(ctx):
+    ctx.get(reverse('membres:family_list'))
+
+
+@benchmark('view:transaction_list')
+def bench_transaction_list(ctx):
+    ctx.get(reverse('finance:transaction_list'))
+
+
+@benchmark('view:finance_dashboard')
+def bench_finance_dashboard(ctx):
+    ctx.get(reverse('finance:dashboard'))
+
+
+@benchmark('view:event_list')
+def bench_event_list(ctx):
+    ctx.get(reverse('events:event_list'))
+
+
+@benchmark('view:event_detail')
+def bench_event_detail(ctx):
+    ctx.get(reverse('events:event_detail', args=[ctx.event.slug]))
+
+
+@benchmark('view:event_detail_cold')
+def bench_event_detail_cold(ctx):
+    from .fragments import bump_fragment_version
+
+    bump_fragment_version('events', 'attendances')
+    ctx.get(reverse('events:event_detail', args=[ctx.event.slug]))
+
+
+@benchmark('view:attendance_list')
+def bench_attendance_list(ctx):
+    ctx.get(reverse('events:attendance_list', args=[ctx.event.pk]))
+
+
+# ----------------------------------------------------------------------
+# Exports et services
+# ----------------------------------------------------------------------
+@benchmark('export:members_csv')
+def bench_export_csv(ctx):
+    ctx.get(reverse('membres:export') + '?format=csv')
+
+
+@benchmark('export:members_pdf')
+def bench_export_pdf(ctx):
+    ctx.get(reverse('membres:export') + '?format=pdf')
+
+
+@benchmark('export:attendance_csv')
+def bench_attendance_export(ctx):
+    ctx.get(reverse('events:attendance_export', args=[ctx.event.pk]))
+
+
+@benchmark('service:member_card')
+def bench_member_card(ctx):
+    from membres.utils import generate_member_card
+
+    generate_member_card(ctx.member, include_photo=True, include_qr=True)
+
+
+@benchmark('service:transaction_receipt')
+def bench_transaction_receipt(ctx):
+    ctx.get(reverse('finance:transaction_receipt', args=[ctx.transaction.pk]))
+
+
+@benchmark('service:budget_report')
+def bench_budget_report(ctx):
+    ctx.budget.generate_report_data()
+
+
+# ----------------------------------------------------------------------
+# Connexions à la base
+# ----------------------------------------------------------------------
+def _with_conn_max_age(conn_max_age, func):
+    """
+    Exécute func avec une durée de vie de connexion donnée : 0 reproduit
+    l'ouverture d'une connexion par requête (fermée en fin de requête)
+    """
+    settings_dict = connection.settings_dict
+    previous = settings_dict['CONN_MAX_AGE']
+    settings_dict['CONN_MAX_AGE'] = conn_max_age
+    connection.close()
+    try:
+        func()
+    finally:
+        settings_dict['CONN_MAX_AGE'] = previous
+        connection.close()
+
+
+def _ten_small_requests(ctx):
+    for _ in range(10):
+        ctx.get(reverse('membres:group_list'))
+
+
+@benchmark('db:requests_new_connection')
+def bench_requests_new_connection(ctx):
+    """Dix petites pages, une connexion ouverte et fermée par requête (DB_CONN_MAX_AGE=0)"""
+    _with_conn_max_age(0, lambda: _ten_small_requests(ctx))
+
+
+@benchmark('db:requests_persistent_connection')
+def bench_requests_persistent_connection(ctx):
+    """Les mêmes dix pages sur une connexion persistante"""
+    _with_conn_max_age(600, lambda: _ten_small_requests(ctx))
+
+
+# ----------------------------------------------------------------------
+# Charge concurrente : WSGI synchrone contre ASGI async
+# ----------------------------------------------------------------------
+CONCURRENT_REQUESTS = 8
+
+_wsgi_workers = None
+
+
+def _view_request(ctx, path):
+    from .testing import view_request
+
+    return view_request(ctx.user, path, HTTP_HOST=ctx.client.defaults['HTTP_HOST'])
+
+
+def _wsgi_load(ctx, view, path):
+    """
+    CONCURRENT_REQUESTS requêtes simultanées sur la vue synchrone, une par
+    thread, comme les threads d'un worker WSGI (gunicorn --threads)
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from django.db import close_old_connections
+
+    global _wsgi_workers
+    if _wsgi_workers is None:
+        _wsgi_workers = ThreadPoolExecutor(CONCURRENT_REQUESTS, thread_name_prefix='wsgi')
+
+    def handle(_):
+        try:
+            return view(_view_request(ctx, path)).status_code
+        finally:
+            close_old_connections()
+
+    statuses = list(_wsgi_workers.map(handle, range(CONCURRENT_REQUESTS)))
+    if set(statuses) != {200}:
+        raise RuntimeError(f'{path} a répondu {statuses}')
+
+
+def _asgi_load(ctx, view, path):
+    """
+    Les mêmes requêtes sur la vue async, toutes sur une boucle d'événements ;
+    chacune dans son ThreadSensitiveContext, comme sous ASGIHandler
+    """
+    import asyncio
+    from asgiref.sync import ThreadSensitiveContext, async_to_sync, sync_to_async
+    from django.db import close_old_connections
+
+    async def handle():
+        async with ThreadSensitiveContext():
+            try:
+                return (await view(_view_request(ctx, path))).status_code
+            finally:
+                await sync_to_async(close_old_connections)()
+
+    async def run():
+        return await asyncio.gather(*(handle() for _ in range(CONCURRENT_REQUESTS)))
+
+    statuses = async_to_sync(run)()
+    if set(statuses) != {200}:
+        raise RuntimeError(f'{path} a répondu {statuses}')
+
+
+@benchmark('load:dashboard_wsgi')
+def bench_dashboard_wsgi(ctx):
+    """Tableau de bord à froid, 8 requêtes simultanées, vue synchrone"""
+    from membres.views import dashboard_home
+    from .fragments import bump_fragment_version
+
+    bump_fragment_version()
+    _wsgi_load(ctx, dashboard_home, reverse('dashboard'))
+
+
+@benchmark('load:dashboard_asgi')
+def bench_dashboard_asgi(ctx):
+    """Tableau de bord à froid, 8 requêtes simultanées, vue async (widgets en parallèle)"""
+    from membres.views import dashboard_home_async
+    from .fragments import bump_fragment_version
+
+    bump_fragment_version()
+    _asgi_load(ctx, dashboard_home_async, reverse('dashboard'))
+
+
+@benchmark('load:finance_dashboard_wsgi')
+def bench_finance_dashboard_wsgi(ctx):
+    from finance.views import finance_dashboard
+
+    _wsgi_load(ctx, finance_dashboard, reverse('finance:dashboard'))
+
+
+@benchmark('load:finance_dashboard_asgi')
+def bench_finance_dashboard_asgi(ctx):
+    from finance.views import finance_dashboard_async
+
+    _asgi_load(ctx, finance_dashboard_async, reverse('finance:dashboard'))
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _rolled_back(func):
+    """Exécute func dans une transaction annulée : la base reste inchangée"""
+    try:
+        with transaction.atomic():
+            func()
+            raise _Rollback
+    except _Rollback:
+        pass
+
+
+def _bulk_members(count, prefix):
+    from membres.models import Member
+
+    return Member.objects.bulk_create([
+        Member(
+            member_id=f'B{prefix}{i:06d}', first_name=f'Bench{i}', last_name=prefix,
+            gender='M', date_of_birth='1990-01-01', marital_status='single',
+            address='Niamey', email=f'bench-{prefix.lower()}-{i}@example.com',
+        )
+        for i in range(count)
+    ])
+
+
+@benchmark('service:account_creation')
+def bench_account_creation(ctx):
+    """1 000 comptes avec lien d'activation (sans hachage de mot de passe)"""
+    from membres.onboarding import create_member_accounts
+
+    _rolled_back(lambda: create_member_accounts(
+        [member.pk for member in _bulk_members(1000, 'ACT')]
+    ))
+
+
+@benchmark('service:account_creation_hashed_100')
+def bench_account_creation_hashed(ctx):
+    """Ancien chemin : create_user() et hachage PBKDF2, 100 comptes seulement"""
+    from accounts.models import User
+
+    def create():
+        for member in _bulk_members(100, 'PWD'):
+            User.objects.create_user(
+                username=f'bench-pwd-{member.first_name}', email=member.email,
+                password=get_random_string(length=8), role='membre',
+            )
+
+    _rolled_back(create)
+
+
+# ----------------------------------------------------------------------
+# Lanceur
+# ----------------------------------------------------------------------
+def run_benchmarks(names=None, repeat=5, warmup=1, log=None):
+    """
+    Exécute les benchmarks demandés (tous par défaut) et renvoie un dict
+    {nom: statistiques}. Une erreur est enregistrée sans arrêter la suite.
+    """
+    log = log or (lambda message: None)
+    ctx = BenchmarkContext()
+    results = {}
+
+    for name, func in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        timings = []
+        queries = 0
+        try:
+            for _ in range(warmup):
+                func(ctx)
+            for _ in range(repeat):
+                with CaptureQueriesContext(connection) as captured:
+                    start = time.perf_counter()
+                    func(ctx)
+                    timings.append((time.perf_counter() - start) * 1000)
+                queries = len(captured.captured_queries)
+        except Exception as exc:
+            results[name] = {'error': f'{type(exc).__name__}: {exc}'}
+            log(f'{name:<32} ERREUR {exc}')
+            continue
+
+        results[name] = {
+            'runs': len(timings),
+            'median_ms': round(statistics.median(timings), 2),
+            'mean_ms': round(statistics.mean(timings), 2),
+            'min_ms': round(min(timings), 2),
+            'max_ms': round(max(timings), 2),
+            'queries': queries,
+        }
+        log(f'{name:<32} {results[name]["median_ms"]:>10.2f} ms  {queries:>4} requêtes')
+
+    return results
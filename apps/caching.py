@@ -0,0 +1,175 @@
+"""
+Couche de cache commune à toutes les fonctions mises en cache.
+
+Le cache est partagé entre les workers dès que CACHE_URL pointe vers Redis
+(voir apps/settings.py) : une invalidation faite par un worker est vue par
+tous les autres.
+
+- Espaces de noms versionnés : les clés sont « espace:version:clé ».
+  invalidate(espace) change la version ; toutes les clés de l'espace
+  deviennent inaccessibles d'un coup et expirent seules.
+- get_or_set() protège le recalcul contre la ruée (stampede) : une valeur
+  absente n'est recalculée que par le détenteur d'un verrou (cache.add),
+  les autres attendent qu'elle apparaisse ; une valeur proche de
+  l'expiration est recalculée en avance par un lecteur tiré au sort,
+  avec une probabilité qui croît à l'approche de l'échéance (XFetch).
+- Une panne du cache (Redis injoignable) n'interrompt pas la requête :
+  la valeur est recalculée et l'erreur comptée.
+- Compteurs de succès, d'échecs et de recalculs par espace de noms, propres
+  au processus, affichés sur la page Performances.
+"""
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.core.cache import cache
+
+logger = logging.getLogger('apps.caching')
+
+DEFAULT_TTL = 300
+LOCK_TIMEOUT = 30  # secondes : durée maximale d'un recalcul sous verrou
+LOCK_WAIT = 2.0  # secondes d'attente de la valeur calculée par un autre processus
+LOCK_POLL = 0.05
+EARLY_REFRESH_BETA = 1.0  # > 1 : recalculs anticipés plus tôt
+
+METRIC_EVENTS = ('hits', 'misses', 'early_refreshes', 'lock_waits', 'errors')
+
+
+class CacheMetrics:
+    """Compteurs par espace de noms, partagés par les threads du processus"""
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, namespace, event):
+        with self._lock:
+            self._counts[(namespace, event)] += 1
+
+    def get(self, namespace, event):
+        return self._counts[(namespace, event)]
+
+    def snapshot(self):
+        """Une ligne par espace de noms, avec le taux de succès"""
+        with self._lock:
+            counts = dict(self._counts)
+        rows = []
+        for namespace in sorted({namespace for namespace, _ in counts}):
+            row = {'namespace': namespace}
+            row.update({event: counts.get((namespace, event), 0) for event in METRIC_EVENTS})
+            lookups = row['hits'] + row['misses']
+            row['hit_rate'] = round(100 * row['hits'] / lookups, 1) if lookups else None
+            rows.append(row)
+        return rows
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
+
+
+metrics = CacheMetrics()
+
+
+def _safely(namespace, operation, *args, default=None):
+    try:
+        return operation(*args)
+    except Exception:
+        metrics.record(namespace, 'errors')
+        logger.warning('Cache indisponible (%s)', namespace, exc_info=True)
+        return default
+
+
+# ----------------------------------------------------------------------
+# Versions
+# ----------------------------------------------------------------------
+def _version_key(namespace):
+    return f'{namespace}:version'
+
+
+def versions(*namespaces):
+    """Version courante de chaque espace de noms, en un aller-retour au cache"""
+    keys = {_version_key(namespace): namespace for namespace in namespaces}
+    found = _safely(','.join(namespaces), cache.get_many, list(keys), default={})
+    result = {}
+    for key, namespace in keys.items():
+        if key not in found:
+            _safely(namespace, cache.add, key, uuid.uuid4().hex, None)
+            found[key] = _safely(namespace, cache.get, key)
+        # Cache indisponible : version jetable, rien ne sera relu
+        result[namespace] = found[key] or uuid.uuid4().hex
+    return result
+
+
+def version(namespace):
+    return versions(namespace)[namespace]
+
+
+def invalidate(*namespaces):
+    """Périme toutes les clés des espaces de noms donnés"""
+    _safely(','.join(namespaces), cache.set_many,
+            {_version_key(namespace): uuid.uuid4().hex for namespace in namespaces}, None)
+
+
+def make_key(namespace, key):
+    return f'{namespace}:{version(namespace)}:{key}'
+
+
+# ----------------------------------------------------------------------
+# Valeurs
+# ----------------------------------------------------------------------
+def _store(namespace, full_key, compute, ttl):
+    start = time.perf_counter()
+    value = compute()
+    delta = time.perf_counter() - start
+    # Durée du calcul conservée avec la valeur : elle règle le recalcul anticipé
+    _safely(namespace, cache.set, full_key, (value, delta, time.time() + ttl), ttl)
+    return value
+
+
+def _fresh(entry, beta):
+    _, delta, expires_at = entry
+    # XFetch : -log(u) suit une loi exponentielle, u dans ]0, 1]
+    return time.time() - delta * beta * math.log(1.0 - random.random()) < expires_at
+
+
+def get_or_set(namespace, key, compute, ttl=DEFAULT_TTL, beta=EARLY_REFRESH_BETA,
+               lock_wait=LOCK_WAIT):
+    """
+    Valeur de `key` dans `namespace`, calculée par compute() si absente.
+    Un seul processus recalcule une valeur absente ; les autres l'attendent
+    au plus `lock_wait` secondes avant de la calculer eux-mêmes.
+    """
+    full_key = make_key(namespace, key)
+    entry = _safely(namespace, cache.get, full_key)
+    if entry is not None:
+        if _fresh(entry, beta):
+            metrics.record(namespace, 'hits')
+            return entry[0]
+        # Expiration proche : ce lecteur recalcule, les autres lisent encore l'ancienne valeur
+        metrics.record(namespace, 'early_refreshes')
+        return _store(namespace, full_key, compute, ttl)
+
+    metrics.record(namespace, 'misses')
+    lock_key = f'{full_key}:lock'
+    if _safely(namespace, cache.add, lock_key, 1, LOCK_TIMEOUT, default=True):
+        try:
+            return _store(namespace, full_key, compute, ttl)
+        finally:
+            _safely(namespace, cache.delete, lock_key)
+
+    metrics.record(namespace, 'lock_waits')
+    deadline = time.monotonic() + lock_wait
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL)
+        entry = _safely(namespace, cache.get, full_key)
+        if entry is not None:
+            return entry[0]
+    return _store(namespace, full_key, compute, ttl)
+
+
+def delete(namespace, key):
+    _safely(namespace, cache.delete, make_key(namespace, key))
@@ -0,0 +1,45 @@
+"""
+Réglages de connexion à la base de données (voir DATABASES dans apps/settings.py).
+
+- SQLite : journal WAL et synchronisation NORMAL à l'ouverture de chaque
+  connexion. Les lectures ne sont plus bloquées par une écriture en cours,
+  ce qui suffit pour une installation sur un seul poste.
+- Vérification de déploiement : un PostgreSQL sans connexion persistante
+  (DB_CONN_MAX_AGE) est signalé.
+"""
+from django.conf import settings
+from django.core.checks import Warning, register
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+SQLITE_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+)
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite' or not getattr(settings, 'SQLITE_WAL', True):
+        return
+    with connection.cursor() as cursor:
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+
+
+def connect_database_signals():
+    connection_created.connect(configure_sqlite, dispatch_uid='apps.database.configure_sqlite')
+
+
+@register(deploy=True)
+def check_persistent_connections(app_configs=None, **kwargs):
+    warnings = []
+    for alias in connections:
+        settings_dict = connections.settings[alias]
+        if (settings_dict['ENGINE'] == 'django.db.backends.postgresql'
+                and not settings_dict.get('CONN_MAX_AGE')):
+            warnings.append(Warning(
+                f"Base '{alias}' : une nouvelle connexion PostgreSQL est ouverte à chaque requête.",
+                hint="Définir DB_CONN_MAX_AGE (secondes).",
+                id='apps.W001',
+            ))
+    return warnings
@@ -0,0 +1,73 @@
+"""
+Exécution concurrente des requêtes indépendantes d'une vue async.
+
+Les tableaux de bord lisent une dizaine d'agrégats qui ne dépendent pas
+les uns des autres. Servis en ASGI (apps/asgi.py), leurs vues async les
+lancent ensemble par gather() : chaque fonction tourne dans un thread du
+pool, avec sa propre connexion à la base, et la durée de la vue devient
+celle de la requête la plus lente au lieu de la somme.
+
+    stats, budget = await fanout.gather(get_monthly_stats, get_current_budget)
+
+Dans une transaction ouverte (tests, ATOMIC_REQUESTS), les autres
+connexions ne voient pas les données non validées : les fonctions sont
+alors exécutées l'une après l'autre, sur la connexion de la requête.
+FANOUT_MAX_WORKERS = 0 désactive aussi le parallélisme.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+DEFAULT_MAX_WORKERS = 8
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def max_workers():
+    return getattr(settings, 'FANOUT_MAX_WORKERS', DEFAULT_MAX_WORKERS)
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max_workers(), thread_name_prefix='fanout')
+        return _executor
+
+
+def _run(func):
+    try:
+        return func()
+    finally:
+        # Même règle qu'en fin de requête : connexion fermée ou gardée selon CONN_MAX_AGE
+        close_old_connections()
+
+
+def _sequential(funcs):
+    return [func() for func in funcs]
+
+
+def _can_fan_out():
+    return max_workers() > 0 and not connection.in_atomic_block
+
+
+async def gather(*funcs):
+    """Résultats de funcs (appelables sans argument), dans l'ordre donné"""
+    if not funcs:
+        return []
+    if not await sync_to_async(_can_fan_out)():
+        return await sync_to_async(_sequential)(funcs)
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+    return list(await asyncio.gather(*(loop.run_in_executor(executor, _run, func) for func in funcs)))
+
+
+async def gather_dict(funcs):
+    """Comme gather(), pour un dictionnaire nom -> fonction"""
+    results = await gather(*funcs.values())
+    return dict(zip(funcs, results))
@@ -0,0 +1,147 @@
+"""
+Cache de fragments de gabarits, versionné par domaine de données.
+
+Les widgets coûteux sont entourés de {% cache %} avec pour clé la version
+des domaines qu'ils affichent (membres, présences, événements, finances).
+Chaque enregistrement ou suppression d'un modèle du domaine change sa
+version : l'ancien fragment n'est plus jamais demandé et expire seul
+(FRAGMENT_CACHE_TTL). Dans une transaction, la version change une seule
+fois par domaine, à la validation : un rendu concurrent ne peut pas mettre
+en cache des données pas encore validées sous la nouvelle version.
+
+Chaque application branche les signaux de ses modèles dans son ready() :
+
+    connect_fragment_signals(self.label)
+
+La clé contient aussi le profil d'accès de l'utilisateur (fragment_role) :
+un fragment rendu pour un trésorier, avec les montants, n'est jamais servi
+à un secrétaire.
+
+Les données des widgets sont passées au gabarit par deferred() : elles ne
+sont calculées que si le fragment est rendu, donc pas sur un cache chaud.
+Une vue async repère d'abord les fragments absents (cached_fragments) et
+calcule leurs valeurs en parallèle (apps.fanout) avant le rendu.
+
+    {% load cache %}
+    {% cache fragments.ttl 'dashboard.kpis' fragments.role fragments.versions.members %}
+        ...
+    {% endcache %}
+"""
+import functools
+
+from django.conf import settings
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from accounts.permissions import ROLE_ACCESS, get_permissions
+
+from . import caching
+
+FRAGMENT_SCOPES = {
+    'members': ('membres.Member', 'membres.Family', 'membres.Group', 'membres.Ministry'),
+    'attendances': ('membres.Attendance', 'events.EventAttendance'),
+    'events': ('events.Event', 'events.EventCategory', 'events.EventProgram',
+               'events.EventSubProgram', 'events.RecurrenceRule'),
+    'transactions': ('finance.FinancialTransaction', 'finance.TransactionCategory'),
+}
+
+
+def _namespace(scope):
+    return f'fragments.{scope}'
+
+
+def fragment_versions(*scopes):
+    """Version courante de chaque domaine (apps.caching), en un aller-retour au cache"""
+    found = caching.versions(*(_namespace(scope) for scope in scopes))
+    return {scope: found[_namespace(scope)] for scope in scopes}
+
+
+def bump_fragment_version(*scopes):
+    """Périme les fragments des domaines donnés (tous par défaut)"""
+    caching.invalidate(*(_namespace(scope) for scope in scopes or FRAGMENT_SCOPES))
+
+
+def fragment_role(user):
+    """Profil d'accès : deux utilisateurs au même profil voient les mêmes fragments"""
+    if not user.is_authenticated:
+        return 'anonyme'
+    permissions = get_permissions(user)
+    access = [name for name in ROLE_ACCESS if getattr(permissions, name)]
+    return '+'.join(access) or 'membre'
+
+
+def fragment_context(request, *scopes):
+    """Variable de gabarit `fragments` : ttl, role et versions"""
+    return {
+        'ttl': getattr(settings, 'FRAGMENT_CACHE_TTL', 600),
+        'role': fragment_role(request.user),
+        'versions': fragment_versions(*scopes),
+    }
+
+
+def deferred(func):
+    """
+    Valeur de contexte calculée au premier accès depuis le gabarit puis
+    mémorisée : le gabarit appelle les objets appelables sans argument.
+    """
+    return functools.cache(func)
+
+
+def fragment_cache():
+    """Cache utilisé par {% cache %} : 'template_fragments' s'il existe"""
+    try:
+        return caches['template_fragments']
+    except InvalidCacheBackendError:
+        return caches['default']
+
+
+def cached_fragments(*fragments):
+    """
+    Fragments déjà en cache parmi ceux donnés sous la forme
+    (nom, vary_on...) comme dans {% cache %}, en une lecture. La balise
+    garde les apostrophes du nom ('dashboard.kpis') dans la clé.
+    """
+    keys = {make_template_fragment_key(f"'{name}'", vary_on): (name, *vary_on)
+            for name, *vary_on in fragments}
+    found = fragment_cache().get_many(list(keys))
+    return {keys[key] for key in found}
+
+
+class _ScopeBump:
+    """Rappel on_commit : change la version d'un domaine, une seule fois"""
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.done = False
+
+    def pending(self, scope):
+        return self.scope == scope and not self.done
+
+    def __call__(self):
+        self.done = True
+        bump_fragment_version(self.scope)
+
+
+def _scope_receiver(scope):
+    def receiver(sender, using=None, **kwargs):
+        connection = transaction.get_connection(using)
+        # Déjà prévu dans cette transaction ; un rollback retire aussi le rappel
+        if any(isinstance(func, _ScopeBump) and func.pending(scope)
+               for _, func, _ in connection.run_on_commit):
+            return
+        transaction.on_commit(_ScopeBump(scope), using=using)
+    return receiver
+
+
+def connect_fragment_signals(app_label):
+    """Branche post_save/post_delete des modèles de l'application sur leurs domaines"""
+    for scope, models in FRAGMENT_SCOPES.items():
+        receiver = _scope_receiver(scope)
+        for model in models:
+            if model.split('.')[0] != app_label:
+                continue
+            for signal in (post_save, post_delete):
+                signal.connect(receiver, sender=model, weak=False,
+                               dispatch_uid=f'fragments:{scope}:{model}')
@@ -0,0 +1,239 @@
+"""
+Instrumentation des requêtes : temps total, requêtes SQL (nombre, durée, doublons)
+et temps de rendu des templates.
+
+Activée par échantillonnage (REQUEST_PROFILING_SAMPLE_RATE entre 0 et 1). Avec un
+taux nul le middleware se retire de la pile au démarrage : aucun surcoût.
+Pour une requête échantillonnée :
+- en-tête Server-Timing lisible dans les outils de développement du navigateur
+- ligne de log JSON (logger 'apps.instrumentation', WARNING au-delà du seuil lent)
+- conservation dans un tampon mémoire des N requêtes les plus lentes du processus
+
+Les requêtes SQL lancées pendant le rendu d'un gabarit sont rattachées à la
+ligne du gabarit qui les a déclenchées (template_origin) : un doublon signalé
+« members/dashboard.html:720 » est une boucle du gabarit qui interroge la base.
+TemplateQueryTracker applique la même attribution dans les tests.
+"""
+import contextvars
+import heapq
+import itertools
+import json
+import logging
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Node, Template
+from django.utils import timezone
+
+logger = logging.getLogger('apps.instrumentation')
+
+_current_profile = contextvars.ContextVar('request_profile', default=None)
+
+
+_RENDER_NODE_CODE = Node.render_annotated.__code__
+
+
+def template_origin():
+    """'gabarit:ligne' du nœud en cours de rendu (le plus interne), ou None hors rendu"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        if frame.f_code is _RENDER_NODE_CODE:
+            node = frame.f_locals['self']
+            origin = getattr(node, 'origin', None)
+            token = getattr(node, 'token', None)
+            if origin is not None and token is not None:
+                return f'{origin.template_name or origin.name}:{token.lineno}'
+        frame = frame.f_back
+    return None
+
+
+class TemplateQueryTracker:
+    """
+    Wrapper d'exécution SQL qui compte les requêtes par ligne de gabarit.
+    `repeated` liste les requêtes (SQL hors paramètres) lancées plusieurs
+    fois depuis la même ligne : une boucle qui interroge la base (N+1).
+    """
+
+    def __init__(self):
+        self.queries = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        origin = template_origin()
+        if origin is not None:
+            self.queries[(origin, sql)] += 1
+        return execute(sql, params, many, context)
+
+    @property
+    def count(self):
+        return sum(self.queries.values())
+
+    @property
+    def repeated(self):
+        return [(origin, sql, n) for (origin, sql), n in self.queries.most_common() if n > 1]
+
+    def report(self, limit=10):
+        return '\n'.join(f'  {origin} : {n}x {sql}' for origin, sql, n in self.repeated[:limit])
+
+
+class RequestProfile:
+    """Mesures collectées pendant une requête"""
+
+    def __init__(self, request):
+        self.method = request.method
+        self.path = request.path
+        self.started_at = timezone.now()
+        self.start = time.perf_counter()
+        self.total_ms = 0.0
+        self.sql_ms = 0.0
+        self.template_ms = 0.0
+        self.template_depth = 0
+        self.queries = Counter()
+        self.origins = {}
+        self.status_code = None
+
+    # Wrapper d'exécution SQL (connection.execute_wrapper)
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_ms += (time.perf_counter() - start) * 1000
+            self.queries[sql] += 1
+            if sql not in self.origins:
+                self.origins[sql] = template_origin()
+
+    @property
+    def sql_count(self):
+        return sum(self.queries.values())
+
+    @property
+    def duplicates(self):
+        """Requêtes au SQL identique (hors paramètres) exécutées plusieurs fois"""
+        return [(sql, n) for sql, n in self.queries.most_common() if n > 1]
+
+    def finish(self, response):
+        self.total_ms = (time.perf_counter() - self.start) * 1000
+        self.status_code = response.status_code
+
+    def server_timing(self):
+        # Valeurs ASCII : les en-têtes HTTP n'acceptent pas l'UTF-8
+        duplicated = sum(n - 1 for _, n in self.duplicates)
+        return ', '.join([
+            f'total;dur={self.total_ms:.1f}',
+            f'sql;dur={self.sql_ms:.1f};desc="{self.sql_count} requetes"',
+            f'tpl;dur={self.template_ms:.1f}',
+            f'dup;desc="{duplicated} doublons"',
+        ])
+
+    def as_dict(self):
+        return {
+            'method': self.method,
+            'path': self.path,
+            'status': self.status_code,
+            'started_at': self.started_at.isoformat(),
+            'total_ms': round(self.total_ms, 1),
+            'sql_ms': round(self.sql_ms, 1),
+            'sql_count': self.sql_count,
+            'template_ms': round(self.template_ms, 1),
+            'duplicates': [{'sql': sql, 'count': n, 'template': self.origins.get(sql)}
+                           for sql, n in self.duplicates[:5]],
+        }
+
+
+class SlowRequestLog:
+    """Conserve les N requêtes les plus lentes (tas borné, thread-safe)"""
+
+    def __init__(self, size):
+        self.size = size
+        self._heap = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        item = (record['total_ms'], next(self._counter), record)
+        with self._lock:
+            if len(self._heap) < self.size:
+                heapq.heappush(self._heap, item)
+            elif item[0] > self._heap[0][0]:
+                heapq.heapreplace(self._heap, item)
+
+    def entries(self):
+        with self._lock:
+            items = sorted(self._heap, reverse=True)
+        return [record for _, _, record in items]
+
+    def clear(self):
+        with self._lock:
+            self._heap = []
+
+
+slow_requests = SlowRequestLog(getattr(settings, 'REQUEST_PROFILING_BUFFER_SIZE', 50))
+
+
+def _install_template_timer():
+    """
+    Mesure le temps de rendu des templates de premier niveau.
+    Installé une seule fois, et seulement si l'instrumentation est active.
+    """
+    if getattr(Template, '_profiling_installed', False):
+        return
+    original_render = Template.render
+
+    def render(self, context):
+        profile = _current_profile.get()
+        if profile is None:
+            return original_render(self, context)
+        profile.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return original_render(self, context)
+        finally:
+            profile.template_depth -= 1
+            if profile.template_depth == 0:
+                profile.template_ms += (time.perf_counter() - start) * 1000
+
+    Template.render = render
+    Template._profiling_installed = True
+
+
+class RequestProfilingMiddleware:
+    """Profile un échantillon des requêtes (voir le docstring du module)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'REQUEST_PROFILING_SAMPLE_RATE', 0)
+        self.slow_ms = getattr(settings, 'REQUEST_PROFILING_SLOW_MS', 500)
+        if self.sample_rate <= 0:
+            raise MiddlewareNotUsed
+        _install_template_timer()
+
+    def __call__(self, request):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        profile = RequestProfile(request)
+        token = _current_profile.set(profile)
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+
+        profile.finish(response)
+        response['Server-Timing'] = profile.server_timing()
+
+        record = profile.as_dict()
+        slow_requests.add(record)
+        level = logging.WARNING if profile.total_ms >= self.slow_ms else logging.INFO
+        logger.log(level, json.dumps(record, ensure_ascii=False))
+        return response
+
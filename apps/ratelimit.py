@@ -0,0 +1,135 @@
+"""
+Limitation des tentatives (connexion, réinitialisation du mot de passe).
+
+Compteurs dans le cache partagé (Redis dès que CACHE_URL le désigne, voir
+apps/settings.py) : la vue interroge le cache avant toute lecture en base,
+une rafale de requêtes scriptées est refusée sans toucher à la base ni au
+serveur de mail.
+
+Fenêtre glissante approchée par deux compteurs fixes : le nombre estimé de
+tentatives est celui de la fenêtre en cours, plus celui de la précédente
+au prorata du temps qui reste à couvrir. Deux clés par compteur, un seul
+aller-retour au cache par vérification.
+
+Chaque portée (DEFAULT_RATE_LIMITS) limite l'adresse IP et le compte visé ;
+le réglage RATE_LIMITS ne remplace que les limites qu'il donne :
+
+    if ratelimit.is_limited('login', request, account=username):
+        ...
+    ratelimit.record('login', request, account=username)
+
+La limite par compte bloque aussi le titulaire : cinq échecs en cinq minutes,
+depuis n'importe quelle adresse, suffisent à empêcher la connexion d'un
+nom d'utilisateur connu pendant la fenêtre. C'est le prix de la protection
+contre les essais répartis sur plusieurs adresses ; relever ou retirer la
+limite 'account' de 'login' dans RATE_LIMITS si ce blocage gêne davantage.
+
+Une panne du cache n'empêche pas de se connecter : la limite est levée et
+l'erreur journalisée.
+"""
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger('apps.ratelimit')
+
+# (nombre de tentatives, fenêtre en secondes) par portée, pour l'IP et pour le compte
+DEFAULT_RATE_LIMITS = {
+    'login': {'ip': (20, 300), 'account': (5, 300)},
+    'password_reset': {'ip': (10, 3600), 'account': (3, 3600)},
+    'password_reset_verify': {'ip': (20, 600), 'account': (5, 600)},
+}
+
+
+class SlidingWindow:
+    """Compteur de tentatives sur les `window` dernières secondes, plafonné à `limit`"""
+
+    def __init__(self, name, limit, window):
+        self.name = name
+        self.limit = limit
+        self.window = window
+
+    def _keys(self, key, now):
+        index = int(now // self.window)
+        prefix = f'ratelimit:{self.name}:{key}'
+        return f'{prefix}:{index}', f'{prefix}:{index - 1}', (now % self.window) / self.window
+
+    def count(self, key, now=None):
+        """Tentatives estimées sur la fenêtre glissante"""
+        current, previous, elapsed = self._keys(key, time.time() if now is None else now)
+        counts = cache.get_many([current, previous])
+        return counts.get(current, 0) + counts.get(previous, 0) * (1 - elapsed)
+
+    def exceeded(self, key, now=None):
+        return self.count(key, now) >= self.limit
+
+    def hit(self, key, now=None):
+        current, _, _ = self._keys(key, time.time() if now is None else now)
+        # La fenêtre en cours sert encore de « précédente » pendant une fenêtre
+        if not cache.add(current, 1, self.window * 2):
+            try:
+                cache.incr(current)
+            except ValueError:  # expirée entre add() et incr()
+                cache.set(current, 1, self.window * 2)
+
+    def reset(self, key, now=None):
+        current, previous, _ = self._keys(key, time.time() if now is None else now)
+        cache.delete_many([current, previous])
+
+
+def client_ip(request):
+    """Adresse du client telle que vue par le serveur (REMOTE_ADDR, réécrite par le proxy)"""
+    return request.META.get('REMOTE_ADDR') or 'inconnue'
+
+
+def _account_key(account):
+    # Identifiant saisi : normalisé et haché (clé de cache courte, sans caractère spécial)
+    return hashlib.sha256(account.strip().lower().encode()).hexdigest()[:32]
+
+
+def limits_for(scope):
+    """Limites d'une portée : DEFAULT_RATE_LIMITS, complétées par le réglage RATE_LIMITS"""
+    overrides = getattr(settings, 'RATE_LIMITS', {}).get(scope, {})
+    limits = {**DEFAULT_RATE_LIMITS.get(scope, {}), **overrides}
+    # Une limite à None est retirée
+    return {counter: limit for counter, limit in limits.items() if limit is not None}
+
+
+def _counters(scope, request, account):
+    limits = limits_for(scope)
+    counters = []
+    if 'ip' in limits and request is not None:
+        counters.append((SlidingWindow(f'{scope}:ip', *limits['ip']), client_ip(request)))
+    if 'account' in limits and account:
+        counters.append((SlidingWindow(f'{scope}:account', *limits['account']), _account_key(account)))
+    return counters
+
+
+def is_limited(scope, request, account=None):
+    """Vrai si l'IP de la requête ou le compte visé a épuisé ses tentatives"""
+    try:
+        return any(counter.exceeded(key) for counter, key in _counters(scope, request, account))
+    except Exception:
+        logger.warning('Cache indisponible (limitation %s)', scope, exc_info=True)
+        return False
+
+
+def record(scope, request, account=None):
+    """Compte une tentative pour l'IP de la requête et pour le compte visé"""
+    try:
+        for counter, key in _counters(scope, request, account):
+            counter.hit(key)
+    except Exception:
+        logger.warning('Cache indisponible (limitation %s)', scope, exc_info=True)
+
+
+def clear(scope, account):
+    """Efface les tentatives d'un compte (connexion réussie)"""
+    try:
+        for counter, key in _counters(scope, None, account):
+            counter.reset(key)
+    except Exception:
+        logger.warning('Cache indisponible (limitation %s)', scope, exc_info=True)
@@ -0,0 +1,105 @@
+"""
+Slugs uniques alloués sans boucle de requêtes.
+
+Les slugs déjà pris pour une base (« culte-dominical », « culte-dominical-1 »,
+« culte-dominical-2 »...) sont lus en une requête et le suffixe suivant est
+calculé en mémoire. Si deux enregistrements simultanés obtiennent le même
+slug, la contrainte unique lève IntegrityError : le slug est recalculé et
+l'enregistrement retenté.
+
+Près de la longueur maximale, la base est tronquée pour laisser la place au
+suffixe (« xxx…x-12 ») : les slugs pris sont alors reconnus par le préfixe
+commun, puis comparés au slug que produirait chaque suffixe.
+"""
+import re
+
+from django.db import IntegrityError, models, transaction
+from django.utils.text import slugify
+
+SLUG_RETRIES = 5
+SUFFIX_DIGITS = 10  # suffixe le plus long reconnu : « -» suivi de 10 chiffres
+
+
+def _with_suffix(base, number, max_length):
+    if not number:
+        return base[:max_length]
+    suffix = f'-{number}'
+    return base[:max_length - len(suffix)] + suffix
+
+
+def taken_suffixes(queryset, base, field='slug', max_length=None):
+    """Suffixes déjà utilisés pour `base` (0 pour la base seule), en une requête"""
+    max_length = max_length or len(base) + SUFFIX_DIGITS + 1
+    # Préfixe commun à tous les slugs suffixés, même si la base a été tronquée
+    prefix = base[:max_length - SUFFIX_DIGITS - 1]
+    candidates = queryset.filter(
+        models.Q(**{field: base}) | models.Q(**{f'{field}__regex': rf'^{re.escape(prefix)}.*-[0-9]+$'})
+    ).values_list(field, flat=True)
+    taken = set()
+    for slug in candidates:
+        if slug == base:
+            taken.add(0)
+            continue
+        match = re.match(r'^.*-(\d+)$', slug)
+        if match and _with_suffix(base, int(match.group(1)), max_length) == slug:
+            taken.add(int(match.group(1)))
+    return taken
+
+
+def unique_slug(model, value, field='slug', exclude_pk=None):
+    """Premier slug libre pour `value` : la base, sinon base-N avec N = plus grand suffixe + 1"""
+    max_length = model._meta.get_field(field).max_length
+    base = slugify(value)[:max_length] or model._meta.model_name
+    queryset = model._default_manager.all()
+    if exclude_pk is not None:
+        queryset = queryset.exclude(pk=exclude_pk)
+    taken = taken_suffixes(queryset, base, field, max_length)
+    if not taken:
+        return base
+    return _with_suffix(base, max(taken) + 1, max_length)
+
+
+def assign_unique_slugs(instances, source='title', field='slug'):
+    """
+    Attribue un slug aux objets d'un bulk_create (événements récurrents...) :
+    une requête par base distincte, quel que soit le nombre d'objets.
+    """
+    next_suffix = {}
+    for instance in instances:
+        if getattr(instance, field):
+            continue
+        model = type(instance)
+        max_length = model._meta.get_field(field).max_length
+        base = slugify(getattr(instance, source))[:max_length] or model._meta.model_name
+        if base not in next_suffix:
+            taken = taken_suffixes(model._default_manager.all(), base, field, max_length)
+            next_suffix[base] = max(taken) + 1 if taken else 0
+        setattr(instance, field, _with_suffix(base, next_suffix[base], max_length))
+        next_suffix[base] += 1
+    return instances
+
+
+class UniqueSlugMixin(models.Model):
+    """
+    Modèle dont le champ `slug` est rempli à partir de `slug_source` au
+    premier enregistrement, avec reprise en cas de collision concurrente.
+    """
+    slug_source = 'title'
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if self.slug:
+            return super().save(*args, **kwargs)
+
+        for attempt in range(SLUG_RETRIES):
+            self.slug = unique_slug(type(self), getattr(self, self.slug_source), exclude_pk=self.pk)
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                collision = type(self)._default_manager.filter(slug=self.slug).exclude(pk=self.pk).exists()
+                if not collision or attempt == SLUG_RETRIES - 1:
+                    self.slug = ''
+                    raise
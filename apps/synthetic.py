@@ -0,0 +1,308 @@
+"""
+Génération d'une église synthétique volumineuse pour les tests de montée en charge.
+
+Toutes les insertions passent par bulk_create par lots : save() et les signaux
+ne sont pas appelés, les identifiants métier (member_id, transaction_id, slug)
+sont donc pré-calculés au même format que les méthodes save() des modèles.
+Exception : les transactions synthétiques sont numérotées S{aaaamm}{n:06d},
+hors de la séquence T{aaaamm}{n:04d} que FinancialTransaction.save()
+prolonge. Plus de 9999 transactions par mois (un million sur cinq ans)
+déborderaient ses quatre chiffres, et la première vraie transaction
+enregistrée ensuite reprendrait un identifiant déjà pris.
+La génération est déterministe pour une graine et une date de référence données.
+"""
+import random
+from collections import defaultdict
+from datetime import date, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .fragments import bump_fragment_version
+
+
+class CongregationGenerator:
+    """Construit une église complète (membres, finances, événements, présences)"""
+
+    def __init__(self, members=50000, families=10000, groups=300, ministries=40,
+                 transactions=1000000, years=5, events=2000, weekly_attendance=0.3,
+                 attendances_per_event=100, seed=42, batch_size=5000,
+                 reference_date=None, organizer=None, log=None):
+        self.counts = {
+            'members': members,
+            'families': families,
+            'groups': groups,
+            'ministries': ministries,
+            'transactions': transactions,
+            'events': events,
+        }
+        self.years = years
+        self.weekly_attendance = weekly_attendance
+        self.attendances_per_event = attendances_per_event
+        self.batch_size = batch_size
+        self.today = reference_date or timezone.now().date()
+        self.organizer = organizer
+        self.rng = random.Random(seed)
+        self.log = log or (lambda message: None)
+        self.created = {}
+
+    # ------------------------------------------------------------------
+    # Utilitaires
+    # ------------------------------------------------------------------
+    def _bulk(self, model, objects, label):
+        """Insère un itérable d'objets par lots, sans tout garder en mémoire"""
+        total = 0
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                model.objects.bulk_create(batch, batch_size=self.batch_size)
+                total += len(batch)
+                batch = []
+                self.log(f'  {label}: {total}')
+        if batch:
+            model.objects.bulk_create(batch, batch_size=self.batch_size)
+            total += len(batch)
+        self.created[label] = total
+        self.log(f'{label}: {total} créé(s)')
+        return total
+
+    def _random_date(self, days_back):
+        return self.today - timedelta(days=self.rng.randint(0, days_back))
+
+    # ------------------------------------------------------------------
+    # Étapes
+    # ------------------------------------------------------------------
+    def run(self):
+        with transaction.atomic():
+            self._ensure_organizer()
+            self._members()
+            self._structures()
+            self._memberships()
+            self._weekly_attendance()
+            self._finance()
+            self._events()
+        # bulk_create n'envoie pas de signaux : les fragments en cache sont périmés ici
+        bump_fragment_version()
+        return self.created
+
+    def _ensure_organizer(self):
+        from accounts.models import User
+
+        if self.organizer is None:
+            self.organizer, _ = User.objects.get_or_create(
+                username='synthetic-admin',
+                defaults={'role': 'admin', 'first_name': 'Admin', 'last_name': 'Synthétique'},
+            )
+
+    def _members(self):
+        from membres.models import Member
+
+        rng = self.rng
+        per_year = defaultdict(int)
+        statuses = [choice for choice, _ in Member.MEMBER_STATUS_CHOICES]
+
+        def build():
+            for i in range(1, self.counts['members'] + 1):
+                membership_date = self._random_date(365 * 30)
+                per_year[membership_date.year] += 1
+                yield Member(
+                    member_id=f'M{membership_date.year}{per_year[membership_date.year]:04d}',
+                    first_name=f'Prenom{i}',
+                    last_name=f'Nom{i}',
+                    gender=rng.choice('MF'),
+                    date_of_birth=date(rng.randint(1940, self.today.year - 1), rng.randint(1, 12), rng.randint(1, 28)),
+                    marital_status=rng.choice(['single', 'married', 'widowed', 'divorced']),
+                    phone=f'+2279{i:07d}',
+                    address='Niamey',
+                    membership_date=membership_date,
+                    status=rng.choices(statuses, weights=[80, 8, 8, 3, 1])[0],
+                )
+
+        self._bulk(Member, build(), 'members')
+        # Seuls les identifiants sont conservés pour limiter la mémoire
+        self.member_ids = list(Member.objects.order_by('pk').values_list('pk', flat=True))
+        self.active_member_ids = list(
+            Member.objects.filter(status='active').order_by('pk').values_list('pk', flat=True)
+        )
+
+    def _structures(self):
+        from membres.models import Ministry, Group, Family
+
+        rng = self.rng
+        group_types = [choice for choice, _ in Group.GROUP_TYPE_CHOICES]
+        days = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi']
+
+        self._bulk(Family, (
+            Family(name=f'Famille {i}', head_id=rng.choice(self.member_ids))
+            for i in range(1, self.counts['families'] + 1)
+        ), 'families')
+        self._bulk(Group, (
+            Group(
+                name=f'Groupe {i}',
+                group_type=rng.choice(group_types),
+                meeting_day=rng.choice(days),
+                meeting_time=time(rng.randint(16, 20), 0),
+                leader_id=rng.choice(self.member_ids),
+            )
+            for i in range(1, self.counts['groups'] + 1)
+        ), 'groups')
+        self._bulk(Ministry, (
+            Ministry(name=f'Ministère {i}', leader_id=rng.choice(self.member_ids))
+            for i in range(1, self.counts['ministries'] + 1)
+        ), 'ministries')
+
+        self.family_ids = list(Family.objects.order_by('pk').values_list('pk', flat=True))
+        self.group_ids = list(Group.objects.order_by('pk').values_list('pk', flat=True))
+        self.ministry_ids = list(Ministry.objects.order_by('pk').values_list('pk', flat=True))
+
+    def _memberships(self):
+        from membres.models import Member
+
+        rng = self.rng
+        # Rattachement aux familles : un UPDATE par famille plutôt qu'un par membre
+        if self.family_ids:
+            by_family = defaultdict(list)
+            for member_id in self.member_ids:
+                by_family[rng.choice(self.family_ids)].append(member_id)
+            for family_id, member_ids in by_family.items():
+                Member.objects.filter(pk__in=member_ids).update(family_id=family_id)
+
+        GroupLink = Member.groups.through
+        MinistryLink = Member.ministries.through
+        if self.group_ids:
+            self._bulk(GroupLink, (
+                GroupLink(member_id=member_id, group_id=group_id)
+                for member_id in self.member_ids
+                for group_id in rng.sample(self.group_ids, k=min(rng.randint(0, 2), len(self.group_ids)))
+            ), 'group memberships')
+        if self.ministry_ids:
+            self._bulk(MinistryLink, (
+                MinistryLink(member_id=member_id, ministry_id=rng.choice(self.ministry_ids))
+                for member_id in self.member_ids
+                if rng.random() < 0.4
+            ), 'ministry memberships')
+
+    def _weekly_attendance(self):
+        from membres.models import Attendance
+
+        rng = self.rng
+        if not self.active_member_ids or not self.weekly_attendance:
+            return
+        weeks = self.years * 52
+        last_sunday = self.today - timedelta(days=(self.today.weekday() + 1) % 7)
+        sample_size = int(len(self.active_member_ids) * self.weekly_attendance)
+
+        self._bulk(Attendance, (
+            Attendance(
+                member_id=member_id,
+                date=last_sunday - timedelta(weeks=week),
+                event_type='sunday_service',
+                present=rng.random() < 0.85,
+            )
+            for week in range(weeks)
+            for member_id in rng.sample(self.active_member_ids, k=sample_size)
+        ), 'weekly attendances')
+
+    def _finance(self):
+        from finance.models import FinancialTransaction, TransactionCategory, Budget
+
+        rng = self.rng
+        income = [
+            TransactionCategory.objects.get_or_create(name=name, category_type='income')[0]
+            for name in ('Dîmes', 'Offrandes', 'Dons')
+        ]
+        expense = [
+            TransactionCategory.objects.get_or_create(name=name, category_type='expense')[0]
+            for name in ('Fonctionnement', 'Missions', 'Travaux')
+        ]
+        per_month = defaultdict(int)
+        days_back = 365 * self.years
+        now = timezone.now()
+
+        def build():
+            for _ in range(self.counts['transactions']):
+                tx_date = self._random_date(days_back)
+                key = (tx_date.year, tx_date.month)
+                per_month[key] += 1
+                is_expense = rng.random() < 0.2
+                is_validated = rng.random() < 0.95
+                yield FinancialTransaction(
+                    transaction_id=f'S{tx_date.year}{tx_date.month:02d}{per_month[key]:06d}',
+                    date=tx_date,
+                    transaction_type='expense' if is_expense else rng.choice(['tithe', 'offering', 'donation']),
+                    category=rng.choice(expense if is_expense else income),
+                    amount=Decimal(rng.randint(500, 250000)),
+                    member_id=None if is_expense else rng.choice(self.member_ids),
+                    payment_method=rng.choice(['cash', 'mobile', 'transfer']),
+                    is_validated=is_validated,
+                    validated_by=self.organizer if is_validated else None,
+                    validated_at=now if is_validated else None,
+                    created_by=self.organizer,
+                )
+
+        self._bulk(FinancialTransaction, build(), 'transactions')
+
+        self._bulk(Budget, (
+            Budget(
+                name='Budget mensuel', period='monthly', year=year, month=month,
+                expected_income=Decimal(rng.randint(5, 50) * 1000000),
+                expected_expense=Decimal(rng.randint(5, 50) * 1000000),
+                created_by=self.organizer,
+            )
+            for year in range(self.today.year - self.years + 1, self.today.year + 1)
+            for month in range(1, 13)
+        ), 'budgets')
+
+    def _events(self):
+        from events.models import Event, EventCategory, EventProgram, EventAttendance
+
+        rng = self.rng
+        categories = [
+            EventCategory.objects.get_or_create(name=name)[0]
+            for name in ('Cultes', 'Conférences', 'Jeunesse', 'Évangélisation')
+        ]
+        total = self.counts['events']
+        span = 365 * self.years
+        statuses = ['published', 'scheduled', 'ongoing', 'archived', 'draft']
+
+        def build():
+            for i in range(1, total + 1):
+                # Répartis sur la période, avec environ 10 % d'événements futurs
+                start = self.today - timedelta(days=span) + timedelta(days=int(i * span * 1.1 / total))
+                yield Event(
+                    title=f'Événement {i}',
+                    slug=f'evenement-synthetique-{i}',
+                    category=rng.choice(categories),
+                    description='Événement généré pour les tests de charge.',
+                    short_description='Événement généré pour les tests de charge.',
+                    start_date=start,
+                    start_time=time(rng.choice([9, 10, 15, 18]), 0),
+                    end_date=start + timedelta(days=rng.choice([0, 0, 0, 1, 2])),
+                    end_time=time(21, 0),
+                    location='Temple principal',
+                    status=rng.choice(statuses),
+                    organizer=self.organizer,
+                    created_by=self.organizer,
+                )
+
+        self._bulk(Event, build(), 'events')
+        event_rows = list(Event.objects.filter(slug__startswith='evenement-synthetique-')
+                          .values_list('pk', 'start_date'))
+
+        self._bulk(EventProgram, (
+            EventProgram(event_id=pk, title=f'Programme {j + 1}', date=start_date,
+                         start_time=time(9 + j, 0), end_time=time(10 + j, 0), order=j)
+            for pk, start_date in event_rows
+            for j in range(3)
+        ), 'event programs')
+
+        now = timezone.now()
+        k = min(self.attendances_per_event, len(self.member_ids))
+        self._bulk(EventAttendance, (
+            EventAttendance(event_id=pk, member_id=member_id, is_present=rng.random() < 0.7,
+                            check_in_time=now, recorded_by=self.organizer)
+            for pk, _ in event_rows
+            for member_id in rng.sample(self.member_ids, k=k)
+        ), 'event attendances')
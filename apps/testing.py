@@ -0,0 +1,124 @@
+"""
+Outils communs aux tests de performance :
+- un jeu de données réaliste créé en masse (bulk_create)
+- des assertions de budget (nombre de requêtes SQL et temps d'exécution) ;
+  elles échouent aussi quand une ligne de gabarit répète une requête (N+1)
+- des requêtes authentifiées pour appeler directement une vue, synchrone
+  ou async, quelle que soit la vue routée par les URL (ASYNC_VIEWS)
+"""
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.contrib.messages.storage import default_storage
+from django.contrib.sessions.backends.base import SessionBase
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from apps.instrumentation import TemplateQueryTracker
+from apps.synthetic import CongregationGenerator
+
+# Permet d'assouplir les budgets de temps sur une machine lente (CI partagée)
+TIME_BUDGET_SCALE = float(os.environ.get('TEST_TIME_BUDGET_SCALE', '1'))
+
+
+def seed_congregation(members=2000, families=400, groups=40, ministries=15,
+                      transactions=3000, events=60, attendances_per_event=40,
+                      organizer=None, seed=42):
+    """
+    Crée une église complète en quelques requêtes groupées (voir
+    apps.synthetic.CongregationGenerator) et renvoie les objets utiles aux tests.
+    """
+    from membres.models import Member
+    from events.models import Event
+
+    generator = CongregationGenerator(
+        members=members, families=families, groups=groups, ministries=ministries,
+        transactions=transactions, years=1, events=events, weekly_attendance=0.05,
+        attendances_per_event=attendances_per_event, seed=seed, batch_size=1000,
+        organizer=organizer,
+    )
+    generator.run()
+    return {
+        'organizer': generator.organizer,
+        'members': list(Member.objects.order_by('pk')),
+        'events': list(Event.objects.order_by('pk')),
+    }
+
+
+def view_request(user, path, **extra):
+    """
+    Requête GET pour `user`, préparée comme par les middlewares de session,
+    d'authentification et de messages
+    """
+    request = RequestFactory(**extra).get(path)
+    request.session = SessionBase()
+    request.user = user
+
+    async def auser():
+        return user
+
+    request.auser = auser
+    request._messages = default_storage(request)
+    return request
+
+
+def format_duplicate_queries(queries, limit=10):
+    """Résume les requêtes SQL exécutées plusieurs fois à l'identique"""
+    counter = Counter(q['sql'] for q in queries)
+    duplicates = [(sql, n) for sql, n in counter.most_common() if n > 1][:limit]
+    if not duplicates:
+        return 'Aucune requête dupliquée.'
+    return '\n'.join(f'  {n}x {sql}' for sql, n in duplicates)
+
+
+class QueryBudgetMixin:
+    """
+    Mixin pour TestCase : vérifie qu'un bloc de code reste sous un nombre
+    maximal de requêtes SQL et un temps maximal d'exécution.
+    """
+    default_time_budget = 2.0  # secondes
+
+    @contextmanager
+    def assertQueryBudget(self, max_queries, max_seconds=None):
+        max_seconds = (max_seconds or self.default_time_budget) * TIME_BUDGET_SCALE
+        tracker = TemplateQueryTracker()
+        with CaptureQueriesContext(connection) as ctx, connection.execute_wrapper(tracker):
+            start = time.perf_counter()
+            yield ctx
+            elapsed = time.perf_counter() - start
+
+        queries = ctx.captured_queries
+        if len(queries) > max_queries:
+            self.fail(
+                f'{len(queries)} requêtes SQL exécutées (budget : {max_queries}).\n'
+                f'Requêtes dupliquées :\n{format_duplicate_queries(queries)}'
+            )
+        if tracker.repeated:
+            self.fail(f'Requêtes répétées par les gabarits (N+1) :\n{tracker.report()}')
+        if elapsed > max_seconds:
+            self.fail(f'Exécution en {elapsed:.2f}s (budget : {max_seconds:.2f}s).')
+
+    def assertViewBudget(self, url, max_queries, max_seconds=None, status_code=200):
+        """Appelle une URL et vérifie son budget ; renvoie la réponse"""
+        with self.assertQueryBudget(max_queries, max_seconds):
+            response = self.client.get(url)
+            # Les réponses en streaming sont consommées dans le budget
+            if getattr(response, 'streaming', False):
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, status_code)
+        return response
+
+    def assertTemplatesQueryFree(self, url):
+        """Le rendu des gabarits de l'URL ne lance aucune requête SQL"""
+        tracker = TemplateQueryTracker()
+        with connection.execute_wrapper(tracker):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        if tracker.count:
+            self.fail(f'{tracker.count} requêtes lancées depuis les gabarits :\n'
+                      + '\n'.join(f'  {origin} : {n}x {sql}'
+                                   for (origin, sql), n in tracker.queries.most_common(10)))
+        return response
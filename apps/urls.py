@@ -3,7 +3,7 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from membres import views as membres_views  # ✅ importer la vue dashboard
-from membres.views import dashboard_home
+from membres.views import dashboard_home, dashboard_home_async
 from django.views.generic import RedirectView
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -11,7 +11,7 @@ urlpatterns = [
     path('membres/', include('membres.urls')), 
     path('finance/', include('finance.urls')), 
     path('accounts/', include('accounts.urls')),
-    path('dashboard/', dashboard_home, name='dashboard'),  
+    path('dashboard/', dashboard_home_async if settings.ASYNC_VIEWS else dashboard_home, name='dashboard'),
     path('events/', include('events.urls')),
     path('settings/', include('settings.urls')),
    
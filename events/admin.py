@@ -13,7 +13,9 @@ admin.site.register(EventProgram)
 admin.site.register(EventSubProgram)
 admin.site.register(EventAttendance)
 admin.site.register(WhatsAppNotification)
+admin.site.register(WhatsAppDelivery)
 admin.site.register(EventCategory)
+admin.site.register(RecurrenceRule)
 
 
 
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class EventsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'events'
+
+    def ready(self):
+        import events.signals  # Charge les signaux
+        from apps.fragments import connect_fragment_signals
+        connect_fragment_signals(self.label)
@@ -0,0 +1,175 @@
+"""
+Flux des événements publics : iCalendar (.ics) et JSON.
+
+Les applications de calendrier interrogent le flux toutes les 15 minutes.
+ETag et Last-Modified viennent d'une seule requête d'agrégat (date de
+modification la plus récente, nombre d'événements du flux) : si rien n'a
+changé, la réponse 304 part sans lire ni sérialiser les événements.
+
+La date de modification couvre tous les événements, pas seulement ceux du
+flux (un événement dépublié ou changé de catégorie en sort), ainsi que la
+dernière suppression (DeletedEvent) : Last-Modified reste exact pour les
+clients qui n'envoient que If-Modified-Since. Sinon les
+occurrences (séries récurrentes déroulées) sont écrites en flux.
+"""
+import hashlib
+import json
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Count, Max, Q, Subquery
+from django.http import StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .models import DeletedEvent, Event
+from .recurrence import occurrences_between
+
+FEED_STATUSES = ('published', 'scheduled', 'ongoing')
+FEED_PAST_DAYS = 90
+FEED_FUTURE_DAYS = 365
+FEED_MAX_AGE = 15 * 60
+
+
+def _feed_filter(request):
+    condition = Q(status__in=FEED_STATUSES)
+    category = request.GET.get('category', '')
+    if category.isdigit():
+        condition &= Q(category_id=category)
+    return condition
+
+
+def _feed_events(request):
+    return Event.objects.filter(_feed_filter(request))
+
+
+def _feed_state(request):
+    """(dernière modification, etag), calculés une fois par requête"""
+    if not hasattr(request, '_feed_state'):
+        last_deletion = DeletedEvent.objects.order_by('-deleted_at').values('deleted_at')[:1]
+        state = Event.objects.aggregate(
+            updated=Max('updated_at'),
+            deleted=Max(Subquery(last_deletion)),
+            count=Count('pk', filter=_feed_filter(request)),
+        )
+        last = max(filter(None, (state['updated'], state['deleted'])), default=None)
+        # La fenêtre glisse chaque jour : la date du jour fait partie de l'ETag
+        key = f"{request.path}|{request.GET.get('category', '')}|{last}|{state['count']}|{timezone.localdate()}"
+        request._feed_state = (last, hashlib.sha1(key.encode()).hexdigest())
+    return request._feed_state
+
+
+feed_condition = condition(
+    etag_func=lambda request: _feed_state(request)[1],
+    last_modified_func=lambda request: _feed_state(request)[0],
+)
+
+
+def _occurrences(request):
+    today = timezone.localdate()
+    queryset = _feed_events(request).prefetch_related('programs')
+    return occurrences_between(today - timedelta(days=FEED_PAST_DAYS),
+                               today + timedelta(days=FEED_FUTURE_DAYS), queryset)
+
+
+def _stream(request, content, content_type):
+    response = StreamingHttpResponse(content, content_type=content_type)
+    patch_cache_control(response, public=True, max_age=FEED_MAX_AGE)
+    return response
+
+
+# ----------------------------------------------------------------------
+# iCalendar
+# ----------------------------------------------------------------------
+def _ics_text(value):
+    return (str(value or '').replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _ics_line(line):
+    """Ligne pliée à 75 octets (RFC 5545)"""
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts, current = [], b''
+    for char in line:
+        char_bytes = char.encode()
+        if len(current) + len(char_bytes) > (75 if not parts else 74):
+            parts.append(current.decode())
+            current = b''
+        current += char_bytes
+    parts.append(current.decode())
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def _ics_time(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _ics_lines(request, occurrences):
+    host = request.get_host().split(':')[0]
+    stamp = _ics_time(timezone.now())
+    yield _ics_line('BEGIN:VCALENDAR')
+    yield _ics_line('VERSION:2.0')
+    yield _ics_line('PRODID:-//Eglise Manager//Evenements//FR')
+    yield _ics_line('CALSCALE:GREGORIAN')
+    yield _ics_line(f'X-WR-TIMEZONE:{settings.TIME_ZONE}')
+    for occurrence in occurrences:
+        event = occurrence.event
+        description = event.short_description or ''
+        if occurrence.materialized:
+            programs = [f"{p.start_time:%H:%M} {p.title}" for p in event.programs.all()]
+            if programs:
+                description += '\n\nProgramme :\n' + '\n'.join(programs)
+        yield _ics_line('BEGIN:VEVENT')
+        yield _ics_line(f'UID:{event.uuid}-{occurrence.date:%Y%m%d}@{host}')
+        yield _ics_line(f'DTSTAMP:{stamp}')
+        yield _ics_line(f'DTSTART:{_ics_time(occurrence.start)}')
+        yield _ics_line(f'DTEND:{_ics_time(occurrence.end)}')
+        yield _ics_line(f'SUMMARY:{_ics_text(event.title)}')
+        if event.location:
+            yield _ics_line(f'LOCATION:{_ics_text(event.location)}')
+        if description:
+            yield _ics_line(f'DESCRIPTION:{_ics_text(description)}')
+        yield _ics_line(f"URL:{request.build_absolute_uri(reverse('events:event_detail', args=[event.slug]))}")
+        yield _ics_line('END:VEVENT')
+    yield _ics_line('END:VCALENDAR')
+
+
+@feed_condition
+def ical_feed_view(request):
+    return _stream(request, _ics_lines(request, _occurrences(request)), 'text/calendar; charset=utf-8')
+
+
+# ----------------------------------------------------------------------
+# JSON
+# ----------------------------------------------------------------------
+def _json_items(occurrences):
+    yield '['
+    for index, occurrence in enumerate(occurrences):
+        event = occurrence.event
+        item = {
+            'id': event.pk,
+            'title': event.title,
+            'slug': event.slug,
+            'category': event.category.name if event.category_id else None,
+            'start': occurrence.start.isoformat(),
+            'end': occurrence.end.isoformat(),
+            'location': event.location,
+            'description': event.short_description,
+            'recurring': hasattr(event, 'recurrence') or bool(event.series_id),
+            'programs': [
+                {'title': p.title, 'start_time': p.start_time.strftime('%H:%M'),
+                 'end_time': p.end_time.strftime('%H:%M')}
+                for p in event.programs.all()
+            ] if occurrence.materialized else [],
+        }
+        yield (',' if index else '') + json.dumps(item, ensure_ascii=False)
+    yield ']'
+
+
+@feed_condition
+def json_feed_view(request):
+    return _stream(request, _json_items(_occurrences(request)), 'application/json')
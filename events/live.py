@@ -0,0 +1,323 @@
+"""
+Compteur de présence en direct (Server-Sent Events).
+
+Pendant un culte, chaque écran ouvert sur la liste de présence reçoit les
+compteurs (présents, attendus) et les nouvelles arrivées au lieu de
+recharger la page.
+
+1. Chaque écriture de présence (pointage, ajout groupé) est notée par un
+   signal ; au commit, les compteurs de l'événement sont relus en une
+   requête d'agrégat et publiés une seule fois sur le canal de l'événement,
+   quel que soit le nombre de lignes écrites dans la transaction.
+2. Chaque écran abonné reçoit ce message tel quel : dix écrans coûtent une
+   diffusion, pas dix rendus de la page.
+
+Canal : en mémoire (un seul processus) par défaut, Redis pub/sub dès que
+LIVE_BROKER_URL est défini (plusieurs workers). Un flux dure au plus
+LIVE_STREAM_TIMEOUT secondes, puis le navigateur se reconnecte seul
+(EventSource).
+
+Le flux n'est ouvert par la page qu'en ASGI (apps/asgi.py) : l'attente d'un
+message y est une attente asyncio (asyncio.Queue, redis.asyncio), sans
+thread par écran. En WSGI, un flux ouvert occuperait un thread du serveur
+pendant LIVE_STREAM_TIMEOUT : la page relit plutôt les compteurs toutes les
+LIVE_POLL_INTERVAL secondes (attendance_snapshot, une requête).
+"""
+import asyncio
+import json
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager, contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, Q
+
+logger = logging.getLogger(__name__)
+
+RETRY_MS = 3000  # délai de reconnexion conseillé au navigateur
+SUBSCRIBER_BACKLOG = 10  # messages en attente par écran ; au-delà, les plus anciens sont perdus
+
+
+def channel_name(event_id):
+    return f'events.attendance.{event_id}'
+
+
+# ----------------------------------------------------------------------
+# Canaux
+# ----------------------------------------------------------------------
+class LocalBroker:
+    """Pub/sub en mémoire : seuls les abonnés du même processus reçoivent les messages"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers[channel])
+        for subscription in subscribers:
+            subscription.put(message)
+
+    @contextmanager
+    def subscribe(self, channel):
+        with self._registered(channel, _LocalSubscription()) as subscription:
+            yield subscription
+
+    @asynccontextmanager
+    async def asubscribe(self, channel):
+        with self._registered(channel, _AsyncLocalSubscription(asyncio.get_running_loop())) as subscription:
+            yield subscription
+
+    @contextmanager
+    def _registered(self, channel, subscription):
+        with self._lock:
+            self._subscribers[channel].add(subscription)
+        try:
+            yield subscription
+        finally:
+            with self._lock:
+                self._subscribers[channel].discard(subscription)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+
+    def subscriber_count(self, channel):
+        with self._lock:
+            return len(self._subscribers.get(channel, ()))
+
+
+class _LocalSubscription:
+    def __init__(self):
+        self._messages = queue.Queue(maxsize=SUBSCRIBER_BACKLOG)
+
+    def put(self, message):
+        # Chaque message est un état complet : un écran en retard perd les plus anciens
+        while True:
+            try:
+                self._messages.put_nowait(message)
+                break
+            except queue.Full:
+                try:
+                    self._messages.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout):
+        """Prochain message, ou None au bout de `timeout` secondes"""
+        try:
+            return self._messages.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class _AsyncLocalSubscription:
+    """Abonnement d'un flux ASGI : file asyncio de la boucle qui l'attend"""
+
+    def __init__(self, loop):
+        self._loop = loop
+        self._messages = asyncio.Queue(maxsize=SUBSCRIBER_BACKLOG)
+
+    def put(self, message):
+        # Publié depuis le thread de la requête qui valide : confié à la boucle de l'abonné
+        try:
+            self._loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:  # boucle fermée, le flux se termine
+            pass
+
+    def _put(self, message):
+        if self._messages.full():
+            self._messages.get_nowait()
+        self._messages.put_nowait(message)
+
+    async def get(self, timeout):
+        try:
+            return await asyncio.wait_for(self._messages.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class RedisBroker:
+    """Pub/sub Redis : les messages publiés par un worker parviennent à tous les autres"""
+
+    def __init__(self, url):
+        import redis
+
+        self._url = url
+        self._client = redis.Redis.from_url(url)
+
+    def publish(self, channel, message):
+        self._client.publish(channel, message)
+
+    @contextmanager
+    def subscribe(self, channel):
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(channel)
+        try:
+            yield _RedisSubscription(pubsub)
+        finally:
+            pubsub.close()
+
+    @asynccontextmanager
+    async def asubscribe(self, channel):
+        from redis import asyncio as aioredis
+
+        # Client propre au flux : ses connexions appartiennent à la boucle en cours
+        client = aioredis.Redis.from_url(self._url)
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(channel)
+            yield _AsyncRedisSubscription(pubsub)
+        finally:
+            await pubsub.aclose()
+            await client.aclose()
+
+
+class _RedisSubscription:
+    def __init__(self, pubsub):
+        self._pubsub = pubsub
+
+    def get(self, timeout):
+        deadline = time.monotonic() + timeout
+        while (remaining := deadline - time.monotonic()) > 0:
+            message = self._pubsub.get_message(timeout=remaining)
+            if message and message['type'] == 'message':
+                return message['data'].decode()
+        return None
+
+
+class _AsyncRedisSubscription:
+    def __init__(self, pubsub):
+        self._pubsub = pubsub
+
+    async def get(self, timeout):
+        deadline = time.monotonic() + timeout
+        while (remaining := deadline - time.monotonic()) > 0:
+            message = await self._pubsub.get_message(timeout=remaining)
+            if message and message['type'] == 'message':
+                return message['data'].decode()
+        return None
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            url = getattr(settings, 'LIVE_BROKER_URL', '')
+            _broker = RedisBroker(url) if url else LocalBroker()
+        return _broker
+
+
+# ----------------------------------------------------------------------
+# Publication
+# ----------------------------------------------------------------------
+def attendance_snapshot(event_id):
+    """Compteurs de présence d'un événement, en une requête"""
+    from .models import EventAttendance
+
+    counts = EventAttendance.objects.filter(event_id=event_id).aggregate(
+        present=Count('pk', filter=Q(is_present=True)),
+        total=Count('pk'),
+    )
+    present, total = counts['present'], counts['total']
+    return {
+        'event': event_id,
+        'present': present,
+        'total': total,
+        'absent': total - present,
+        'rate': round(present / total * 100 if total else 0, 2),
+    }
+
+
+def publish_attendance(event_id, checked_in=()):
+    """Diffuse les compteurs de l'événement et les membres arrivés depuis le dernier message"""
+    message = dict(attendance_snapshot(event_id), checked_in=list(checked_in))
+    try:
+        get_broker().publish(channel_name(event_id), json.dumps(message, cls=DjangoJSONEncoder))
+    except Exception:
+        # Le pointage est enregistré : un écran en direct ne doit pas le faire échouer
+        logger.warning('Diffusion des présences impossible (événement %s)', event_id, exc_info=True)
+
+
+_pending = threading.local()
+
+
+def _flush():
+    changes, _pending.changes = _pending.changes, None
+    for event_id, checked_in in changes.items():
+        publish_attendance(event_id, checked_in)
+
+
+def _flush_registered():
+    # Une transaction annulée emporte son _flush : les changements notés sont abandonnés
+    return any(func is _flush for _, func, _ in transaction.get_connection().run_on_commit)
+
+
+def queue_attendance_change(attendance, checked_in=False):
+    """
+    Note une présence modifiée : un seul message par événement est publié
+    au commit de la transaction en cours
+    """
+    registered = getattr(_pending, 'changes', None) is not None and _flush_registered()
+    if not registered:
+        _pending.changes = {}
+    arrivals = _pending.changes.setdefault(attendance.event_id, [])
+    if checked_in:
+        arrivals.append({
+            'member': attendance.member_id,
+            'name': attendance.member.get_full_name(),
+            'check_in_time': attendance.check_in_time,
+        })
+    if not registered:
+        transaction.on_commit(_flush)
+
+
+# ----------------------------------------------------------------------
+# Flux SSE
+# ----------------------------------------------------------------------
+def sse_frame(data, event='attendance', retry=None):
+    lines = [f'retry: {retry}'] if retry else []
+    lines.append(f'event: {event}')
+    lines.extend(f'data: {line}' for line in data.splitlines())
+    return '\n'.join(lines) + '\n\n'
+
+
+HEARTBEAT_FRAME = ': ping\n\n'  # commentaire SSE : garde la connexion ouverte derrière un proxy
+
+
+def _durations():
+    return (getattr(settings, 'LIVE_STREAM_TIMEOUT', 300),
+            getattr(settings, 'LIVE_HEARTBEAT', 15))
+
+
+def stream_attendance(event_id):
+    """Flux SSE d'un événement, pour un serveur WSGI (un thread occupé par écran)"""
+    timeout, heartbeat = _durations()
+    with get_broker().subscribe(channel_name(event_id)) as subscription:
+        # Abonné avant la lecture des compteurs : aucun pointage n'est manqué entre les deux
+        snapshot = dict(attendance_snapshot(event_id), checked_in=[])
+        yield sse_frame(json.dumps(snapshot), retry=RETRY_MS)
+        deadline = time.monotonic() + timeout
+        while (remaining := deadline - time.monotonic()) > 0:
+            message = subscription.get(min(heartbeat, remaining))
+            yield sse_frame(message) if message else HEARTBEAT_FRAME
+
+
+async def astream_attendance(event_id):
+    """Même flux pour un serveur ASGI : l'attente d'un message ne bloque pas la boucle"""
+    timeout, heartbeat = _durations()
+    async with get_broker().asubscribe(channel_name(event_id)) as subscription:
+        snapshot = await sync_to_async(attendance_snapshot)(event_id)
+        yield sse_frame(json.dumps(dict(snapshot, checked_in=[]), cls=DjangoJSONEncoder), retry=RETRY_MS)
+        deadline = time.monotonic() + timeout
+        while (remaining := deadline - time.monotonic()) > 0:
+            message = await subscription.get(min(heartbeat, remaining))
+            yield sse_frame(message) if message else HEARTBEAT_FRAME
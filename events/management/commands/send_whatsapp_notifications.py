@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from events.models import WhatsAppNotification
+from events.whatsapp import send_deliveries
+
+
+class Command(BaseCommand):
+    help = "Envoie les notifications WhatsApp en attente (une fois, ou en continu avec --loop)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--loop', action='store_true', help='Tourne en continu (mode worker)')
+        parser.add_argument('--interval', type=float, default=5,
+                            help="Pause en secondes quand il n'y a rien à envoyer (avec --loop)")
+
+    def handle(self, *args, **options):
+        while True:
+            pending = list(WhatsAppNotification.objects.filter(status='pending')
+                           .values_list('pk', flat=True).order_by('created_at'))
+            for pk in pending:
+                # Réservation : un autre worker a pu la prendre entre-temps
+                if not WhatsAppNotification.objects.filter(pk=pk, status='pending').update(status='sending'):
+                    continue
+                notification = WhatsAppNotification.objects.get(pk=pk)
+                sent, failed = send_deliveries(notification, batch_size=options['batch_size'])
+                self.stdout.write(f"Notification {pk} : {sent} envoyé(s), {failed} en échec")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
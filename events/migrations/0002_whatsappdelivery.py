@@ -0,0 +1,34 @@
+# Generated by Django 5.0 on 2026-10-19 11:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0001_initial'),
+        ('membres', '0003_alter_member_marital_status_alter_member_nationalite'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WhatsAppDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone', models.CharField(max_length=20, verbose_name='Numéro')),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('sent', 'Envoyé'), ('failed', 'Échoué')], default='pending', max_length=10, verbose_name='Statut')),
+                ('provider_message_id', models.CharField(blank=True, max_length=100, verbose_name='Identifiant fournisseur')),
+                ('error', models.TextField(blank=True, verbose_name='Erreur')),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('member', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='whatsapp_deliveries', to='membres.member', verbose_name='Membre')),
+                ('notification', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='events.whatsappnotification', verbose_name='Notification')),
+            ],
+            options={
+                'verbose_name': 'Envoi WhatsApp',
+                'verbose_name_plural': 'Envois WhatsApp',
+                'indexes': [models.Index(fields=['notification', 'status'], name='events_what_notific_71c6e6_idx')],
+                'unique_together': {('notification', 'phone')},
+            },
+        ),
+    ]
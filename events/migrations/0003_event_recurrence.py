@@ -0,0 +1,51 @@
+# Generated by Django 5.0 on 2026-10-19 12:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0002_whatsappdelivery'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurrenceRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('frequency', models.CharField(choices=[('daily', 'Quotidienne'), ('weekly', 'Hebdomadaire'), ('monthly', 'Mensuelle')], default='weekly', max_length=10, verbose_name='Fréquence')),
+                ('interval', models.PositiveSmallIntegerField(default=1, verbose_name='Intervalle')),
+                ('weekdays', models.JSONField(blank=True, default=list, help_text='0 = lundi ... 6 = dimanche (hebdomadaire uniquement)', verbose_name='Jours de la semaine')),
+                ('until', models.DateField(blank=True, null=True, verbose_name="Jusqu'au")),
+                ('count', models.PositiveIntegerField(blank=True, null=True, verbose_name="Nombre d'occurrences")),
+                ('exdates', models.JSONField(blank=True, default=list, verbose_name='Dates exclues')),
+            ],
+            options={
+                'verbose_name': 'Récurrence',
+                'verbose_name_plural': 'Récurrences',
+            },
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='occurrence_date',
+            field=models.DateField(blank=True, null=True, verbose_name="Date de l'occurrence"),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='series',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='occurrences', to='events.event', verbose_name='Série'),
+        ),
+        migrations.AddConstraint(
+            model_name='event',
+            constraint=models.UniqueConstraint(fields=('series', 'occurrence_date'), name='unique_event_occurrence'),
+        ),
+        migrations.AddField(
+            model_name='recurrencerule',
+            name='event',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='recurrence', to='events.event', verbose_name='Événement'),
+        ),
+    ]
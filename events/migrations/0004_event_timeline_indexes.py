@@ -0,0 +1,23 @@
+# Generated by Django 5.0 on 2026-10-19 12:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0003_event_recurrence'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['status', 'start_date', 'start_time'], name='events_even_status_e13704_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['status', 'end_date'], name='events_even_status_ac44c5_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0 on 2026-10-19 12:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0004_event_timeline_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='whatsappdelivery',
+            name='locked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='whatsappdelivery',
+            name='status',
+            field=models.CharField(choices=[('pending', 'En attente'), ('sending', "En cours d'envoi"), ('sent', 'Envoyé'), ('failed', 'Échoué')], default='pending', max_length=10, verbose_name='Statut'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0 on 2026-10-19 12:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0005_whatsappdelivery_claim'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletedEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_pk', models.BigIntegerField(verbose_name='Événement')),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Supprimé le')),
+            ],
+            options={
+                'verbose_name': 'Événement supprimé',
+                'verbose_name_plural': 'Événements supprimés',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['updated_at'], name='events_even_updated_1878aa_idx'),
+        ),
+    ]
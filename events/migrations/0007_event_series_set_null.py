@@ -0,0 +1,19 @@
+# Generated by Django 5.0 on 2026-10-19 13:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0006_feed_deletions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='event',
+            name='series',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='occurrences', to='events.event', verbose_name='Série'),
+        ),
+    ]
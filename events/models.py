@@ -1,9 +1,11 @@
-from datetime import datetime
-from django.db import models
+from datetime import datetime, timedelta
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, Q
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.core.validators import MinValueValidator
-from django.utils.text import slugify
+from apps.fragments import bump_fragment_version
+from apps.slugs import UniqueSlugMixin, assign_unique_slugs
 from django.urls import reverse
 from decimal import Decimal
 import uuid
@@ -32,7 +34,54 @@ class EventCategory(models.Model):
             return self.name
         
         
-class Event(models.Model):
+class EventQuerySet(models.QuerySet):
+    """
+    Événements à venir / en cours / passés selon la date ET l'heure locales.
+    Chaque filtre commence par le statut pour utiliser les index composites
+    (status, start_date, start_time) et (status, end_date).
+    """
+    UPCOMING_STATUSES = ('published', 'scheduled')
+    PAST_STATUSES = ('published', 'ongoing')
+    ONGOING_STATUSES = ('published', 'scheduled', 'ongoing')
+
+    @staticmethod
+    def _local_now(now=None):
+        now = timezone.localtime(now)
+        return now.date(), now.time()
+
+    @classmethod
+    def _upcoming_q(cls, now=None):
+        today, time_now = cls._local_now(now)
+        return Q(start_date__gt=today) | Q(start_date=today, start_time__gt=time_now)
+
+    @classmethod
+    def _past_q(cls, now=None):
+        today, time_now = cls._local_now(now)
+        return Q(end_date__lt=today) | Q(end_date=today, end_time__lt=time_now)
+
+    def upcoming(self, now=None, statuses=UPCOMING_STATUSES):
+        return (self.filter(self._upcoming_q(now), status__in=statuses)
+                .order_by('start_date', 'start_time'))
+
+    def past(self, now=None, statuses=PAST_STATUSES):
+        return (self.filter(self._past_q(now), status__in=statuses)
+                .order_by('-end_date', '-end_time'))
+
+    def ongoing(self, now=None, statuses=ONGOING_STATUSES):
+        return (self.filter(status__in=statuses).exclude(self._upcoming_q(now)).exclude(self._past_q(now))
+                .order_by('start_date', 'start_time'))
+
+    def timeline_counts(self, now=None):
+        """Nombre d'événements à venir, en cours et passés, en une requête"""
+        upcoming, past = self._upcoming_q(now), self._past_q(now)
+        return self.aggregate(
+            upcoming=Count('pk', filter=upcoming & Q(status__in=self.UPCOMING_STATUSES)),
+            past=Count('pk', filter=past & Q(status__in=self.PAST_STATUSES)),
+            ongoing=Count('pk', filter=~upcoming & ~past & Q(status__in=self.ONGOING_STATUSES)),
+        )
+
+
+class Event(UniqueSlugMixin, models.Model):
     STATUS_CHOICES = [
         ('draft', 'Brouillon'),
         ('scheduled', 'Programmé'),
@@ -72,6 +121,16 @@ class Event(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE,related_name='created_events', verbose_name="Créé par")
 
+    # Occurrence matérialisée d'une série récurrente (voir RecurrenceRule) ;
+    # supprimer la série garde ses occurrences, leurs présences et programmes
+    series = models.ForeignKey(
+        'self', on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='occurrences', verbose_name="Série"
+    )
+    occurrence_date = models.DateField(null=True, blank=True, verbose_name="Date de l'occurrence")
+
+    objects = EventQuerySet.as_manager()
+
     class Meta :
         
         verbose_name = "Evenement"
@@ -79,21 +138,19 @@ class Event(models.Model):
         ordering = ['-start_date', '-start_time']
         indexes = [
             models.Index(fields=['start_date', 'start_time']),
-            models.Index(fields=['slug'])  
+            models.Index(fields=['slug']),
+            models.Index(fields=['status', 'start_date', 'start_time']),
+            models.Index(fields=['status', 'end_date']),
+            models.Index(fields=['updated_at']),  # dernière modification des flux (events.feeds)
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['series', 'occurrence_date'], name='unique_event_occurrence'),
         ]
 
     def __str__(self):
         return f"{self.title} - {self.start_date.strftime('%d/%m/%Y')}"
     
     def save(self, *args, **kwargs):
-        if not self.slug:
-            base_slug = slugify(self.title)
-            slug = base_slug
-            counter = 1
-            while Event.objects.filter(slug=slug).exists():
-                slug = f"{base_slug}-{counter}"
-                counter += 1
-            self.slug = slug
         if not self.short_description:
             self.short_description = self.description[:297] + '...'   
         super().save(*args, **kwargs)        
@@ -123,6 +180,127 @@ class Event(models.Model):
     
     def get_total_expected(self):
         return self.attendances.count()
+
+    def build_occurrence(self, day):
+        """Copie non enregistrée de l'événement pour la date `day` d'une série"""
+        return Event(
+            title=self.title, category_id=self.category_id, description=self.description,
+            short_description=self.short_description, cover_image=self.cover_image,
+            thumbnail=self.thumbnail, start_date=day, start_time=self.start_time,
+            end_date=day + (self.end_date - self.start_date), end_time=self.end_time,
+            location=self.location, adress=self.adress, organizer_id=self.organizer_id,
+            status=self.status, created_by_id=self.created_by_id,
+            series=self, occurrence_date=day,
+        )
+
+
+class RecurrenceRule(models.Model):
+    """
+    Règle de récurrence d'un événement (sous-ensemble de RRULE : FREQ,
+    INTERVAL, BYDAY, UNTIL, COUNT, EXDATE). L'événement porteur est la
+    première occurrence ; les suivantes sont calculées à la volée et ne
+    deviennent des lignes Event que lorsqu'on leur rattache des présences
+    ou des programmes (materialize).
+    """
+    FREQUENCY_CHOICES = [
+        ('daily', 'Quotidienne'),
+        ('weekly', 'Hebdomadaire'),
+        ('monthly', 'Mensuelle'),
+    ]
+
+    event = models.OneToOneField(
+        Event,
+        on_delete=models.CASCADE,
+        related_name='recurrence',
+        verbose_name="Événement"
+    )
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES, default='weekly', verbose_name="Fréquence")
+    interval = models.PositiveSmallIntegerField(default=1, verbose_name="Intervalle")
+    weekdays = models.JSONField(
+        default=list, blank=True, verbose_name="Jours de la semaine",
+        help_text="0 = lundi ... 6 = dimanche (hebdomadaire uniquement)"
+    )
+    until = models.DateField(null=True, blank=True, verbose_name="Jusqu'au")
+    count = models.PositiveIntegerField(null=True, blank=True, verbose_name="Nombre d'occurrences")
+    exdates = models.JSONField(default=list, blank=True, verbose_name="Dates exclues")
+
+    class Meta:
+        verbose_name = "Récurrence"
+        verbose_name_plural = "Récurrences"
+
+    def __str__(self):
+        return f"{self.event.title} ({self.get_frequency_display()})"
+
+    def _candidates(self, start):
+        """Dates de la règle dans l'ordre, à partir de la période contenant `start`"""
+        dtstart = self.event.start_date
+        if self.frequency == 'daily':
+            step = timedelta(days=self.interval)
+            skip = max(0, (start - dtstart).days // self.interval) if self.count is None else 0
+            day = dtstart + skip * step
+            while True:
+                yield day
+                day += step
+        elif self.frequency == 'weekly':
+            weekdays = sorted(set(self.weekdays)) or [dtstart.weekday()]
+            week = dtstart - timedelta(days=dtstart.weekday())
+            if self.count is None:
+                week += timedelta(weeks=max(0, (start - week).days // 7 // self.interval * self.interval))
+            while True:
+                for weekday in weekdays:
+                    day = week + timedelta(days=weekday)
+                    if day >= dtstart:
+                        yield day
+                week += timedelta(weeks=self.interval)
+        else:
+            months = 0
+            if self.count is None:
+                elapsed = (start.year - dtstart.year) * 12 + start.month - dtstart.month
+                months = max(0, elapsed // self.interval * self.interval)
+            while True:
+                year, month = divmod(dtstart.month - 1 + months, 12)
+                try:
+                    yield dtstart.replace(year=dtstart.year + year, month=month + 1)
+                except ValueError:  # 31 du mois : mois sans ce jour ignorés, comme RRULE
+                    pass
+                months += self.interval
+
+    def dates_between(self, start, end):
+        """Dates des occurrences comprises entre `start` et `end` inclus"""
+        excluded = set(self.exdates)
+        for index, day in enumerate(self._candidates(start)):
+            if self.count is not None and index >= self.count:
+                return
+            if day > end or (self.until and day > self.until):
+                return
+            if day >= start and day.isoformat() not in excluded:
+                yield day
+
+    def includes(self, day):
+        return next(self.dates_between(day, day), None) == day
+
+    def materialize(self, dates):
+        """
+        Occurrences enregistrées pour `dates` : {date: Event}. Les manquantes
+        sont créées en un bulk_create ; la première date est l'événement porteur.
+        """
+        master = self.event
+        dates = [day for day in dict.fromkeys(dates) if self.includes(day)]
+        found = {day: master for day in dates if day == master.start_date}
+        found.update((event.occurrence_date, event) for event in
+                     master.occurrences.filter(occurrence_date__in=[d for d in dates if d not in found]))
+        missing = [master.build_occurrence(day) for day in dates if day not in found]
+        if missing:
+            try:
+                with transaction.atomic():
+                    created = Event.objects.bulk_create(assign_unique_slugs(missing))
+                found.update((event.occurrence_date, event) for event in created)
+                bump_fragment_version('events')
+            except IntegrityError:
+                # Créées entre-temps par une autre requête
+                found.update((event.occurrence_date, event) for event in
+                             master.occurrences.filter(occurrence_date__in=[e.occurrence_date for e in missing]))
+        return found
             
 class EventProgram(models.Model):
     event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='programs', verbose_name="Événement")
@@ -279,6 +457,55 @@ class WhatsAppNotification(models.Model):
         return f"WhatsApp - {self.event.title} ({self.get_status_display()})"
 
 
+class WhatsAppDelivery(models.Model):
+    """
+    Envoi d'une notification WhatsApp à un destinataire (un numéro)
+    """
+    STATUS_CHOICES = [
+        ('pending', 'En attente'),
+        ('sending', "En cours d'envoi"),
+        ('sent', 'Envoyé'),
+        ('failed', 'Échoué'),
+    ]
+    
+    notification = models.ForeignKey(
+        WhatsAppNotification,
+        on_delete=models.CASCADE,
+        related_name='deliveries',
+        verbose_name="Notification"
+    )
+    member = models.ForeignKey(
+        'membres.Member',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='whatsapp_deliveries',
+        verbose_name="Membre"
+    )
+    phone = models.CharField(max_length=20, verbose_name="Numéro")
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='pending',
+        verbose_name="Statut"
+    )
+    provider_message_id = models.CharField(max_length=100, blank=True, verbose_name="Identifiant fournisseur")
+    error = models.TextField(blank=True, verbose_name="Erreur")
+    sent_at = models.DateTimeField(null=True, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = "Envoi WhatsApp"
+        verbose_name_plural = "Envois WhatsApp"
+        unique_together = ['notification', 'phone']
+        indexes = [
+            models.Index(fields=['notification', 'status']),
+        ]
+    
+    def __str__(self):
+        return f"{self.phone} ({self.get_status_display()})"
+
+
 class EventHistory(models.Model):
     """
     Historique des modifications d'un événement
@@ -319,4 +546,20 @@ class EventHistory(models.Model):
         ordering = ['-timestamp']
     
     def __str__(self):
-        return f"{self.get_action_display()} - {self.timestamp.strftime('%d/%m/%Y %H:%M')}"
\ No newline at end of file
+        return f"{self.get_action_display()} - {self.timestamp.strftime('%d/%m/%Y %H:%M')}"
+
+
+class DeletedEvent(models.Model):
+    """
+    Trace d'un événement supprimé : une suppression ne laisse pas de
+    date de modification, les flux (events.feeds) la lisent ici
+    """
+    event_pk = models.BigIntegerField(verbose_name="Événement")
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Supprimé le")
+
+    class Meta:
+        verbose_name = "Événement supprimé"
+        verbose_name_plural = "Événements supprimés"
+
+    def __str__(self):
+        return f"Événement {self.event_pk} supprimé le {self.deleted_at:%d/%m/%Y %H:%M}"
@@ -0,0 +1,113 @@
+"""
+Calendrier des événements, séries récurrentes comprises.
+
+occurrences_between() lit en une requête (sur l'index de dates) les
+événements ponctuels de la période et les séries qui la recoupent, puis
+déroule les règles en mémoire. Les occurrences déjà matérialisées (avec
+présences ou programmes) remplacent leur équivalent calculé.
+
+timeline() s'en sert pour les listes « à venir » et « passés » : une série y
+apparaît à chacune de ses dates, une seule fois par date, au lieu du
+porteur seul à côté de ses occurrences matérialisées.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Event, EventQuerySet
+
+
+@dataclass
+class Occurrence:
+    """Une date d'événement ; `event` est la ligne Event matérialisée ou le porteur de la série"""
+    event: Event
+    date: object
+    materialized: bool = True
+
+    @property
+    def title(self):
+        return self.event.title
+
+    @property
+    def start_date(self):
+        return self.date
+
+    @property
+    def end_date(self):
+        return self.date + (self.event.end_date - self.event.start_date)
+
+    @property
+    def start(self):
+        return timezone.make_aware(datetime.combine(self.start_date, self.event.start_time))
+
+    @property
+    def end(self):
+        return timezone.make_aware(datetime.combine(self.end_date, self.event.end_time))
+
+    def as_event(self):
+        """
+        Ligne Event de l'occurrence ; pour une date calculée, copie non
+        enregistrée (build_occurrence) qui pointe vers la page de la série
+        """
+        if self.materialized:
+            return self.event
+        occurrence = self.event.build_occurrence(self.date)
+        occurrence.slug = self.event.slug
+        occurrence.category = self.event.category
+        return occurrence
+
+
+def occurrences_between(start, end, queryset=None):
+    """Occurrences commençant entre `start` et `end` (dates incluses), triées par début"""
+    queryset = Event.objects.all() if queryset is None else queryset
+    rows = queryset.filter(
+        Q(start_date__gte=start, start_date__lte=end, recurrence__isnull=True)
+        | (Q(recurrence__isnull=False, start_date__lte=end)
+           & (Q(recurrence__until__isnull=True) | Q(recurrence__until__gte=start)))
+    ).select_related('recurrence', 'category')
+
+    occurrences = []
+    materialized = set()
+    series = []
+    for event in rows:
+        if hasattr(event, 'recurrence'):
+            series.append(event)
+            continue
+        occurrences.append(Occurrence(event, event.start_date))
+        if event.series_id:
+            materialized.add((event.series_id, event.occurrence_date))
+
+    for event in series:
+        rule = event.recurrence
+        rule.event = event
+        for day in rule.dates_between(start, end):
+            if (event.pk, day) in materialized:
+                continue
+            occurrences.append(Occurrence(event, day, materialized=day == event.start_date))
+
+    occurrences.sort(key=lambda occurrence: (occurrence.date, occurrence.event.start_time))
+    return occurrences
+
+
+TIMELINE_HORIZON = timedelta(days=365)
+
+
+def timeline(now=None, past=False, limit=5, queryset=None, horizon=TIMELINE_HORIZON):
+    """
+    Prochaines occurrences (ou dernières terminées si past=True) dans la
+    limite de `horizon`, sous forme d'Event, en une requête
+    """
+    now = timezone.localtime(now)
+    today = now.date()
+    queryset = Event.objects.all() if queryset is None else queryset
+    if past:
+        found = occurrences_between(today - horizon, today,
+                                    queryset.filter(status__in=EventQuerySet.PAST_STATUSES))
+        found = sorted((o for o in found if o.end < now), key=lambda o: o.end, reverse=True)
+    else:
+        found = occurrences_between(today, today + horizon,
+                                    queryset.filter(status__in=EventQuerySet.UPCOMING_STATUSES))
+        found = [o for o in found if o.start > now]
+    return [occurrence.as_event() for occurrence in found[:limit]]
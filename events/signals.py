@@ -0,0 +1,30 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .live import queue_attendance_change
+from .models import DeletedEvent, Event, EventAttendance, EventProgram, RecurrenceRule
+
+
+@receiver([post_save, post_delete], sender=EventProgram)
+@receiver([post_save, post_delete], sender=RecurrenceRule)
+def touch_event(sender, instance, **kwargs):
+    """Programmes et récurrence font partie des flux : l'événement change de date de modification"""
+    Event.objects.filter(pk=instance.event_id).update(updated_at=timezone.now())
+
+
+@receiver(post_delete, sender=Event)
+def event_deleted(sender, instance, **kwargs):
+    """Suppression datée : les flux renvoient un Last-Modified plus récent"""
+    DeletedEvent.objects.create(event_pk=instance.pk)
+
+
+@receiver(post_save, sender=EventAttendance)
+def attendance_saved(sender, instance, **kwargs):
+    """Compteur en direct : diffusion au commit (events.live)"""
+    queue_attendance_change(instance, checked_in=instance.is_present)
+
+
+@receiver(post_delete, sender=EventAttendance)
+def attendance_deleted(sender, instance, **kwargs):
+    queue_attendance_change(instance)
@@ -1,3 +1,596 @@
-from django.test import TestCase
+import json
+from datetime import date, datetime, time, timedelta
+from time import monotonic
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from apps.slugs import assign_unique_slugs, unique_slug
+from apps.testing import QueryBudgetMixin, seed_congregation
+from membres.models import Member, Group
+from .models import (
+    Event, EventAttendance, EventCategory, EventProgram, RecurrenceRule, WhatsAppNotification, WhatsAppDelivery,
+)
+from .live import astream_attendance, channel_name, get_broker, publish_attendance
+from .recurrence import occurrences_between, timeline
+from . import whatsapp
+from .whatsapp import (
+    FakeProvider, TokenBucket, normalize_phone, prepare_deliveries, resolve_recipients, send_deliveries,
+)
+
+
+class ViewBudgetTests(QueryBudgetMixin, TestCase):
+    """Budgets de requêtes et de temps sur un jeu de données volumineux"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='budget', password='secret', role='admin')
+        cls.data = seed_congregation(organizer=cls.admin)
+        cls.event = cls.data['events'][0]
+
+    def setUp(self):
+        cache.clear()  # budgets mesurés sans fragments en cache
+        self.client.force_login(self.admin)
+        # Réchauffe les caches de session et de paramètres hors budget
+        self.client.get(reverse('events:event_list'))
+
+    def test_event_list(self):
+        self.assertViewBudget(reverse('events:event_list'), 6)
+
+    def test_event_detail(self):
+        self.assertViewBudget(reverse('events:event_detail', args=[self.event.slug]), 8)
+
+    def test_event_detail_cached_fragments(self):
+        self.client.get(reverse('events:event_detail', args=[self.event.slug]))
+        self.assertViewBudget(reverse('events:event_detail', args=[self.event.slug]), 5)
+
+    def test_attendance_list(self):
+        self.assertViewBudget(reverse('events:attendance_list', args=[self.event.pk]), 5)
+
+    def test_attendance_export(self):
+        self.assertViewBudget(reverse('events:attendance_export', args=[self.event.pk]), 4)
+
+
+class WhatsAppDispatchTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='secret', role='admin')
+        self.event = Event.objects.create(
+            title='Culte de louange', description='Soirée de louange',
+            start_date=date(2026, 5, 10), start_time=time(18, 0),
+            end_date=date(2026, 5, 10), end_time=time(20, 0),
+            organizer=self.admin, created_by=self.admin,
+        )
+        self.choir = Group.objects.create(name='Chorale', group_type='choir')
+        self.youth = Group.objects.create(name='Jeunesse', group_type='youth')
+        self.members = [
+            Member.objects.create(
+                first_name=f'Prenom{i}', last_name=f'Nom{i}', gender='M', date_of_birth=date(1990, 1, 1),
+                marital_status='single', address='Niamey', phone=phone,
+            )
+            for i, phone in enumerate(['90 12 34 56', '+227 91 00 00 01', '0022792000002', '', 'abc'])
+        ]
+        # Le premier membre est dans les deux groupes
+        self.members[0].groups.add(self.choir, self.youth)
+        self.members[1].groups.add(self.youth)
+
+    def make_notification(self, recipient_type='group'):
+        return WhatsAppNotification.objects.create(
+            event=self.event, recipient_type=recipient_type, message='Bonjour', sent_by=self.admin,
+        )
+
+    def test_normalize_phone(self):
+        self.assertEqual(normalize_phone('90 12 34 56'), '+22790123456')
+        self.assertEqual(normalize_phone('00227-91-00-00-01'), '+22791000001')
+        self.assertEqual(normalize_phone('+33 6 12 34 56 78'), '+33612345678')
+        self.assertIsNone(normalize_phone('abc'))
+        self.assertIsNone(normalize_phone(''))
+
+    def test_recipients_deduplicated_in_one_query(self):
+        notification = self.make_notification()
+        notification.groups.add(self.choir, self.youth)
+        # Groupes de la notification lus en sous-requête
+        with self.assertNumQueries(1):
+            recipients = resolve_recipients(notification)
+        self.assertEqual(sorted(phone for _, phone in recipients), ['+22790123456', '+22791000001'])
+
+    def test_all_members_skip_unusable_numbers(self):
+        notification = self.make_notification('all')
+        self.assertEqual(prepare_deliveries(notification), 3)
+        self.assertEqual(notification.deliveries.count(), 3)
+
+    def test_send_updates_counters_and_deliveries(self):
+        notification = self.make_notification('all')
+        prepare_deliveries(notification)
+        provider = FakeProvider(failing_numbers={'+22792000002'})
+        self.assertEqual(send_deliveries(notification, provider=provider, batch_size=2), (2, 1))
+
+        notification.refresh_from_db()
+        self.assertEqual((notification.successful_sends, notification.failed_sends), (2, 1))
+        self.assertEqual(notification.status, 'sent')
+        self.assertIsNotNone(notification.sent_at)
+        self.assertEqual(len(provider.sent), 2)
+        failed = WhatsAppDelivery.objects.get(status='failed')
+        self.assertEqual(failed.phone, '+22792000002')
+        self.assertIn('refusé', failed.error)
+
+        # Un second passage ne renvoie rien
+        self.assertEqual(send_deliveries(notification, provider=provider), (0, 0))
+        self.assertEqual(len(provider.sent), 2)
+
+    def test_claimed_deliveries_not_sent_twice(self):
+        notification = self.make_notification('all')
+        prepare_deliveries(notification)
+        # Un envoi concurrent (relance, double clic) a déjà réservé deux lignes
+        claimed = {delivery.phone for delivery in whatsapp._claim(notification, 2)}
+        provider = FakeProvider()
+        self.assertEqual(send_deliveries(notification, provider=provider), (1, 0))
+        self.assertFalse(claimed & {phone for phone, _ in provider.sent})
+
+        # Réservation abandonnée par un worker interrompu : reprise après STALE_LOCK
+        WhatsAppDelivery.objects.filter(status='sending').update(
+            locked_at=timezone.now() - timedelta(hours=1),
+        )
+        self.assertEqual(send_deliveries(notification, provider=provider), (2, 0))
+        self.assertEqual(len(provider.sent), 3)
+
+    def test_view_prepares_deliveries(self):
+        self.client.force_login(self.admin)
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            response = self.client.post(
+                reverse('events:whatsapp_notification', args=[self.event.pk]),
+                {'recipient_type': 'group', 'message': 'Bonjour', 'groups': [self.choir.pk, self.youth.pk]},
+            )
+        self.assertRedirects(response, reverse('events:event_detail', args=[self.event.slug]))
+        notification = WhatsAppNotification.objects.get()
+        self.assertEqual(notification.total_recipients, 2)
+        self.assertEqual(notification.deliveries.count(), 2)
+        self.assertEqual(len(callbacks), 1)
+
+    def test_audience_preview(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(
+            reverse('events:whatsapp_audience', args=[self.event.pk]),
+            {'recipient_type': 'group', 'groups': [self.youth.pk]},
+        )
+        self.assertEqual(response.json(), {'count': 2})
+
+    def test_token_bucket_limits_rate(self):
+        bucket = TokenBucket(rate=100, capacity=1)
+        start = monotonic()
+        for _ in range(6):
+            bucket.acquire()
+        # Le premier jeton est disponible, les cinq suivants arrivent toutes les 10 ms
+        self.assertGreaterEqual(monotonic() - start, 0.045)
+
+
+class EventSlugTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='secret', role='admin')
+
+    def build_event(self, title='Culte dominical', **kwargs):
+        return Event(
+            title=title, description='Culte', start_date=date(2026, 5, 10), start_time=time(9, 0),
+            end_date=date(2026, 5, 10), end_time=time(12, 0), organizer=self.admin, created_by=self.admin,
+            **kwargs
+        )
+
+    def test_slug_allocation_does_not_depend_on_duplicates(self):
+        Event.objects.bulk_create(assign_unique_slugs([self.build_event() for _ in range(30)]))
+        event = self.build_event()
+        # Lecture des slugs pris, savepoint, insertion, libération du savepoint
+        with self.assertNumQueries(4):
+            event.save()
+        self.assertEqual(event.slug, 'culte-dominical-30')
+
+    def test_other_slugs_sharing_the_prefix_are_ignored(self):
+        self.build_event('Culte dominical spécial').save()
+        event = self.build_event()
+        event.save()
+        self.assertEqual(event.slug, 'culte-dominical')
+
+    def test_retry_on_concurrent_collision(self):
+        self.build_event().save()
+        event = self.build_event()
+        # Un autre processus a pris le slug entre la lecture et l'insertion
+        with mock.patch('apps.slugs.unique_slug', side_effect=['culte-dominical', 'culte-dominical-1']):
+            event.save()
+        self.assertEqual(event.slug, 'culte-dominical-1')
+
+    def test_bulk_assignment_one_query_per_title(self):
+        self.build_event().save()
+        events = [self.build_event() for _ in range(5)] + [self.build_event('Veillée de prière')]
+        with self.assertNumQueries(2):
+            assign_unique_slugs(events)
+        self.assertEqual([event.slug for event in events], [
+            'culte-dominical-1', 'culte-dominical-2', 'culte-dominical-3',
+            'culte-dominical-4', 'culte-dominical-5', 'veillee-de-priere',
+        ])
+
+    def test_long_titles_keep_room_for_suffix(self):
+        title = 'x' * 250
+        self.build_event(title).save()
+        self.assertEqual(unique_slug(Event, title), 'x' * 198 + '-1')
+
+    def test_truncated_slugs_recognised_as_taken(self):
+        title = 'y' * 200
+        events = [self.build_event(title) for _ in range(3)]
+        for event in events:
+            event.save()
+        self.assertEqual([event.slug for event in events], ['y' * 200, 'y' * 198 + '-1', 'y' * 198 + '-2'])
+        bulk = assign_unique_slugs([self.build_event(title)])
+        self.assertEqual(bulk[0].slug, 'y' * 198 + '-3')
+
+
+class RecurrenceTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='secret', role='admin')
+        # Culte chaque dimanche à partir du 4 janvier 2026
+        self.service = Event.objects.create(
+            title='Culte dominical', description='Culte', start_date=date(2026, 1, 4), start_time=time(9, 0),
+            end_date=date(2026, 1, 4), end_time=time(12, 0), organizer=self.admin, created_by=self.admin,
+            status='published',
+        )
+        self.rule = RecurrenceRule.objects.create(event=self.service, frequency='weekly')
+
+    def test_weekly_dates(self):
+        days = list(self.rule.dates_between(date(2026, 3, 1), date(2026, 3, 31)))
+        self.assertEqual(days, [date(2026, 3, d) for d in (1, 8, 15, 22, 29)])
+
+    def test_interval_weekdays_count_and_exdates(self):
+        rule = RecurrenceRule(event=self.service, frequency='weekly', interval=2, weekdays=[2, 6],
+                              count=4, exdates=['2026-01-18'])
+        self.assertEqual(list(rule.dates_between(date(2026, 1, 1), date(2026, 12, 31))), [
+            date(2026, 1, 4), date(2026, 1, 14), date(2026, 1, 28),
+        ])
+
+    def test_monthly_skips_short_months(self):
+        self.service.start_date = self.service.end_date = date(2026, 1, 31)
+        rule = RecurrenceRule(event=self.service, frequency='monthly')
+        self.assertEqual(list(rule.dates_between(date(2026, 1, 1), date(2026, 5, 31))), [
+            date(2026, 1, 31), date(2026, 3, 31), date(2026, 5, 31),
+        ])
+
+    def test_calendar_year_in_one_query(self):
+        Event.objects.create(
+            title='Conférence', description='Conférence', start_date=date(2026, 6, 10), start_time=time(18, 0),
+            end_date=date(2026, 6, 12), end_time=time(21, 0), organizer=self.admin, created_by=self.admin,
+        )
+        with self.assertNumQueries(1):
+            occurrences = occurrences_between(date(2026, 1, 1), date(2026, 12, 31))
+        self.assertEqual(len(occurrences), 53)
+        self.assertEqual(occurrences[0].date, date(2026, 1, 4))
+        self.assertTrue(occurrences[0].materialized)
+        self.assertFalse(occurrences[1].materialized)
+        self.assertIn('Conférence', [occurrence.title for occurrence in occurrences])
+        self.assertEqual(Event.objects.count(), 2)
+
+    def test_materialize_in_bulk(self):
+        days = [date(2026, 1, 4) + timedelta(weeks=n) for n in range(10)]
+        with self.assertNumQueries(5):
+            occurrences = self.rule.materialize(days)
+        self.assertEqual(occurrences[days[0]], self.service)
+        self.assertEqual(self.service.occurrences.count(), 9)
+        self.assertEqual(occurrences[days[3]].series, self.service)
+        # Déjà matérialisées : aucune création
+        self.assertEqual(self.rule.materialize(days), occurrences)
+        self.assertEqual(Event.objects.count(), 10)
+
+        # Les occurrences enregistrées remplacent leur équivalent calculé
+        calendar = occurrences_between(days[0], days[-1])
+        self.assertEqual(len(calendar), 10)
+        self.assertTrue(all(occurrence.materialized for occurrence in calendar))
+
+    def test_timeline_expands_series_once_per_date(self):
+        materialized = self.rule.materialize([date(2026, 2, 8)])[date(2026, 2, 8)]
+        now = timezone.make_aware(datetime(2026, 2, 2, 12, 0))
+        with self.assertNumQueries(1):
+            upcoming = timeline(now)
+        self.assertEqual([event.start_date for event in upcoming],
+                         [date(2026, 2, 8), date(2026, 2, 15), date(2026, 2, 22), date(2026, 3, 1), date(2026, 3, 8)])
+        self.assertEqual(upcoming[0], materialized)
+        # Dates calculées : copies non enregistrées qui mènent à la série
+        self.assertIsNone(upcoming[1].pk)
+        self.assertEqual(upcoming[1].slug, self.service.slug)
+
+        past = timeline(now, past=True)
+        self.assertEqual([event.start_date for event in past],
+                         [date(2026, 2, 1), date(2026, 1, 25), date(2026, 1, 18), date(2026, 1, 11), date(2026, 1, 4)])
+        self.assertEqual(past[-1], self.service)
+
+    def test_deleting_series_keeps_occurrences(self):
+        occurrence = self.rule.materialize([date(2026, 1, 11)])[date(2026, 1, 11)]
+        member = Member.objects.create(
+            first_name='Awa', last_name='Issa', gender='F', date_of_birth=date(1990, 1, 1),
+            marital_status='single', address='Niamey',
+        )
+        EventAttendance.objects.create(event=occurrence, member=member, is_present=True)
+        self.service.delete()
+        occurrence.refresh_from_db()
+        self.assertIsNone(occurrence.series_id)
+        self.assertEqual(occurrence.attendances.count(), 1)
+
+    def test_attendance_on_occurrence(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('events:occurrence_attendance', args=[self.service.pk, '2026-02-01']))
+        occurrence = Event.objects.get(series=self.service, occurrence_date=date(2026, 2, 1))
+        self.assertRedirects(response, reverse('events:attendance_list', args=[occurrence.pk]))
+        self.assertEqual(occurrence.start_date, date(2026, 2, 1))
+
+        response = self.client.get(reverse('events:occurrence_attendance', args=[self.service.pk, '2026-02-02']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_detail_links_series_dates(self):
+        self.client.force_login(self.admin)
+        today = timezone.localdate()
+        day = next(self.rule.dates_between(today, today + timedelta(weeks=1)))
+        response = self.client.get(reverse('events:event_detail', args=[self.service.slug]))
+        self.assertContains(response, reverse('events:occurrence_attendance', args=[self.service.pk, day.isoformat()]))
+        self.assertContains(response, reverse('events:occurrence_programs', args=[self.service.pk, day.isoformat()]))
+
+    def test_programs_on_occurrence(self):
+        self.client.force_login(self.admin)
+        url = reverse('events:occurrence_programs', args=[self.service.pk, '2026-02-08'])
+        response = self.client.get(url)
+        occurrence = Event.objects.get(series=self.service, occurrence_date=date(2026, 2, 8))
+        self.assertRedirects(response, reverse('events:program_manage', args=[occurrence.slug]))
+        # Déjà matérialisée : même occurrence
+        self.client.get(url)
+        self.assertEqual(Event.objects.filter(series=self.service, occurrence_date=date(2026, 2, 8)).count(), 1)
+
+
+class EventFeedTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='secret', role='admin')
+        self.category = EventCategory.objects.create(name='Cultes')
+        today = date.today()
+        self.service = Event.objects.create(
+            title='Culte dominical', description='Culte; louange, prière', start_date=today, start_time=time(9, 0),
+            end_date=today, end_time=time(12, 0), organizer=self.admin, created_by=self.admin,
+            status='published', category=self.category, location='Temple',
+        )
+        RecurrenceRule.objects.create(event=self.service, frequency='weekly', count=3)
+        EventProgram.objects.create(event=self.service, title='Louange', date=today,
+                                    start_time=time(9, 0), end_time=time(10, 0))
+        self.draft = Event.objects.create(
+            title='Brouillon', description='Brouillon', start_date=today, start_time=time(9, 0),
+            end_date=today, end_time=time(12, 0), organizer=self.admin, created_by=self.admin,
+        )
+
+    def test_ical_feed(self):
+        response = self.client.get(reverse('events:ical_feed'))
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        self.assertIn('max-age=900', response['Cache-Control'])
+        body = b''.join(response.streaming_content).decode()
+        self.assertEqual(body.count('BEGIN:VEVENT'), 3)
+        self.assertIn('SUMMARY:Culte dominical', body)
+        self.assertIn('Culte\\; louange\\, prière', body)
+        self.assertIn('09:00 Louange', body)
+        self.assertNotIn('Brouillon', body)
+
+    def test_json_feed_filtered_by_category(self):
+        response = self.client.get(reverse('events:json_feed'), {'category': self.category.pk})
+        items = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(items), 3)
+        self.assertEqual(items[0]['programs'][0]['title'], 'Louange')
+        self.assertTrue(items[1]['recurring'])
+
+        response = self.client.get(reverse('events:json_feed'), {'category': self.category.pk + 1})
+        self.assertEqual(json.loads(b''.join(response.streaming_content)), [])
+
+    def test_not_modified_costs_one_query(self):
+        response = self.client.get(reverse('events:ical_feed'))
+        etag = response['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('events:ical_feed'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # Un programme modifié change la date de modification de l'événement
+        EventProgram.objects.create(event=self.service, title='Prédication', date=self.service.start_date,
+                                    start_time=time(10, 0), end_time=time(11, 0))
+        response = self.client.get(reverse('events:ical_feed'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_if_modified_since(self):
+        response = self.client.get(reverse('events:json_feed'))
+        response = self.client.get(reverse('events:json_feed'), HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_deletion_changes_last_modified(self):
+        extra = Event.objects.create(
+            title='Veillée', description='Veillée', start_date=date.today(), start_time=time(20, 0),
+            end_date=date.today(), end_time=time(22, 0), organizer=self.admin, created_by=self.admin,
+            status='published',
+        )
+        # Dates antérieures : la suppression doit être plus récente que Last-Modified
+        Event.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        last_modified = self.client.get(reverse('events:json_feed'))['Last-Modified']
+        extra.delete()
+        response = self.client.get(reverse('events:json_feed'), HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(b''.join(response.streaming_content))), 3)
+
+    def test_unpublished_event_changes_last_modified(self):
+        Event.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        last_modified = self.client.get(reverse('events:json_feed'))['Last-Modified']
+        self.service.status = 'draft'
+        self.service.save()
+        response = self.client.get(reverse('events:json_feed'), HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+
+
+class EventTimelineTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='secret', role='admin')
+        # Dimanche 10 mai 2026, 10 h (heure locale)
+        self.now = timezone.make_aware(datetime(2026, 5, 10, 10, 0))
+        self.morning = self.make_event('Culte du matin', time(8, 0), time(9, 30))
+        self.service = self.make_event('Culte principal', time(9, 30), time(12, 0))
+        self.evening = self.make_event('Veillée', time(18, 0), time(21, 0))
+        self.make_event('Brouillon', time(18, 0), time(21, 0), status='draft')
+
+    def make_event(self, title, start, end, status='published'):
+        return Event.objects.create(
+            title=title, description=title, start_date=date(2026, 5, 10), start_time=start,
+            end_date=date(2026, 5, 10), end_time=end, organizer=self.admin, created_by=self.admin, status=status,
+        )
+
+    def test_same_day_events_split_by_time(self):
+        self.assertEqual(list(Event.objects.upcoming(self.now)), [self.evening])
+        self.assertEqual(list(Event.objects.ongoing(self.now)), [self.service])
+        self.assertEqual(list(Event.objects.past(self.now)), [self.morning])
+
+    def test_counts_in_one_query(self):
+        with self.assertNumQueries(1):
+            counts = Event.objects.timeline_counts(self.now)
+        self.assertEqual(counts, {'upcoming': 1, 'ongoing': 1, 'past': 1})
+
+
+class EventFragmentCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(username='admin', password='secret', role='admin')
+        self.client.force_login(self.admin)
+        today = date.today()
+        # Données validées : leurs changements de version ne restent pas en attente
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_fixtures(today)
+        self.url = reverse('events:event_detail', args=[self.event.slug])
+
+    def create_fixtures(self, today):
+        self.event = Event.objects.create(
+            title='Convention', description='Convention', start_date=today, start_time=time(9, 0),
+            end_date=today, end_time=time(18, 0), organizer=self.admin, created_by=self.admin,
+            status='published',
+        )
+        self.member = Member.objects.create(
+            first_name='Awa', last_name='Issa', gender='F', date_of_birth=date(1990, 1, 1),
+            marital_status='single', address='Niamey',
+        )
+
+    def test_programs_refreshed_after_save(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            EventProgram.objects.create(event=self.event, title='Louange', date=self.event.start_date,
+                                        start_time=time(9, 0), end_time=time(10, 0))
+        self.assertContains(self.client.get(self.url), 'Louange')
+
+    def test_attendance_counts_refreshed_after_save(self):
+        self.assertContains(self.client.get(self.url), 'Présences (0/0)')
+        with self.captureOnCommitCallbacks(execute=True):
+            EventAttendance.objects.create(event=self.event, member=self.member, is_present=True)
+        self.assertContains(self.client.get(self.url), 'Présences (1/1)')
+
+
+
+@override_settings(LIVE_STREAM_TIMEOUT=0.3, LIVE_HEARTBEAT=0.1)
+class LiveAttendanceTests(TestCase):
+    """Compteur de présence en direct : une diffusion par transaction"""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='secret', role='admin')
+        self.client.force_login(self.admin)
+        today = date.today()
+        self.event = Event.objects.create(
+            title='Culte', description='Culte', start_date=today, start_time=time(9, 0),
+            end_date=today, end_time=time(12, 0), organizer=self.admin, created_by=self.admin,
+            status='ongoing',
+        )
+        self.members = [
+            Member.objects.create(
+                first_name=first_name, last_name='Issa', gender='F', date_of_birth=date(1990, 1, 1),
+                marital_status='single', address='Niamey',
+            )
+            for first_name in ('Awa', 'Mariama')
+        ]
+
+    def received(self, subscription):
+        messages = []
+        while (message := subscription.get(0.01)) is not None:
+            messages.append(json.loads(message))
+        return messages
+
+    def subscribe(self):
+        return get_broker().subscribe(channel_name(self.event.pk))
+
+    def test_check_in_broadcasts_counts_and_member(self):
+        url = reverse('events:attendance_mark', args=[self.event.pk, self.members[0].pk])
+        with self.subscribe() as subscription:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(url)
+            messages = self.received(subscription)
+        self.assertEqual(len(messages), 1)
+        self.assertEqual((messages[0]['present'], messages[0]['total']), (1, 1))
+        self.assertEqual([arrival['name'] for arrival in messages[0]['checked_in']], ['Awa Issa'])
+
+    def test_bulk_add_broadcasts_once(self):
+        url = reverse('events:attendance_add_members', args=[self.event.pk])
+        with self.subscribe() as subscription:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(url, {'members': [member.pk for member in self.members]})
+            messages = self.received(subscription)
+        self.assertEqual(len(messages), 1)
+        self.assertEqual((messages[0]['present'], messages[0]['total']), (0, 2))
+
+    def test_rolled_back_changes_not_broadcast(self):
+        with self.subscribe() as subscription:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                EventAttendance.objects.create(event=self.event, member=self.members[0], is_present=True)
+                raise RuntimeError
+            with self.captureOnCommitCallbacks(execute=True):
+                EventAttendance.objects.create(event=self.event, member=self.members[1], is_present=True)
+            messages = self.received(subscription)
+        self.assertEqual(len(messages), 1)
+        self.assertEqual([arrival['name'] for arrival in messages[0]['checked_in']], ['Mariama Issa'])
+
+    def test_stream_sends_counts_then_updates(self):
+        response = self.client.get(reverse('events:attendance_stream', args=[self.event.pk]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        frames = iter(response.streaming_content)
+        first = next(frames).decode()
+        self.assertIn('retry: 3000', first)
+        self.assertIn('"present": 0', first)
+        publish_attendance(self.event.pk)
+        self.assertIn('event: attendance', next(frames).decode())
+        # Le flux se termine seul (LIVE_STREAM_TIMEOUT) : le navigateur se reconnecte
+        self.assertTrue(all(frame == b': ping\n\n' for frame in frames))
+
+    def test_async_stream_waits_on_event_loop(self):
+        async def consume():
+            frames = astream_attendance(self.event.pk)
+            first = await anext(frames)
+            await sync_to_async(publish_attendance)(self.event.pk)
+            second = await anext(frames)
+            await frames.aclose()
+            return first, second
+
+        with mock.patch('events.live.sync_to_async', wraps=sync_to_async) as wrapped:
+            first, second = async_to_sync(consume)()
+        self.assertIn('"present": 0', first)
+        self.assertIn('event: attendance', second)
+        # Seule la lecture des compteurs passe par un thread, pas l'attente des messages
+        self.assertEqual(wrapped.call_count, 1)
+        self.assertEqual(get_broker().subscriber_count(channel_name(self.event.pk)), 0)
+
+    def test_list_polls_counts_under_wsgi(self):
+        response = self.client.get(reverse('events:attendance_list', args=[self.event.pk]))
+        self.assertNotContains(response, 'new EventSource')
+        self.assertContains(response, reverse('events:attendance_counts', args=[self.event.pk]))
+
+    def test_counts_endpoint(self):
+        EventAttendance.objects.create(event=self.event, member=self.members[0], is_present=True)
+        response = self.client.get(reverse('events:attendance_counts', args=[self.event.pk]))
+        self.assertEqual(response.json()['present'], 1)
+        self.assertEqual(response.json()['checked_in'], [])
+
+    def test_stream_requires_admin_access(self):
+        fidele = User.objects.create_user(username='fidele', password='secret', role='membre')
+        self.client.force_login(fidele)
+        response = self.client.get(reverse('events:attendance_stream', args=[self.event.pk]))
+        self.assertEqual(response.status_code, 403)
@@ -1,7 +1,7 @@
 # events/urls.py (version nettoyée et corrigée)
 
 from django.urls import path
-from . import views
+from . import feeds, views
 
 app_name = 'events'  # Namespace pour éviter conflits
 
@@ -9,6 +9,9 @@ urlpatterns = [
     # Liste des événements
     path('', views.EventList.as_view(), name='event_list'),
     path('create/', views.event_manage_view, name='event_create'),
+    # Flux calendrier (iCal / JSON)
+    path('feed.ics', feeds.ical_feed_view, name='ical_feed'),
+    path('feed.json', feeds.json_feed_view, name='json_feed'),
     # Détail d'un événement
     path('<slug:slug>/', views.EventDetailView.as_view(), name='event_detail'),
     path('<slug:slug>/edit/', views.EventUpdate.as_view(), name='event_edit'),
@@ -23,6 +26,10 @@ urlpatterns = [
     path('<int:event_pk>/attendance/', views.attendance_list_view, name='attendance_list'),
     path('<int:event_pk>/attendance/add/', views.attendance_add_members_view, name='attendance_add_members'),
     path('<int:event_pk>/attendance/<int:member_pk>/mark/', views.attendance_mark_view, name='attendance_mark'),
+    path('<int:event_pk>/attendance/live/', views.attendance_stream_view, name='attendance_stream'),
+    path('<int:event_pk>/attendance/counts/', views.attendance_counts_view, name='attendance_counts'),
+    path('<int:event_pk>/occurrence/<str:occurrence_date>/attendance/', views.occurrence_attendance_view, name='occurrence_attendance'),
+    path('<int:event_pk>/occurrence/<str:occurrence_date>/programs/', views.occurrence_program_view, name='occurrence_programs'),
     
     
     # Export présence
@@ -30,6 +37,7 @@ urlpatterns = [
     
     # Notifications WhatsApp
     path('<int:event_pk>/whatsapp/', views.watsapp_notification_view, name='whatsapp_notification'),
+    path('<int:event_pk>/whatsapp/audience/', views.whatsapp_audience_view, name='whatsapp_audience'),
     
     # Historique
     path('<int:event_pk>/history/', views.event_history_view, name='event_history'),
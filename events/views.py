@@ -3,32 +3,46 @@ import csv
 from datetime import date
 from django.utils import timezone
 from django.contrib.auth.decorators import login_required
+from accounts.permissions import RoleRequiredMixin, get_permissions, require_role
 from .forms import Event, EventForm, EventProgram, EventSubProgram, WhatsAppNotification,EventProgramForm, WhatsAppNotificationForm
 from urllib import response
-from django.contrib.auth.mixins import UserPassesTestMixin
-from django.http import HttpResponse, JsonResponse
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from .models import *
 from django.views.generic import ListView as listViews
-from django.db.models import Q
+from django.db.models import Count, Q
 from django.views.generic import DetailView, CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy
-from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
 from membres.models import Member
+from membres.audience import Segment
+from .live import astream_attendance, attendance_snapshot, stream_attendance
+from .recurrence import timeline
+from .whatsapp import prepare_deliveries, queue_dispatch
+from apps.fragments import deferred, fragment_context
 from django import forms
 from datetime import timedelta
 
 
-class AdminRequiredMixin(UserPassesTestMixin):
-    def test_func(self):
-        return self.request.user.is_staff or self.request.user.is_superuser
+class AdminRequiredMixin(RoleRequiredMixin):
+    """Réservé aux administrateurs (rôle, pas is_staff : comme les vues fonctions)"""
+    required_roles = ('admin',)
+    permission_denied_url = 'events:event_list'
+    permission_denied_message = "Accès non autorisé."
     
 from django.utils import timezone
 from django.db.models import Q
 from django.views.generic import ListView
 from .models import Event, EventCategory
 
+EVENT_TIMELINE_LIMIT = 5
+# Dates d'une série proposées sur sa page : deux semaines passées (présences à saisir), huit à venir
+SERIES_DATES_WINDOW = (timedelta(weeks=2), timedelta(weeks=8))
+
+
 class EventList(ListView):
     model = Event
     template_name = 'events/events_list.html'
@@ -61,22 +75,16 @@ class EventList(ListView):
         now = timezone.now()
 
         context['categories'] = EventCategory.objects.filter(is_active=True)
-        
-        # ✅ Événements à venir : commencent après maintenant OU en cours
-        context['upcoming_events'] = Event.objects.filter(
-            start_date__gte=now,
-            status__in=['published', 'scheduled']
-        ).order_by('start_date')
-
-        # ✅ Événements passés : ceux qui sont terminés
-        context['past_events'] = Event.objects.filter(
-            end_date__lt=now,
-            status__in=['published', 'ongoing']
-        ).order_by('-end_date')
-
-        # ✅ Compteurs (optionnel)
-        context['upcoming_count'] = context['upcoming_events'].count()
-        context['past_count'] = context['past_events'].count()
+
+        # Listes limitées, séries déroulées (évaluées seulement si le gabarit les affiche)
+        context['upcoming_events'] = deferred(lambda: timeline(now, limit=EVENT_TIMELINE_LIMIT))
+        context['past_events'] = deferred(lambda: timeline(now, past=True, limit=EVENT_TIMELINE_LIMIT))
+
+        # Compteurs en une seule requête
+        counts = Event.objects.timeline_counts(now)
+        context['upcoming_count'] = counts['upcoming']
+        context['past_count'] = counts['past']
+        context['ongoing_count'] = counts['ongoing']
 
         return context
 
@@ -88,41 +96,38 @@ class EventDetailView(DetailView):
     slug_url_kwarg = 'slug'
 
     def get_queryset(self):
-        # Optimisation globale : prefetch pour relations reverse, select pour forward
-        return Event.objects.prefetch_related(
-            'attendances__member',
-            'attendances__recorded_by',
-            'programs__sub_programs'
-        ).select_related('organizer')  # Ex. si forward 'organizer'
+        # Programme et présences sont lus par les widgets, à la demande
+        return Event.objects.select_related('organizer', 'category', 'recurrence')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        event = self.object  # self.object est bien reconnu
-
-        # Programmes liés (prefetch déjà fait dans queryset)
-        context['programs'] = event.programs.all()
-
-        # Statistiques de présence
-        context['attendances_count'] = event.get_attendances_count()
-        context['total_expected'] = event.get_total_expected()
-
-        # Attendances (corrigé : prefetch_related pour reverse ManyToOne)
-        context['attendances'] = event.attendances.prefetch_related('member', 'recorded_by').all()
+        event = self.object
+
+        # Widgets mis en cache dans le gabarit : calculés seulement si le fragment est rendu
+        context['programs'] = deferred(lambda: list(event.programs.prefetch_related('sub_programs')))
+        stats = deferred(lambda: event.attendances.aggregate(
+            present=Count('pk', filter=Q(is_present=True)),
+            total=Count('pk'),
+        ))
+        context['attendance_count'] = deferred(lambda: stats()['present'])
+        context['total_expected'] = deferred(lambda: stats()['total'])
+        context['fragments'] = fragment_context(self.request, 'events', 'attendances')
 
         # Vérifier si l'utilisateur est inscrit
-        if self.request.user.is_authenticated:
-            try:
-                member = self.request.user.member_profile
-                context['user_attendance'] = EventAttendance.objects.filter(
-                    event=event,
-                    member=member
-                ).first()
-            except:
-                context['user_attendance'] = None
+        if self.request.user.is_authenticated and hasattr(self.request.user, 'member_profile'):
+            member = self.request.user.member_profile
+            context['user_attendance'] = deferred(
+                lambda: EventAttendance.objects.filter(event=event, member=member).first()
+            )
 
-        # Historique (admin seulement – corrigé : prefetch si reverse)
-        if self.request.user.is_authenticated and self.request.user.has_admin_access:
-            context['history'] = event.history.prefetch_related('performed_by').all()[:10]  # Corrigé pour reverse
+        # Historique (admin seulement)
+        if get_permissions(self.request.user).admin:
+            context['history'] = event.history.select_related('performed_by')[:10]
+            # Série : présences et programme de chaque date, occurrence créée au premier accès
+            if hasattr(event, 'recurrence'):
+                today = timezone.localdate()
+                before, after = SERIES_DATES_WINDOW
+                context['series_dates'] = list(event.recurrence.dates_between(today - before, today + after))
 
         return context
 
@@ -130,13 +135,9 @@ class EventDetailView(DetailView):
 
 
 
-@login_required
+@require_role('admin', redirect_to='events:event_list', message="Accès non autorisé.")
 def event_manage_view(request, event_slug=None):
     """Vue pour créer ou modifier un événement (admin only)"""
-    if not request.user.has_admin_access():  # Vérifie admin
-        messages.error(request, "Accès non autorisé.")
-        return redirect('events:event_list')
-    
     event = get_object_or_404(Event, slug=event_slug) if event_slug else None
 
     form = EventForm(request.POST or None, request.FILES or None, instance=event)
@@ -159,7 +160,7 @@ def event_manage_view(request, event_slug=None):
     }
     return render(request, 'events/events_create.html', context)
     
-class EventUpdate(LoginRequiredMixin, AdminRequiredMixin, UpdateView):
+class EventUpdate(AdminRequiredMixin, UpdateView):
     model = Event
     form_class = EventForm
     template_name ='events/events_create.html'
@@ -179,7 +180,7 @@ class EventUpdate(LoginRequiredMixin, AdminRequiredMixin, UpdateView):
     def get_success_url(self):
         return reverse_lazy('events:event_detail', kwargs={'slug': self.object.slug})
     
-class EventDelete(LoginRequiredMixin, AdminRequiredMixin, DeleteView):
+class EventDelete(AdminRequiredMixin, DeleteView):
     model = Event
     template_name ='events/events_delete.html'
 
@@ -190,13 +191,9 @@ class EventDelete(LoginRequiredMixin, AdminRequiredMixin, DeleteView):
         return redirect('events:event_list')
 
 
-@login_required
+@require_role('admin', redirect_to='events:event_list', message="Accès non autorisé")
 def program_manage_view(request, event_slug):
     """Vue pour gérer les programmes d'un événement (liste + ajout)"""
-    if not request.user.has_admin_access():
-        messages.error(request, "Accès non autorisé")
-        return redirect('events:event_list')
-
     # Récupérer l'événement
     event = get_object_or_404(Event, slug=event_slug)
     programs = event.programs.all().order_by('order', 'date', 'start_time')
@@ -222,13 +219,9 @@ def program_manage_view(request, event_slug):
     }
     return render(request, 'events/program_manage.html', context)
 
-@login_required
+@require_role('admin', redirect_to='events:event_list', message="Accès non autorisé")
 def program_delete_view(request, program_pk):
     """Supprimer un programme (admin seulement)"""
-    if not request.user.has_admin_access():
-        messages.error(request, "Accès non autorisé")
-        return redirect('events:event_list')
-
     program = get_object_or_404(EventProgram, pk=program_pk)
     event_slug = program.event.slug  # On récupère le slug de l'événement parent
     program.delete()
@@ -236,52 +229,87 @@ def program_delete_view(request, program_pk):
     return redirect('events:program_manage', event_slug=event_slug)
 
 
-@login_required
+@require_role('admin', redirect_to='events:event_list', message="Accès non autorisé")
 def attendance_list_view(request, event_pk):
-    if not request.user.has_admin_access():
-        messages.error(request,"Accès non autorisé")
-        return redirect('events:event_list')
-    
     event = get_object_or_404(Event, pk=event_pk)
     attendance = event.attendances.select_related('member','recorded_by').all()
-    total = attendance.count()
-    present = attendance.filter(is_present=True).count()
-    absent = total - present
-    context = {
-        'event': event,
-        'attendances': attendance,
-        'total': total,
-        'present': present,
-        'absent': absent,
-        'rate': round((present / total * 100) if total > 0 else 0, 2)
-    }
+    # Compteurs en une requête ; ensuite tenus à jour par le flux en direct (ASGI)
+    # ou relus périodiquement (WSGI), voir events.live
+    context = dict(
+        attendance_snapshot(event.pk), event=event, attendances=attendance,
+        live_stream=isinstance(request, ASGIRequest),
+        poll_interval=getattr(settings, 'LIVE_POLL_INTERVAL', 15) * 1000,
+    )
     return render (request, 'events/attendance_list.html', context)
-    
 
-@login_required
+
+@require_role('admin', json=True)
+def attendance_counts_view(request, event_pk):
+    """Compteurs de présence en JSON, relus par la page servie en WSGI"""
+    event = get_object_or_404(Event.objects.only('pk'), pk=event_pk)
+    return JsonResponse(dict(attendance_snapshot(event.pk), checked_in=[]))
+
+
+@require_role('admin', json=True)
+def attendance_stream_view(request, event_pk):
+    """Compteurs de présence en direct (Server-Sent Events), voir events.live"""
+    event = get_object_or_404(Event.objects.only('pk'), pk=event_pk)
+    stream = astream_attendance(event.pk) if isinstance(request, ASGIRequest) else stream_attendance(event.pk)
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx : messages transmis sans mise en tampon
+    return response
+
+
+def _materialized_occurrence(event_pk, occurrence_date):
+    """Occurrence enregistrée d'une série à cette date (créée au besoin), sinon 404"""
+    rule = get_object_or_404(RecurrenceRule.objects.select_related('event'), event__pk=event_pk)
+    try:
+        day = date.fromisoformat(occurrence_date)
+    except ValueError:
+        raise Http404("Date invalide")
+    occurrence = rule.materialize([day]).get(day)
+    if occurrence is None:
+        raise Http404("Cette date ne fait pas partie de la série")
+    return occurrence
+
+
+@require_role('admin', redirect_to='events:event_list', message="Accès non autorisé.")
+def occurrence_attendance_view(request, event_pk, occurrence_date):
+    """Matérialise une occurrence d'une série puis ouvre sa feuille de présence"""
+    occurrence = _materialized_occurrence(event_pk, occurrence_date)
+    return redirect('events:attendance_list', event_pk=occurrence.pk)
+
+
+@require_role('admin', redirect_to='events:event_list', message="Accès non autorisé.")
+def occurrence_program_view(request, event_pk, occurrence_date):
+    """Matérialise une occurrence d'une série puis ouvre la gestion de ses programmes"""
+    occurrence = _materialized_occurrence(event_pk, occurrence_date)
+    return redirect('events:program_manage', event_slug=occurrence.slug)
+
+@require_role('admin', json=True)
 def attendance_mark_view(request, event_pk, member_pk):
-    if not request.user.has_admin_access:
-        return JsonResponse({'error': 'Non autorisé'}, status=403)
-    
     event = get_object_or_404(Event, pk=event_pk)
     member = get_object_or_404(Member, pk=member_pk)
     
-    attendance, created = EventAttendance.objects.get_or_create(
-        event=event,
-        member=member,
-        defaults={
-            'recorded_by': request.user,
-            'is_present':True,
-            'check_in_time': timezone.now()
-        }
-    )
-    if not created:
-        # Basculer la présence
-        attendance.is_present = not attendance.is_present
-        if attendance.is_present:
-            attendance.check_in_time = timezone.now()
-        attendance.recorded_by = request.user
-    attendance.save()
+    # Une seule diffusion aux écrans en direct, au commit (events.live)
+    with transaction.atomic():
+        attendance, created = EventAttendance.objects.get_or_create(
+            event=event,
+            member=member,
+            defaults={
+                'recorded_by': request.user,
+                'is_present':True,
+                'check_in_time': timezone.now()
+            }
+        )
+        if not created:
+            # Basculer la présence
+            attendance.is_present = not attendance.is_present
+            if attendance.is_present:
+                attendance.check_in_time = timezone.now()
+            attendance.recorded_by = request.user
+            attendance.save()
 
     return JsonResponse({
         'success': True,
@@ -290,26 +318,23 @@ def attendance_mark_view(request, event_pk, member_pk):
     })
     
 
-@login_required
+@require_role('admin', redirect_to='events:event_list', message="Accès non autorisé.")
 def attendance_add_members_view(request, event_pk):
     """Ajouter des membres à la liste de présence"""
-    if not request.user.has_admin_access():
-        messages.error(request, "Accès non autorisé.")
-        return redirect('events:event_list')
-    
     event = get_object_or_404(Event, pk=event_pk)
     
     if request.method == 'POST':
         member_ids = request.POST.getlist('members')
         from membres.models import Member
         
-        for member_id in member_ids:
-            member = Member.objects.get(pk=member_id)
-            EventAttendance.objects.get_or_create(
-                event=event,
-                member=member,
-                defaults={'recorded_by': request.user}
-            )
+        # Une transaction : les écrans en direct reçoivent un seul message pour tout le lot
+        with transaction.atomic():
+            for member in Member.objects.filter(pk__in=member_ids):
+                EventAttendance.objects.get_or_create(
+                    event=event,
+                    member=member,
+                    defaults={'recorded_by': request.user}
+                )
         
         messages.success(request, f'{len(member_ids)} membre(s) ajouté(s) à la liste.')
         return redirect('events:attendance_list', event_pk=event.pk)
@@ -325,12 +350,8 @@ def attendance_add_members_view(request, event_pk):
     }
     return render(request, 'events/attendance_add.html', context)
 
-@login_required
+@require_role('admin', redirect_to='events:event_list', message="Accès non autorisé.")
 def watsapp_notification_view(request, event_pk):
-    if not request.user.has_admin_access():
-        messages.error(request, "Accès non autorisé.")
-        return redirect('events:event_list')
-
     event = get_object_or_404(Event, pk=event_pk)
 
     if request.method == 'POST':
@@ -342,17 +363,9 @@ def watsapp_notification_view(request, event_pk):
             notification.save()
             form.save_m2m()
 
-            # Calcul des destinataires
-            total = 0
-            if notification.recipient_type == 'all':
-                total = Member.objects.filter(phone__isnull=False).count()
-            elif notification.recipient_type == 'group':
-                for group in notification.groups.all():
-                    total += group.members.filter(phone__isnull=False).count()
-            elif notification.recipient_type == 'individual':
-                total = notification.individual_members.filter(phone__isnull=False).count()
-            notification.total_recipients = total
-            notification.save()
+            # Destinataires dédoublonnés, envoi en arrière-plan après le commit
+            total = prepare_deliveries(notification)
+            queue_dispatch(notification)
 
             # Historique
             EventHistory.objects.create(
@@ -385,6 +398,16 @@ Nous vous attendons nombreux !
     }
     return render(request, 'events/whatsapp_notification.html', context)
 
+@require_role('admin', json=True)
+def whatsapp_audience_view(request, event_pk):
+    """Nombre de destinataires joignables, pour l'aperçu avant envoi"""
+    segment = Segment.for_recipients(
+        request.GET.get('recipient_type', 'all'),
+        groups=[int(pk) for pk in request.GET.getlist('groups') if pk.isdigit()],
+        members=[int(pk) for pk in request.GET.getlist('individual_members') if pk.isdigit()],
+    )
+    return JsonResponse({'count': segment.count()})
+
 @login_required
 def event_history_view(request, event_pk):
     event = get_object_or_404(Event, pk=event_pk)
@@ -397,11 +420,8 @@ def event_history_view(request, event_pk):
     return render(request, 'events/event_history.html', context)
 
 
+@require_role('admin', redirect_to='events:event_list', message="Accès non autorisé.")
 def attendance_export_view(request, event_pk):
-    if not request.user.has_admin_access():
-        messages.error(request, "Accès non autorisé.")
-        return redirect('events:event_list')
-
     event = get_object_or_404(Event, pk=event_pk)
     attendances = EventAttendance.objects.filter(event=event).select_related('member')
 
@@ -0,0 +1,233 @@
+"""
+Moteur d'envoi des notifications WhatsApp.
+
+1. prepare_deliveries() : destinataires résolus par un segment d'audience
+   (sans doublon, même si un membre est dans plusieurs groupes), numéros
+   normalisés au format international, une ligne WhatsAppDelivery par numéro.
+2. send_deliveries() : chaque lot est d'abord réservé (pending -> sending,
+   sans doublon entre workers, comme notifications.outbox) : deux envois
+   simultanés de la même notification (relance, double clic) ne
+   contactent jamais deux fois le même numéro. Envoi via le fournisseur configuré
+   (WHATSAPP_PROVIDER), en parallèle dans un pool de threads, débit limité
+   par un seau à jetons. Les compteurs de la notification sont incrémentés
+   avec F() après chaque lot : plusieurs workers peuvent écrire sans se
+   marcher dessus.
+
+Fournisseurs : TwilioProvider (production) et FakeProvider (tests, local).
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from membres.audience import Segment, normalize_phone  # noqa: F401  (normalize_phone réexporté)
+from .models import WhatsAppNotification, WhatsAppDelivery
+
+logger = logging.getLogger(__name__)
+
+# Un envoi resté « en cours » plus longtemps vient d'un worker interrompu
+STALE_LOCK = timedelta(minutes=10)
+
+
+# ----------------------------------------------------------------------
+# Destinataires
+# ----------------------------------------------------------------------
+def resolve_recipients(notification):
+    """
+    Destinataires d'une notification (voir membres.audience) :
+    liste de (member_id, numéro normalisé), un numéro n'apparaissant qu'une fois.
+    """
+    return Segment.from_notification(notification).recipients()
+
+
+# ----------------------------------------------------------------------
+# Fournisseurs
+# ----------------------------------------------------------------------
+class ProviderError(Exception):
+    """Échec d'envoi d'un message par le fournisseur"""
+
+
+class WhatsAppProvider:
+    """Interface des fournisseurs : send() renvoie l'identifiant du message"""
+    rate = None  # messages par seconde autorisés par le fournisseur
+
+    def send(self, phone, body):
+        raise NotImplementedError
+
+
+class TwilioProvider(WhatsAppProvider):
+    def __init__(self, account_sid, auth_token, from_number, rate=None):
+        from twilio.rest import Client  # dépendance optionnelle
+
+        self.client = Client(account_sid, auth_token)
+        self.from_number = from_number
+        self.rate = rate
+
+    def send(self, phone, body):
+        from twilio.base.exceptions import TwilioException
+
+        try:
+            message = self.client.messages.create(
+                from_=f'whatsapp:{self.from_number}',
+                to=f'whatsapp:{phone}',
+                body=body,
+            )
+        except TwilioException as exc:
+            raise ProviderError(str(exc)) from exc
+        return message.sid
+
+
+class FakeProvider(WhatsAppProvider):
+    """Fournisseur local : conserve les messages, échoue pour les numéros donnés"""
+
+    def __init__(self, failing_numbers=(), rate=None):
+        self.failing_numbers = set(failing_numbers)
+        self.rate = rate
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def send(self, phone, body):
+        if phone in self.failing_numbers:
+            raise ProviderError(f'Numéro refusé : {phone}')
+        with self._lock:
+            self.sent.append((phone, body))
+            return f'fake-{len(self.sent)}'
+
+
+def get_provider():
+    provider_class = import_string(getattr(settings, 'WHATSAPP_PROVIDER', 'events.whatsapp.FakeProvider'))
+    return provider_class(**getattr(settings, 'WHATSAPP_PROVIDER_OPTIONS', {}))
+
+
+class TokenBucket:
+    """Limiteur de débit partagé entre threads (rate jetons par seconde)"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# ----------------------------------------------------------------------
+# Envoi
+# ----------------------------------------------------------------------
+def prepare_deliveries(notification):
+    """Crée les lignes d'envoi et fixe le nombre de destinataires"""
+    recipients = resolve_recipients(notification)
+    WhatsAppDelivery.objects.bulk_create(
+        [WhatsAppDelivery(notification=notification, member_id=member_id, phone=phone)
+         for member_id, phone in recipients],
+        ignore_conflicts=True,
+    )
+    notification.total_recipients = len(recipients)
+    notification.save(update_fields=['total_recipients'])
+    return len(recipients)
+
+
+def _claim(notification, batch_size):
+    """Réserve un lot d'envois dus de la notification (sans doublon entre workers)"""
+    now = timezone.now()
+    due = Q(status='pending') | Q(status='sending', locked_at__lt=now - STALE_LOCK)
+    with transaction.atomic():
+        ids = list(
+            notification.deliveries.select_for_update(skip_locked=True)
+            .filter(due)
+            .order_by('pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        # Condition répétée : sans verrou de ligne (SQLite), seul le premier UPDATE gagne
+        WhatsAppDelivery.objects.filter(due, pk__in=ids).update(status='sending', locked_at=now)
+    return list(WhatsAppDelivery.objects.filter(pk__in=ids, status='sending', locked_at=now).order_by('pk'))
+
+
+def send_deliveries(notification, provider=None, batch_size=None, max_workers=None):
+    """
+    Envoie les messages encore en attente d'une notification.
+    Retourne (envoyés, échoués) pour cet appel.
+    """
+    provider = provider or get_provider()
+    batch_size = batch_size or getattr(settings, 'WHATSAPP_BATCH_SIZE', 100)
+    max_workers = max_workers or getattr(settings, 'WHATSAPP_MAX_WORKERS', 8)
+    rate = provider.rate or getattr(settings, 'WHATSAPP_RATE', None)
+    bucket = TokenBucket(rate) if rate else None
+
+    WhatsAppNotification.objects.filter(pk=notification.pk).update(status='sending')
+
+    def send_one(delivery):
+        if bucket:
+            bucket.acquire()
+        delivery.locked_at = None
+        try:
+            delivery.provider_message_id = provider.send(delivery.phone, notification.message) or ''
+            delivery.status = 'sent'
+            delivery.sent_at = timezone.now()
+        except Exception as exc:
+            delivery.status = 'failed'
+            delivery.error = str(exc)[:1000]
+        return delivery
+
+    sent = failed = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while True:
+            batch = _claim(notification, batch_size)
+            if not batch:
+                break
+            results = list(pool.map(send_one, batch))
+            batch_sent = sum(1 for delivery in results if delivery.status == 'sent')
+            batch_failed = len(results) - batch_sent
+            with transaction.atomic():
+                WhatsAppDelivery.objects.bulk_update(
+                    results, ['status', 'provider_message_id', 'error', 'sent_at', 'locked_at']
+                )
+                WhatsAppNotification.objects.filter(pk=notification.pk).update(
+                    successful_sends=F('successful_sends') + batch_sent,
+                    failed_sends=F('failed_sends') + batch_failed,
+                )
+            sent += batch_sent
+            failed += batch_failed
+
+    notification.refresh_from_db(fields=['successful_sends', 'failed_sends', 'total_recipients'])
+    notification.status = 'failed' if notification.total_recipients and not notification.successful_sends else 'sent'
+    notification.sent_at = timezone.now()
+    notification.save(update_fields=['status', 'sent_at'])
+    return sent, failed
+
+
+def queue_dispatch(notification):
+    """Envoi en arrière-plan après le commit (WHATSAPP_DISPATCH = 'thread')"""
+    if getattr(settings, 'WHATSAPP_DISPATCH', 'thread') != 'thread':
+        return
+    notification_pk = notification.pk
+    transaction.on_commit(lambda: threading.Thread(
+        target=_send_in_thread, args=(notification_pk,), name='whatsapp-dispatch', daemon=True,
+    ).start())
+
+
+def _send_in_thread(notification_pk):
+    try:
+        send_deliveries(WhatsAppNotification.objects.get(pk=notification_pk))
+    except Exception:
+        logger.exception("Échec de l'envoi de la notification WhatsApp %s", notification_pk)
+    finally:
+        connections.close_all()
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class FinanceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'finance'
+
+    def ready(self):
+        from apps.fragments import connect_fragment_signals
+        connect_fragment_signals(self.label)
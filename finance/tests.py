@@ -1,3 +1,56 @@
+from asgiref.sync import async_to_sync
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
 
-# Create your tests here.
+from accounts.models import User
+from apps import fanout
+from apps.testing import QueryBudgetMixin, seed_congregation, view_request
+from .views import finance_dashboard_async, finance_dashboard_queries
+
+
+class ViewBudgetTests(QueryBudgetMixin, TestCase):
+    """Budgets de requêtes et de temps sur un jeu de données volumineux"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='budget', password='secret', role='admin')
+        seed_congregation(organizer=cls.admin)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        # Réchauffe les caches de session et de paramètres hors budget
+        self.client.get(reverse('finance:dashboard'))
+
+    def test_transaction_list(self):
+        self.assertViewBudget(reverse('finance:transaction_list'), 6)
+
+    def test_finance_dashboard(self):
+        self.assertViewBudget(reverse('finance:dashboard'), 14)
+
+
+class AsyncDashboardTests(TestCase):
+    """Vue async du tableau de bord financier (servie en ASGI)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='tresorier', password='secret', role='treasurer')
+        seed_congregation(members=200, families=40, groups=5, ministries=3, transactions=400,
+                          events=5, attendances_per_event=5, organizer=cls.admin)
+
+    def test_fan_out_returns_sequential_results(self):
+        today = timezone.localdate()
+        sequential = {name: query() for name, query in finance_dashboard_queries(today).items()}
+        concurrent = async_to_sync(fanout.gather_dict)(finance_dashboard_queries(today))
+        self.assertEqual(concurrent, sequential)
+
+    def test_async_view_renders_dashboard(self):
+        request = view_request(self.admin, reverse('finance:dashboard'))
+        response = async_to_sync(finance_dashboard_async)(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Tableau de Bord Financier')
+
+    def test_async_view_requires_finance_access(self):
+        fidele = User.objects.create_user(username='fidele', password='secret', role='membre')
+        response = async_to_sync(finance_dashboard_async)(view_request(fidele, reverse('finance:dashboard')))
+        self.assertEqual(response.status_code, 302)
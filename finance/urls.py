@@ -1,10 +1,11 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 app_name = 'finance'
 
 urlpatterns = [
-    path('', views.finance_dashboard, name='dashboard'),
+    path('', views.finance_dashboard_async if settings.ASYNC_VIEWS else views.finance_dashboard, name='dashboard'),
     path('transactions/', views.transaction_list, name='transaction_list'),
     path('transactions/add/', views.transaction_add, name='transaction_add'),
     path('transactions/<int:transaction_id>/', views.transaction_detail, name='transaction_detail'),
@@ -2,7 +2,7 @@
 
 from decimal import InvalidOperation
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth.decorators import login_required
+from accounts.permissions import require_role
 from django.contrib import messages
 from django.http import HttpResponse, JsonResponse
 from django.core.paginator import Paginator
@@ -19,14 +19,12 @@ from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from io import BytesIO
+from asgiref.sync import sync_to_async
+from apps import fanout
 
-@login_required
+@require_role('finance', message="Vous n'avez pas l'autorisation d'accéder aux finances.")
 def transaction_list(request):
     """Liste des transactions financières"""
-    if not request.user.has_finance_access():
-        messages.error(request, 'Vous n\'avez pas l\'autorisation d\'accéder aux finances.')
-        return redirect('dashboard:home')
-    
     # Paramètres de recherche et filtre
     search_query = request.GET.get('search', '')
     transaction_type = request.GET.get('type', '')
@@ -99,13 +97,9 @@ def transaction_list(request):
     
     return render(request, 'finance/transaction_list.html', context)
 
-@login_required
+@require_role('finance', message="Vous n'avez pas l'autorisation d'ajouter des transactions.")
 def transaction_add(request):
     """Ajouter une nouvelle transaction"""
-    if not request.user.has_finance_access():
-        messages.error(request, 'Vous n\'avez pas l\'autorisation d\'ajouter des transactions.')
-        return redirect('finance:transaction_list')
-    
     if request.method == 'POST':
         form = TransactionForm(request.POST)
         if form.is_valid():
@@ -144,13 +138,9 @@ def transaction_add(request):
     
     return render(request, 'finance/transaction_form.html', context)
 
-@login_required
+@require_role('finance', message="Vous n'avez pas l'autorisation de modifier des transactions.")
 def transaction_edit(request, transaction_id):
     """Modifier une transaction"""
-    if not request.user.has_finance_access():
-        messages.error(request, 'Vous n\'avez pas l\'autorisation de modifier des transactions.')
-        return redirect('finance:transaction_list')
-    
     transaction = get_object_or_404(FinancialTransaction, pk=transaction_id)
     
     # Vérifier si la transaction est validée
@@ -183,13 +173,9 @@ def transaction_edit(request, transaction_id):
     
     return render(request, 'finance/transaction_form.html', context)
 
-@login_required
+@require_role('finance', message="Vous n'avez pas l'autorisation de voir les détails des transactions.")
 def transaction_detail(request, transaction_id):
     """Détails d'une transaction"""
-    if not request.user.has_finance_access():
-        messages.error(request, 'Vous n\'avez pas l\'autorisation de voir les détails des transactions.')
-        return redirect('dashboard:home')
-    
     transaction = get_object_or_404(
         FinancialTransaction.objects.select_related(
             'member', 'family', 'group', 'category', 'created_by', 'validated_by'
@@ -205,16 +191,9 @@ def transaction_detail(request, transaction_id):
     return render(request, 'finance/transaction_detail.html', context)
 
 
-@login_required
+@require_role('finance', message="Vous n'avez pas les droits pour supprimer une transaction.")
 def transaction_delete(request, transaction_id):
     """Vue pour supprimer une transaction"""
-    user = request.user
-    
-    # Vérifie l'accès (assume has_finance_access pour finance)
-    if not user.has_finance_access():
-        messages.warning(request, "Vous n'avez pas les droits pour supprimer une transaction.")
-        return redirect('finance:transaction_list')
-    
     transaction = get_object_or_404(FinancialTransaction, id=transaction_id)
     
     if request.method == "POST":
@@ -229,13 +208,9 @@ def transaction_delete(request, transaction_id):
     }
     return render(request, 'finance/transaction_delete.html', context)
 
-@login_required
+@require_role('finance', message="Vous n'avez pas l'autorisation de valider des transactions.")
 def transaction_validate(request, transaction_id):
     """Valider une transaction"""
-    if not request.user.has_finance_access():
-        messages.error(request, 'Vous n\'avez pas l\'autorisation de valider des transactions.')
-        return redirect('finance:transaction_list')
-    
     transaction = get_object_or_404(FinancialTransaction, pk=transaction_id)
     
     if transaction.is_validated:
@@ -246,13 +221,9 @@ def transaction_validate(request, transaction_id):
     
     return redirect('finance:transaction_detail', transaction_id=transaction.id)
 
-@login_required
+@require_role('finance', message="Vous n'avez pas l'autorisation de générer des reçus.")
 def transaction_receipt(request, transaction_id):
     """Générer un reçu pour une transaction"""
-    if not request.user.has_finance_access():
-        messages.error(request, 'Vous n\'avez pas l\'autorisation de générer des reçus.')
-        return redirect('finance:transaction_list')
-    
     transaction = get_object_or_404(FinancialTransaction, pk=transaction_id)
     
     # Génération du PDF
@@ -328,95 +299,93 @@ def transaction_receipt(request, transaction_id):
 
 
 
-@login_required
-def finance_dashboard(request):
-    """Tableau de bord financier (version corrigée pour % budget)"""
-    if not request.user.has_finance_access():
-        messages.error(request, "Vous n'avez pas l'autorisation d'accéder au tableau de bord financier.")
-        return redirect('dashboard:home')
-
-    today = timezone.now().date()
-    month_start = today.replace(day=1)
-
-    # Statistiques du mois
-    monthly_stats = FinancialTransaction.objects.filter(
-        date__gte=month_start,
-        is_validated=True
-    ).aggregate(
+def _validated_totals(**filters):
+    """Revenus et dépenses validés, en une requête d'agrégat"""
+    return FinancialTransaction.objects.filter(is_validated=True, **filters).aggregate(
         income=Sum('amount', filter=Q(category__category_type='income')),
         expense=Sum('amount', filter=Q(category__category_type='expense'))
     )
 
+
+def evolution_months(today, count=6):
+    """(libellé, début, fin) des `count` derniers mois, le mois en cours arrêté à aujourd'hui"""
+    months = []
+    for i in range(count - 1, -1, -1):
+        date = today - timedelta(days=30 * i)
+        month_start_loop = date.replace(day=1)
+        month_end = (month_start_loop + timedelta(days=32)).replace(day=1) - timedelta(days=1) if i != 0 else today
+        months.append((month_start_loop.strftime('%B %Y'), month_start_loop, month_end))
+    return months
+
+
+def finance_dashboard_queries(today):
+    """
+    Requêtes du tableau de bord financier, indépendantes les unes des
+    autres : exécutées en séquence (WSGI) ou en parallèle (ASGI)
+    """
+    month_start = today.replace(day=1)
+    year_start = today.replace(month=1, day=1)
+    queries = {
+        # Statistiques du mois et de l'année
+        'monthly_stats': lambda: _validated_totals(date__gte=month_start),
+        'yearly_stats': lambda: _validated_totals(date__gte=year_start),
+        # Top contributeurs du mois
+        'top_contributors': lambda: list(FinancialTransaction.objects.filter(
+            date__gte=month_start,
+            category__category_type='income',
+            is_validated=True,
+            is_anonymous=False
+        ).values('member__first_name', 'member__last_name').annotate(
+            total=Sum('amount')
+        ).order_by('-total')[:5]),
+        # Répartition par type de transaction
+        'transaction_breakdown': lambda: list(FinancialTransaction.objects.filter(
+            date__gte=month_start,
+            is_validated=True
+        ).values('transaction_type').annotate(
+            total=Sum('amount'),
+            count=Count('id')
+        )),
+        'pending_transactions': lambda: list(FinancialTransaction.objects.filter(
+            is_validated=False
+        ).select_related('category').order_by('-created_at')[:10]),
+        'current_budget': lambda: Budget.objects.filter(
+            period='monthly',
+            year=today.year,
+            month=today.month,
+            is_active=True
+        ).first(),
+    }
+    # Évolution mensuelle (6 derniers mois) : une requête par mois
+    for index, (_, start, end) in enumerate(evolution_months(today)):
+        queries[f'evolution_{index}'] = (
+            lambda start=start, end=end: _validated_totals(date__gte=start, date__lte=end)
+        )
+    return queries
+
+
+def finance_dashboard_context(today, results):
+    """Contexte du gabarit à partir des résultats de finance_dashboard_queries()"""
+    monthly_stats = results['monthly_stats']
     monthly_income = float(monthly_stats['income'] or 0)
     monthly_expense = float(monthly_stats['expense'] or 0)
     monthly_balance = monthly_income - monthly_expense
 
-    # Statistiques de l'année
-    year_start = today.replace(month=1, day=1)
-    yearly_stats = FinancialTransaction.objects.filter(
-        date__gte=year_start,
-        is_validated=True
-    ).aggregate(
-        income=Sum('amount', filter=Q(category__category_type='income')),
-        expense=Sum('amount', filter=Q(category__category_type='expense'))
-    )
-
+    yearly_stats = results['yearly_stats']
     yearly_income = float(yearly_stats['income'] or 0)
     yearly_expense = float(yearly_stats['expense'] or 0)
     yearly_balance = yearly_income - yearly_expense
 
-    # Top contributeurs du mois
-    top_contributors = FinancialTransaction.objects.filter(
-        date__gte=month_start,
-        category__category_type='income',
-        is_validated=True,
-        is_anonymous=False
-    ).values('member__first_name', 'member__last_name').annotate(
-        total=Sum('amount')
-    ).order_by('-total')[:5]
-
-    # Répartition par type de transaction
-    transaction_breakdown = FinancialTransaction.objects.filter(
-        date__gte=month_start,
-        is_validated=True
-    ).values('transaction_type').annotate(
-        total=Sum('amount'),
-        count=Count('id')
-    )
-
-    # Évolution mensuelle (6 derniers mois)
     monthly_evolution = []
-    from datetime import timedelta
-    for i in range(5, -1, -1):
-        date = today - timedelta(days=30 * i)
-        month_start_loop = date.replace(day=1)
-        month_end = (month_start_loop + timedelta(days=32)).replace(day=1) - timedelta(days=1) if i != 0 else today
-
-        stats = FinancialTransaction.objects.filter(
-            date__gte=month_start_loop,
-            date__lte=month_end,
-            is_validated=True
-        ).aggregate(
-            income=Sum('amount', filter=Q(category__category_type='income')),
-            expense=Sum('amount', filter=Q(category__category_type='expense'))
-        )
-
+    for index, (label, _, _) in enumerate(evolution_months(today)):
+        stats = results[f'evolution_{index}']
         monthly_evolution.append({
-            'month': month_start_loop.strftime('%B %Y'),
+            'month': label,
             'income': float(stats['income'] or 0),
             'expense': float(stats['expense'] or 0),
         })
 
-    pending_transactions = FinancialTransaction.objects.filter(
-        is_validated=False
-    ).order_by('-created_at')[:10]
-
-    current_budget = Budget.objects.filter(
-        period='monthly',
-        year=today.year,
-        month=today.month,
-        is_active=True
-    ).first()
+    current_budget = results['current_budget']
 
     # -------- Calcul du pourcentage du budget utilisé (robuste) --------
     percentage = 0.0            # valeur exacte (peut être >100)
@@ -441,7 +410,7 @@ def finance_dashboard(request):
     percentage_display = round(percentage, 2)
     percentage_capped_display = round(percentage_capped, 2)
 
-    context = {
+    return {
         'title': 'Tableau de Bord Financier',
         'monthly_income': monthly_income,
         'monthly_expense': monthly_expense,
@@ -449,16 +418,35 @@ def finance_dashboard(request):
         'yearly_income': yearly_income,
         'yearly_expense': yearly_expense,
         'yearly_balance': yearly_balance,
-        'top_contributors': top_contributors,
-        'transaction_breakdown': list(transaction_breakdown),
+        'top_contributors': results['top_contributors'],
+        'transaction_breakdown': results['transaction_breakdown'],
         'monthly_evolution': json.dumps(monthly_evolution),
-        'pending_transactions': pending_transactions,
+        'pending_transactions': results['pending_transactions'],
         'current_budget': current_budget,
         'percentage': percentage_display,
         'percentage_capped': percentage_capped_display,
         'debug_budget_expected': expected_expense_val,
     }
 
-    return render(request, 'finance/dashboard_finance.html', context)
+
+DASHBOARD_DENIED = "Vous n'avez pas l'autorisation d'accéder au tableau de bord financier."
+
+
+@require_role('finance', message=DASHBOARD_DENIED)
+def finance_dashboard(request):
+    """Tableau de bord financier (version corrigée pour % budget)"""
+    today = timezone.now().date()
+    results = {name: query() for name, query in finance_dashboard_queries(today).items()}
+    return render(request, 'finance/dashboard_finance.html', finance_dashboard_context(today, results))
+
+
+@require_role('finance', message=DASHBOARD_DENIED)
+async def finance_dashboard_async(request):
+    """finance_dashboard servie en ASGI : les agrégats partent en parallèle (apps.fanout)"""
+    today = timezone.now().date()
+    results = await fanout.gather_dict(finance_dashboard_queries(today))
+    return await sync_to_async(render)(
+        request, 'finance/dashboard_finance.html', finance_dashboard_context(today, results)
+    )
 
 
@@ -1,17 +1,25 @@
 from django.contrib import admin
+from import_export.admin import ImportExportModelAdmin
 from .models import Member, Ministry, Group, Family, Attendance
+from .resources import MemberResource
 
 # ----------------------
 # Administration des Membres
 # ----------------------
 @admin.register(Member)
-class MemberAdmin(admin.ModelAdmin):
+class MemberAdmin(ImportExportModelAdmin):
+    resource_classes = [MemberResource]
     list_display = ('first_name', 'last_name', 'member_id', 'email', 'phone', 'status','nationalite','nombres_enfant','domaines')
     list_filter = ('status', 'gender', 'ministries', 'groups')
     search_fields = ('first_name', 'last_name', 'member_id', 'email', 'phone')
     ordering = ('last_name',)
     filter_horizontal = ('ministries', 'groups')  # Pour ManyToManyField
 
+    def get_import_resource_kwargs(self, request, *args, **kwargs):
+        kwargs = super().get_import_resource_kwargs(request, *args, **kwargs)
+        kwargs['created_by'] = request.user
+        return kwargs
+
 # ----------------------
 # Administration des Ministères
 # ----------------------
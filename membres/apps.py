@@ -12,4 +12,6 @@ class MembresConfig(AppConfig):
     name = 'membres'
 
     def ready(self):
-        import membres.signals  # Charge les signaux
\ No newline at end of file
+        import membres.signals  # Charge les signaux
+        from apps.fragments import connect_fragment_signals
+        connect_fragment_signals(self.label)
\ No newline at end of file
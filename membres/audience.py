@@ -0,0 +1,193 @@
+"""
+Segments d'audience : qui reçoit une campagne (WhatsApp, email, SMS).
+
+Un Segment décrit les critères (statuts, groupes, ministères, familles,
+tranche d'âge, sexe, présence récente, canal de contact) et les compile en
+une seule requête sur Member. Les appartenances sont filtrées par
+sous-requêtes (pk IN ...) : pas de jointure, donc pas de doublon ni de DISTINCT.
+
+- member_ids() : identifiants mis en cache (AUDIENCE_CACHE_TTL secondes)
+- recipients() : (membre, contact) réellement contactés sur le canal,
+  numéros normalisés et sans doublon ; count() en donne le nombre (mis en
+  cache), c'est l'aperçu affiché avant envoi
+- contacts() : coordonnées brutes lues par iterator(), pour les gros envois
+
+Les groupes ou membres d'une notification peuvent être passés en queryset :
+ils restent une sous-requête, le segment est alors résolu en une requête.
+"""
+import hashlib
+import re
+from dataclasses import dataclass, fields
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+
+from apps import caching
+from .models import Member, Attendance
+
+CONTACT_FIELDS = ('pk', 'first_name', 'last_name', 'phone', 'email')
+SELECTIONS = ('statuses', 'groups', 'ministries', 'families', 'members')
+
+
+def normalize_phone(raw, country_code=None):
+    """
+    Numéro au format E.164 (+22790123456), ou None s'il est inexploitable.
+    Les numéros locaux (8 chiffres au Niger) reçoivent l'indicatif par défaut.
+    """
+    if not raw:
+        return None
+    country_code = country_code or getattr(settings, 'WHATSAPP_DEFAULT_COUNTRY_CODE', '227')
+    value = re.sub(r'[\s\-.()/]', '', str(raw))
+    if value.startswith('00'):
+        value = '+' + value[2:]
+    if value.startswith('+'):
+        digits = value[1:]
+    elif len(value) <= 8:
+        digits = country_code + value.lstrip('0')
+    else:
+        digits = value
+    if not digits.isdigit() or not 9 <= len(digits) <= 15:
+        return None
+    return '+' + digits
+
+
+def normalize_contact(channel, value):
+    """Contact tel qu'il sera utilisé pour l'envoi, ou None s'il est inexploitable"""
+    if channel == 'phone':
+        return normalize_phone(value)
+    return (value or '').strip().lower() or None
+
+
+def _selected(value):
+    # Une sous-requête n'est pas évaluée pour savoir si elle est vide
+    return isinstance(value, QuerySet) or bool(value)
+
+
+def _years_before(day, years):
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:  # 29 février
+        return day.replace(year=day.year - years, day=28)
+
+
+@dataclass(frozen=True)
+class Segment:
+    statuses: tuple = ()
+    groups: tuple = ()
+    ministries: tuple = ()
+    families: tuple = ()
+    members: tuple = ()
+    gender: str = ''
+    min_age: int = None
+    max_age: int = None
+    attended_within_days: int = None  # présence (culte ou événement) sur les N derniers jours
+    channel: str = ''  # 'phone' ou 'email' : exclut les membres sans ce contact
+
+    def __post_init__(self):
+        # Listes normalisées en tuples triés (clé de cache stable) ; les querysets restent des sous-requêtes
+        for name in SELECTIONS:
+            value = getattr(self, name)
+            if not isinstance(value, QuerySet):
+                object.__setattr__(self, name, tuple(sorted(set(value))))
+
+    @classmethod
+    def for_recipients(cls, recipient_type, groups=(), members=(), channel='phone'):
+        """Segment équivalent aux choix 'all' / 'group' / 'individual' des notifications"""
+        # Une sélection vide ne doit toucher personne : (0,) ne correspond à aucun objet
+        if recipient_type == 'group':
+            return cls(groups=groups or (0,), channel=channel)
+        if recipient_type == 'individual':
+            return cls(members=members or (0,), channel=channel)
+        return cls(channel=channel)
+
+    @classmethod
+    def from_notification(cls, notification, channel='phone'):
+        """Segment d'une notification enregistrée : ses groupes ou membres lus en sous-requête"""
+        if notification.recipient_type == 'group':
+            return cls(groups=notification.groups.values('pk'), channel=channel)
+        if notification.recipient_type == 'individual':
+            return cls(members=notification.individual_members.values('pk'), channel=channel)
+        return cls(channel=channel)
+
+    @property
+    def cache_key(self):
+        definition = repr(tuple(
+            str(value.query) if isinstance(value, QuerySet) else value
+            for value in (getattr(self, f.name) for f in fields(self))
+        ))
+        return hashlib.sha1(definition.encode()).hexdigest()
+
+    def queryset(self):
+        condition = Q()
+        if _selected(self.statuses):
+            condition &= Q(status__in=self.statuses)
+        if self.gender:
+            condition &= Q(gender=self.gender)
+        if _selected(self.families):
+            condition &= Q(family_id__in=self.families)
+        if _selected(self.members):
+            condition &= Q(pk__in=self.members)
+        if _selected(self.groups):
+            condition &= Q(pk__in=Member.groups.through.objects
+                           .filter(group_id__in=self.groups).values('member_id'))
+        if _selected(self.ministries):
+            condition &= Q(pk__in=Member.ministries.through.objects
+                           .filter(ministry_id__in=self.ministries).values('member_id'))
+
+        today = timezone.now().date()
+        if self.min_age is not None:
+            condition &= Q(date_of_birth__lte=_years_before(today, self.min_age))
+        if self.max_age is not None:
+            condition &= Q(date_of_birth__gt=_years_before(today, self.max_age + 1))
+        if self.attended_within_days is not None:
+            from events.models import EventAttendance
+
+            since = today - timedelta(days=self.attended_within_days)
+            condition &= (
+                Q(pk__in=Attendance.objects.filter(present=True, date__gte=since).values('member_id'))
+                | Q(pk__in=EventAttendance.objects.filter(is_present=True, event__start_date__gte=since)
+                    .values('member_id'))
+            )
+
+        queryset = Member.objects.filter(condition)
+        if self.channel:
+            queryset = queryset.exclude(**{f'{self.channel}__isnull': True}).exclude(**{self.channel: ''})
+        return queryset.order_by('pk')
+
+    def member_ids(self):
+        """Identifiants des membres du segment (mis en cache)"""
+        return caching.get_or_set(
+            'audience', self.cache_key,
+            lambda: list(self.queryset().values_list('pk', flat=True)),
+            ttl=getattr(settings, 'AUDIENCE_CACHE_TTL', 300),
+        )
+
+    def recipients(self):
+        """
+        (member_id, contact) réellement contactés : contact normalisé sur le
+        canal, un contact partagé (numéro de famille) n'apparaissant qu'une fois
+        """
+        if not self.channel:
+            return [(pk, None) for pk in self.queryset().values_list('pk', flat=True)]
+        recipients = {}
+        for contact in self.contacts():
+            value = normalize_contact(self.channel, contact[self.channel])
+            if value and value not in recipients:
+                recipients[value] = contact['pk']
+        return [(member_id, value) for value, member_id in recipients.items()]
+
+    def count(self):
+        """Nombre d'envois (même règle que recipients()), mis en cache"""
+        if not self.channel:
+            return len(self.member_ids())
+        return caching.get_or_set(
+            'audience', f'{self.cache_key}:recipients',
+            lambda: len(self.recipients()),
+            ttl=getattr(settings, 'AUDIENCE_CACHE_TTL', 300),
+        )
+
+    def contacts(self, chunk_size=2000):
+        """Coordonnées des membres, lues en flux : dicts avec CONTACT_FIELDS"""
+        return self.queryset().values(*CONTACT_FIELDS).iterator(chunk_size=chunk_size)
@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.synthetic import CongregationGenerator
+from membres.models import Member
+
+
+class Command(BaseCommand):
+    help = "Génère une église synthétique volumineuse (bulk_create par lots, déterministe)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--members', type=int, default=50000)
+        parser.add_argument('--families', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=300)
+        parser.add_argument('--ministries', type=int, default=40)
+        parser.add_argument('--transactions', type=int, default=1000000)
+        parser.add_argument('--years', type=int, default=5,
+                            help="Profondeur d'historique (présences hebdomadaires, finances, événements)")
+        parser.add_argument('--events', type=int, default=2000)
+        parser.add_argument('--weekly-attendance', type=float, default=0.3,
+                            help="Part des membres actifs présents chaque dimanche (0 pour désactiver)")
+        parser.add_argument('--attendances-per-event', type=int, default=100)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if Member.objects.exists():
+            raise CommandError(
+                "La base contient déjà des membres : lancez la génération sur une base vide."
+            )
+
+        generator = CongregationGenerator(
+            members=options['members'],
+            families=options['families'],
+            groups=options['groups'],
+            ministries=options['ministries'],
+            transactions=options['transactions'],
+            years=options['years'],
+            events=options['events'],
+            weekly_attendance=options['weekly_attendance'],
+            attendances_per_event=options['attendances_per_event'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            log=self.stdout.write if options['verbosity'] > 1 else None,
+        )
+
+        start = time.perf_counter()
+        created = generator.run()
+        elapsed = time.perf_counter() - start
+
+        for label, total in created.items():
+            self.stdout.write(f'{label:<24} {total:>10}')
+        self.stdout.write(self.style.SUCCESS(f'Génération terminée en {elapsed:.1f}s'))
@@ -0,0 +1,62 @@
+import time
+from pathlib import Path
+
+import tablib
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from membres.onboarding import create_member_accounts
+from membres.resources import MemberResource
+
+
+class Command(BaseCommand):
+    help = "Importe une liste de membres (CSV ou XLSX) en masse"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Fichier .csv ou .xlsx')
+        parser.add_argument('--dry-run', action='store_true', help='Valide sans rien enregistrer')
+        parser.add_argument('--no-accounts', action='store_true',
+                            help='Ne crée pas les comptes utilisateurs ni les emails de bienvenue')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        file_format = path.suffix.lstrip('.').lower()
+        if file_format not in ('csv', 'xlsx'):
+            raise CommandError("Format non pris en charge : utilisez un fichier .csv ou .xlsx")
+        try:
+            if file_format == 'csv':
+                dataset = tablib.Dataset().load(path.read_text(encoding='utf-8-sig'), format='csv')
+            else:
+                dataset = tablib.Dataset().load(path.read_bytes(), format='xlsx')
+        except OSError as exc:
+            raise CommandError(f'Impossible de lire {path} : {exc}')
+
+        resource = MemberResource(create_accounts=False)
+        start = time.perf_counter()
+        with transaction.atomic():
+            result = resource.import_data(dataset, dry_run=options['dry_run'])
+            # Tout ou rien : une seule ligne invalide annule l'import
+            if result.has_validation_errors():
+                transaction.set_rollback(True)
+        elapsed = time.perf_counter() - start
+
+        for line, error in result.row_errors():
+            self.stderr.write(f'Ligne {line} : {error[0].error}')
+        for invalid in result.invalid_rows:
+            self.stderr.write(f'Ligne {invalid.number} : {invalid.error_dict}')
+
+        totals = result.totals
+        self.stdout.write(
+            f"{totals['new']} membre(s) importé(s), {totals['invalid']} ligne(s) invalide(s), "
+            f"{totals['error']} erreur(s) en {elapsed:.1f} s"
+        )
+        if options['dry_run'] or result.has_errors() or result.has_validation_errors():
+            if not options['dry_run']:
+                self.stdout.write(self.style.WARNING("Import annulé : corrigez les lignes signalées"))
+            return
+
+        if not options['no_accounts']:
+            start = time.perf_counter()
+            count = create_member_accounts(resource.created_member_ids)
+            self.stdout.write(f"{count} compte(s) créé(s) en {time.perf_counter() - start:.1f} s")
+        self.stdout.write(self.style.SUCCESS('Import terminé'))
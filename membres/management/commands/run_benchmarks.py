@@ -0,0 +1,105 @@
+import json
+import subprocess
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from apps.benchmarks import BENCHMARKS, run_benchmarks
+
+
+def current_commit():
+    """Commit git courant (ou None hors dépôt)"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, stderr=subprocess.DEVNULL, text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def dataset_counts():
+    from membres.models import Member, Family, Group, Attendance
+    from finance.models import FinancialTransaction
+    from events.models import Event, EventAttendance
+
+    return {
+        'members': Member.objects.count(),
+        'families': Family.objects.count(),
+        'groups': Group.objects.count(),
+        'attendances': Attendance.objects.count(),
+        'transactions': FinancialTransaction.objects.count(),
+        'events': Event.objects.count(),
+        'event_attendances': EventAttendance.objects.count(),
+    }
+
+
+class Command(BaseCommand):
+    help = "Chronomètre les vues et services clés et écrit les résultats en JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--warmup', type=int, default=1)
+        parser.add_argument('--only', nargs='+', metavar='NOM',
+                            help='Benchmarks à exécuter (par défaut : tous)')
+        parser.add_argument('--list', action='store_true', help='Liste les benchmarks disponibles')
+        parser.add_argument('--output', help='Fichier JSON de sortie')
+        parser.add_argument('--compare', help='Fichier JSON précédent à comparer')
+
+    def handle(self, *args, **options):
+        if options['list']:
+            for name in BENCHMARKS:
+                self.stdout.write(name)
+            return
+
+        unknown = set(options['only'] or []) - set(BENCHMARKS)
+        if unknown:
+            raise CommandError(f"Benchmarks inconnus : {', '.join(sorted(unknown))}")
+
+        commit = current_commit()
+        results = run_benchmarks(
+            names=options['only'],
+            repeat=options['repeat'],
+            warmup=options['warmup'],
+            log=self.stdout.write,
+        )
+        report = {
+            'commit': commit,
+            'created_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'repeat': options['repeat'],
+            'dataset': dataset_counts(),
+            'results': results,
+        }
+
+        output = Path(options['output'] or Path(settings.BASE_DIR) / 'benchmark-results' /
+                      f"{timezone.now():%Y%m%d-%H%M%S}-{commit or 'nocommit'}.json")
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding='utf-8')
+        self.stdout.write(self.style.SUCCESS(f'Résultats écrits dans {output}'))
+
+        if options['compare']:
+            self.compare(Path(options['compare']), results)
+
+    def compare(self, path, results):
+        try:
+            previous = json.loads(path.read_text(encoding='utf-8'))
+        except (OSError, ValueError) as exc:
+            raise CommandError(f'Impossible de lire {path} : {exc}')
+
+        self.stdout.write(f"\nComparaison avec {previous.get('commit') or path.name}")
+        for name, current in results.items():
+            before = previous.get('results', {}).get(name)
+            if not before or 'median_ms' not in before or 'median_ms' not in current:
+                continue
+            ratio = current['median_ms'] / before['median_ms'] if before['median_ms'] else 0
+            line = (f"{name:<32} {before['median_ms']:>10.2f} → {current['median_ms']:>10.2f} ms "
+                    f"(x{ratio:.2f})  requêtes {before['queries']} → {current['queries']}")
+            if ratio > 1.1:
+                line = self.style.WARNING(line)
+            elif ratio < 0.9:
+                line = self.style.SUCCESS(line)
+            self.stdout.write(line)
@@ -1,20 +1,42 @@
+from django.conf import settings
 from django.shortcuts import redirect
-from django.urls import reverse
+
+from accounts.signals import MUST_CHANGE_PASSWORD_SESSION_KEY
+
+# Vues accessibles tant que le mot de passe n'a pas été changé
+ALLOWED_VIEWS = frozenset({
+    'accounts:change_password',
+    'accounts:logout',
+    'settings:theme_css',
+})
+
 
 class ForcePasswordChangeMiddleware:
-    """Force l'utilisateur à changer son mot de passe s'il vient d'être créé"""
+    """
+    Force l'utilisateur à changer son mot de passe (User.must_change_password).
+
+    Le drapeau est copié en session à la connexion (accounts.signals) : le
+    middleware ne lit ni l'utilisateur ni la base. Fichiers statiques et
+    médias passent sans ouvrir la session ; les vues autorisées sont
+    reconnues par leur nom, déjà résolu par Django, sans reverse().
+    """
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.skipped_prefixes = tuple(
+            '/' + url.lstrip('/')
+            for url in (settings.STATIC_URL, settings.MEDIA_URL) if url
+        )
 
     def __call__(self, request):
-        user = request.user
-        if user.is_authenticated:
-            member = getattr(user, 'member', None)
-            if member and getattr(member, 'force_password_change', False):
-                allowed_paths = [
-                    reverse('change_password'),
-                    reverse('logout'),
-                ]
-                if request.path not in allowed_paths:
-                    return redirect('change_password')
         return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.path_info.startswith(self.skipped_prefixes):
+            return None
+        # Visiteur anonyme ou sans drapeau : session vide ou déjà chargée pour l'authentification
+        if not request.session.get(MUST_CHANGE_PASSWORD_SESSION_KEY):
+            return None
+        if request.resolver_match.view_name in ALLOWED_VIEWS:
+            return None
+        return redirect('accounts:change_password')
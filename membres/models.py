@@ -104,6 +104,9 @@ class Family(models.Model):
         return self.name
     
     def get_members_count(self):
+        # Valeur annotée par les vues de liste (évite un COUNT par famille)
+        if hasattr(self, 'members_count'):
+            return self.members_count
         return self.members.count()
 
 class Member(models.Model):
@@ -0,0 +1,166 @@
+"""
+Création des comptes utilisateurs des membres.
+
+Les comptes sont créés sans mot de passe (inutilisable, aucun hachage) :
+l'email de bienvenue contient un lien d'activation à usage unique où le
+membre choisit son mot de passe. Le coût du hachage PBKDF2 n'est donc payé
+qu'une fois par membre, à l'activation, et la création de milliers de
+comptes ne dépend plus que de la vitesse d'insertion.
+
+Le lien expire après PASSWORD_RESET_TIMEOUT (3 jours par défaut) : un
+compte jamais activé reçoit un nouveau lien par resend_activation_links()
+(action « Renvoyer le lien d'activation » de l'administration des comptes).
+
+L'import (membres.resources) insère les membres par bulk_create : le signal
+post_save n'est pas déclenché. Les comptes et les emails sont alors créés
+ensuite, par lots, hors de la transaction d'import.
+"""
+import logging
+import re
+import threading
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.tokens import default_token_generator
+from django.db import connections, transaction
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.html import strip_tags
+from django.utils.http import urlsafe_base64_encode
+
+from notifications.outbox import queue_emails
+from .models import Member
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+
+def _username_bases(member):
+    """prénom.nom, puis partie locale de l'email"""
+    return [
+        f"{member.first_name.lower()}.{member.last_name.lower()}",
+        member.email.split('@')[0],
+    ]
+
+
+def _taken_usernames(members):
+    """Noms d'utilisateur existants parmi les bases des membres et leurs variantes suffixées"""
+    bases = {base for member in members for base in _username_bases(member)}
+    pattern = rf"^({'|'.join(re.escape(base) for base in sorted(bases))})[0-9]*$"
+    return set(User.objects.filter(username__regex=pattern).values_list('username', flat=True))
+
+
+def _unique_username(member, taken):
+    """Même règle que le signal : prénom.nom, sinon partie locale de l'email"""
+    candidates = _username_bases(member)
+    for candidate in candidates:
+        if candidate not in taken:
+            return candidate
+    suffix = 2
+    while f"{candidates[0]}{suffix}" in taken:
+        suffix += 1
+    return f"{candidates[0]}{suffix}"
+
+
+def activation_link(user):
+    """Lien absolu d'activation (jeton invalidé dès que le mot de passe est défini)"""
+    path = reverse('accounts:activate', args=[
+        urlsafe_base64_encode(force_bytes(user.pk)),
+        default_token_generator.make_token(user),
+    ])
+    return f"{settings.SITE_URL}{path}"
+
+
+def activation_message(user, member=None):
+    """Email de bienvenue avec lien d'activation, au format de queue_emails()"""
+    recipient = member or user
+    html_message = render_to_string('membres/email_account_activation.html', {
+        'member': recipient,
+        'username': user.username,
+        'activation_link': activation_link(user),
+    })
+    return {
+        'subject': "Bienvenue ! Activez votre compte",
+        'body': strip_tags(html_message),
+        'html_body': html_message,
+        'to': [recipient.email],
+    }
+
+
+def resend_activation_links(users):
+    """
+    Envoie un nouveau lien d'activation aux comptes actifs jamais activés
+    (mot de passe inutilisable, email renseigné). Retourne le nombre d'emails mis en file.
+    """
+    pending = [user for user in users
+               if user.email and user.is_active and not user.has_usable_password()]
+    queue_emails([activation_message(user) for user in pending])
+    return len(pending)
+
+
+def create_member_accounts(member_ids, batch_size=500):
+    """
+    Crée les comptes des membres (avec email, sans compte) et met en file
+    leurs emails d'activation. Retourne le nombre de comptes créés.
+    """
+    member_ids = list(member_ids)
+    created = 0
+
+    for start in range(0, len(member_ids), batch_size):
+        members = list(
+            Member.objects.filter(pk__in=member_ids[start:start + batch_size], user__isnull=True)
+            .exclude(email='')
+            .order_by('pk')
+        )
+        if not members:
+            continue
+
+        # Variantes suffixées comprises (prenom.nom2, ...) : aucune collision à l'insertion
+        taken = _taken_usernames(members)
+
+        accounts = []
+        for member in members:
+            username = _unique_username(member, taken)
+            taken.add(username)
+            accounts.append((member, User(
+                username=username,
+                email=member.email,
+                first_name=member.first_name,
+                last_name=member.last_name,
+                role='membre',
+                password=make_password(None),  # inutilisable : pas de hachage
+            )))
+
+        with transaction.atomic():
+            User.objects.bulk_create([user for _, user in accounts])
+            for member, user in accounts:
+                member.user = user
+            Member.objects.bulk_update([member for member, _ in accounts], ['user'])
+
+            queue_emails([activation_message(user, member) for member, user in accounts])
+        created += len(accounts)
+
+    return created
+
+
+def defer_member_accounts(member_ids):
+    """Lance la création des comptes en arrière-plan après le commit"""
+    member_ids = list(member_ids)
+    if not member_ids:
+        return
+    transaction.on_commit(lambda: threading.Thread(
+        target=_create_in_thread, args=(member_ids,), name='member-accounts', daemon=True,
+    ).start())
+
+
+def _create_in_thread(member_ids):
+    try:
+        count = create_member_accounts(member_ids)
+        logger.info("%s compte(s) membre créé(s) après import", count)
+    except Exception:
+        logger.exception("Échec de la création des comptes après import")
+    finally:
+        connections.close_all()
@@ -0,0 +1,167 @@
+"""
+Import en masse des membres (CSV / XLSX) avec django-import-export.
+
+- validation ligne par ligne (full_clean sans contrôle d'unicité en base)
+- insertion par bulk_create, member_id pré-alloués au format de Member.save()
+- familles, groupes et ministères résolus par nom via des index en mémoire
+  (les noms inconnus sont créés en une insertion avant l'import)
+- comptes utilisateurs et emails de bienvenue créés après le commit
+  (membres.onboarding), pas ligne par ligne
+"""
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+from import_export import fields, resources, widgets
+
+from apps.fragments import bump_fragment_version
+
+from .models import Member, Family, Group, Ministry
+from .onboarding import defer_member_accounts
+
+
+class NameIndexWidget(widgets.Widget):
+    """Résout un nom (ou une liste de noms séparés) en identifiant(s) via un index en mémoire"""
+
+    def __init__(self, model, separator=None, **kwargs):
+        self.model = model
+        self.separator = separator
+        self.index = {}
+        super().__init__(**kwargs)
+
+    def split(self, value):
+        if value is None:
+            return []
+        value = str(value)
+        names = value.split(self.separator) if self.separator else [value]
+        return [name.strip() for name in names if name.strip()]
+
+    def load(self, names):
+        """Construit l'index et crée en une fois les noms absents"""
+        self.index = {name.lower(): pk for pk, name in self.model.objects.values_list('pk', 'name')}
+        missing = {}
+        for name in names:
+            if name.lower() not in self.index:
+                missing.setdefault(name.lower(), name)
+        if missing:
+            created = self.model.objects.bulk_create([self.model(name=name) for name in missing.values()])
+            self.index.update({obj.name.lower(): obj.pk for obj in created})
+
+    def clean(self, value, row=None, **kwargs):
+        ids = [self.index[name.lower()] for name in self.split(value)]
+        if self.separator:
+            return ids
+        return ids[0] if ids else None
+
+
+class MemberResource(resources.ModelResource):
+    family = fields.Field(attribute='family_id', column_name='family', widget=NameIndexWidget(Family))
+    groups = fields.Field(column_name='groups', widget=NameIndexWidget(Group, separator=','))
+    ministries = fields.Field(column_name='ministries', widget=NameIndexWidget(Ministry, separator=','))
+
+    class Meta:
+        model = Member
+        fields = (
+            'member_id', 'first_name', 'last_name', 'gender', 'date_of_birth', 'marital_status',
+            'nationalite', 'profession', 'phone', 'email', 'address', 'baptism_date',
+            'membership_date', 'status', 'family', 'groups', 'ministries',
+        )
+        import_id_fields = ()
+        use_bulk = True
+        batch_size = 1000
+        force_init_instance = True
+        skip_diff = True
+        clean_model_instances = True
+
+    def __init__(self, create_accounts=True, created_by=None, **kwargs):
+        super().__init__(**kwargs)
+        self.create_accounts = create_accounts
+        self.created_by = created_by
+        self.created_member_ids = []
+        self._links = []
+
+    # ------------------------------------------------------------------
+    # Export
+    # ------------------------------------------------------------------
+    def get_queryset(self):
+        return super().get_queryset().select_related('family').prefetch_related('groups', 'ministries')
+
+    def dehydrate_family(self, member):
+        return member.family.name if member.family else ''
+
+    def dehydrate_groups(self, member):
+        return ', '.join(group.name for group in member.groups.all())
+
+    def dehydrate_ministries(self, member):
+        return ', '.join(ministry.name for ministry in member.ministries.all())
+
+    # ------------------------------------------------------------------
+    # Import
+    # ------------------------------------------------------------------
+    def before_import(self, dataset, using_transactions, dry_run, **kwargs):
+        for name in ('family', 'groups', 'ministries'):
+            field = self.fields[name]
+            names = []
+            if field.column_name in dataset.headers:
+                for value in dataset[field.column_name]:
+                    names.extend(field.widget.split(value))
+            field.widget.load(names)
+
+        # Numérotation reprise une seule fois, puis incrémentée en mémoire
+        self.year = timezone.now().year
+        last_id = (Member.objects.filter(member_id__startswith=f'M{self.year}')
+                   .order_by('-member_id').values_list('member_id', flat=True).first())
+        self.next_number = int(last_id[5:]) + 1 if last_id else 1
+
+    def validate_instance(self, instance, import_validation_errors=None, validate_unique=True):
+        # Aucune requête de contrôle par ligne : member_id est pré-alloué,
+        # la famille vient de l'index, user et created_by sont posés à l'enregistrement
+        errors = dict(import_validation_errors or {})
+        try:
+            instance.full_clean(exclude=[*errors, 'member_id', 'family', 'user', 'created_by'],
+                                validate_unique=False)
+        except ValidationError as e:
+            errors = e.update_error_dict(errors)
+        if errors:
+            raise ValidationError(errors)
+
+    def before_save_instance(self, instance, using_transactions, dry_run):
+        if not instance.member_id:
+            instance.member_id = f'M{self.year}{self.next_number:04d}'
+            self.next_number += 1
+        if self.created_by and not instance.created_by_id:
+            instance.created_by = self.created_by
+
+    def save_m2m(self, obj, data, using_transactions, dry_run):
+        # Les relations multiples sont écrites après le bulk_create
+        self._links.append((
+            obj,
+            self.fields['groups'].clean(data) if 'groups' in data else [],
+            self.fields['ministries'].clean(data) if 'ministries' in data else [],
+        ))
+
+    def bulk_create(self, using_transactions, dry_run, raise_errors, batch_size=None, result=None):
+        instances = list(self.create_instances)
+        super().bulk_create(using_transactions, dry_run, raise_errors, batch_size=batch_size, result=result)
+        if not instances or instances[0].pk is None:
+            return
+
+        GroupLink = Member.groups.through
+        MinistryLink = Member.ministries.through
+        links = self._links
+        self._links = []
+        GroupLink.objects.bulk_create([
+            GroupLink(member_id=member.pk, group_id=group_id)
+            for member, group_ids, _ in links for group_id in group_ids
+        ], batch_size=batch_size)
+        MinistryLink.objects.bulk_create([
+            MinistryLink(member_id=member.pk, ministry_id=ministry_id)
+            for member, _, ministry_ids in links for ministry_id in ministry_ids
+        ], batch_size=batch_size)
+        self.created_member_ids.extend(member.pk for member in instances)
+
+    def after_import(self, dataset, result, using_transactions, dry_run, **kwargs):
+        if dry_run:
+            return
+        # Insertions groupées sans signaux : les widgets des membres sont périmés à la main
+        bump_fragment_version('members')
+        if self.create_accounts:
+            defer_member_accounts(self.created_member_ids)
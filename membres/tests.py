@@ -1,3 +1,373 @@
-from django.test import TestCase
+import os
+import tempfile
+from datetime import date, datetime, time, timedelta
+from io import StringIO
 
-# Create your tests here.
+import tablib
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import call_command
+from django.db import connection
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from events.models import Event, EventAttendance, RecurrenceRule
+from apps.testing import QueryBudgetMixin, seed_congregation, view_request
+from notifications.models import OutboundEmail
+from .audience import Segment
+from .models import Member, Ministry, Group, Family, Attendance
+from .onboarding import create_member_accounts
+from .resources import MemberResource
+from .views import build_dashboard_context, cold_widget_values, dashboard_home_async, get_past_events
+
+
+def make_member(index, **kwargs):
+    """Crée un membre minimal (sans email pour ne pas déclencher le signal)"""
+    return Member.objects.create(
+        first_name=f'Prenom{index}',
+        last_name=f'Nom{index}',
+        gender='M',
+        date_of_birth=date(1990, 1, 1),
+        marital_status='single',
+        address='Niamey',
+        **kwargs
+    )
+
+
+class ListViewQueryCountTests(TestCase):
+    """Le nombre de requêtes des listes ne dépend pas du nombre de lignes"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='admin', password='secret', role='admin'
+        )
+        self.client.force_login(self.user)
+        self.counter = 0
+
+    def seed(self, count):
+        for _ in range(count):
+            self.counter += 1
+            leader = make_member(self.counter)
+            family = Family.objects.create(name=f'Famille {self.counter}', head=leader)
+            group = Group.objects.create(name=f'Groupe {self.counter}', group_type='cell', leader=leader)
+            ministry = Ministry.objects.create(name=f'Ministère {self.counter}', leader=leader)
+            for _ in range(3):
+                self.counter += 1
+                member = make_member(self.counter, family=family)
+                member.groups.add(group)
+                member.ministries.add(ministry)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def assertConstantQueries(self, url_name):
+        url = reverse(url_name)
+        # Première requête : réchauffe les caches (session, paramètres)
+        self.client.get(url)
+        self.seed(2)
+        small = self.count_queries(url)
+        self.seed(10)
+        large = self.count_queries(url)
+        self.assertEqual(small, large)
+
+    def test_group_list(self):
+        self.assertConstantQueries('membres:group_list')
+
+    def test_family_list(self):
+        self.assertConstantQueries('membres:family_list')
+
+    def test_ministry_list(self):
+        self.assertConstantQueries('membres:ministry_list')
+
+    def test_group_list_counts(self):
+        self.seed(2)
+        response = self.client.get(reverse('membres:group_list'))
+        groups = response.context['groups']
+        self.assertEqual([g.members_count for g in groups], [3, 3])
+        self.assertEqual(response.context['total_group_members'], 6)
+        self.assertEqual(response.context['cell_groups_count'], 2)
+
+
+class ViewBudgetTests(QueryBudgetMixin, TestCase):
+    """Budgets de requêtes et de temps sur un jeu de données volumineux"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='budget', password='secret', role='admin')
+        cls.data = seed_congregation(organizer=cls.admin)
+
+    def setUp(self):
+        cache.clear()  # budgets mesurés sans fragments en cache
+        self.client.force_login(self.admin)
+        # Réchauffe les caches de session et de paramètres hors budget
+        self.client.get(reverse('membres:group_list'))
+
+    def test_dashboard_home(self):
+        self.assertViewBudget(reverse('dashboard'), 15)
+
+    def test_dashboard_home_cached_fragments(self):
+        self.client.get(reverse('dashboard'))
+        self.assertViewBudget(reverse('dashboard'), 2)
+
+    def test_member_list(self):
+        self.assertViewBudget(reverse('membres:list'), 7)
+
+    def test_member_detail(self):
+        member = self.data['members'][0]
+        self.assertViewBudget(reverse('membres:detail', args=[member.pk]), 10)
+
+    def test_group_list(self):
+        self.assertViewBudget(reverse('membres:group_list'), 3)
+
+    def test_family_list(self):
+        self.assertViewBudget(reverse('membres:family_list'), 3)
+
+    def test_export_csv(self):
+        self.assertViewBudget(reverse('membres:export') + '?format=csv', 3)
+
+    def test_export_pdf(self):
+        self.assertViewBudget(reverse('membres:export') + '?format=pdf', 5, max_seconds=6)
+
+    def test_member_detail_template_query_free(self):
+        member = next(m for m in self.data['members'] if m.family_id)
+        self.assertTemplatesQueryFree(reverse('membres:detail', args=[member.pk]))
+
+    def test_my_profile_template_query_free(self):
+        member = next(m for m in self.data['members'] if m.family_id)
+        member.user = User.objects.create_user(username='fidele', password='secret', role='membre')
+        member.save(update_fields=['user'])
+        member.ministries.add(*Ministry.objects.all()[:2])
+        self.client.force_login(member.user)
+        self.assertTemplatesQueryFree(reverse('membres:my_profile'))
+
+
+@override_settings(EMAIL_OUTBOX_DISPATCH='worker')
+class DashboardFragmentTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(username='admin', password='secret', role='admin')
+        self.client.force_login(self.admin)
+
+    def test_new_member_shown_after_save(self):
+        self.assertNotContains(self.client.get(reverse('dashboard')), 'Prenom7 Nom7')
+        with self.captureOnCommitCallbacks(execute=True):
+            make_member(7, status='active')
+        self.assertContains(self.client.get(reverse('dashboard')), 'Prenom7 Nom7')
+
+    def test_import_refreshes_member_widgets(self):
+        self.client.get(reverse('dashboard'))
+        dataset = tablib.Dataset(headers=['first_name', 'last_name', 'gender', 'date_of_birth',
+                                          'marital_status', 'address', 'status'])
+        dataset.append(['Importe', 'Recent', 'F', '1990-01-01', 'single', 'Niamey', 'active'])
+        with self.captureOnCommitCallbacks(execute=True):
+            MemberResource(create_accounts=False).import_data(dataset, raise_errors=True)
+        self.assertContains(self.client.get(reverse('dashboard')), 'Importe Recent')
+
+
+class DashboardTimelineTests(TestCase):
+    def test_past_series_listed_once_per_date(self):
+        admin = User.objects.create_user(username='admin', password='secret', role='admin')
+        now = timezone.make_aware(datetime.combine(timezone.localdate(), time(12, 0)))
+        start = now.date() - timedelta(weeks=3)
+        service = Event.objects.create(
+            title='Culte', description='Culte', start_date=start, start_time=time(9, 0),
+            end_date=start, end_time=time(11, 0), organizer=admin, created_by=admin,
+            status='published',
+        )
+        RecurrenceRule.objects.create(event=service, frequency='weekly')
+        EventAttendance.objects.create(event=service, member=make_member(1), is_present=True)
+        with self.assertNumQueries(2):
+            events = get_past_events(now)
+        self.assertEqual([event.start_date for event in events],
+                         [start + timedelta(weeks=n) for n in (3, 2, 1, 0)])
+        self.assertEqual(events[-1].attendance_stats, {'present': 1, 'absent': 0})
+        self.assertEqual(events[0].attendees_preview, [])
+
+
+class AsyncDashboardTests(TestCase):
+    """Vue async du tableau de bord : widgets absents du cache calculés en parallèle"""
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(username='admin', password='secret', role='admin')
+        make_member(7, status='active')
+
+    def dashboard_context(self):
+        return build_dashboard_context(view_request(self.admin, reverse('dashboard')))
+
+    def test_async_view_renders_dashboard(self):
+        response = async_to_sync(dashboard_home_async)(view_request(self.admin, reverse('dashboard')))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Prenom7 Nom7')
+
+    def test_async_view_requires_login(self):
+        response = async_to_sync(dashboard_home_async)(view_request(AnonymousUser(), reverse('dashboard')))
+        self.assertEqual(response.status_code, 302)
+
+    def test_cold_widgets_are_computed_before_render(self):
+        self.assertTrue(cold_widget_values(self.admin, self.dashboard_context()))
+
+    def test_widgets_match_template_fragments(self):
+        # Après un rendu, chaque fragment décrit par dashboard_widgets() est en cache :
+        # les clés correspondent à celles des balises {% cache %} du gabarit
+        self.client.force_login(self.admin)
+        self.client.get(reverse('dashboard'))
+        self.assertEqual(cold_widget_values(self.admin, self.dashboard_context()), [])
+
+
+class MemberImportTests(TestCase):
+    """Import en masse : requêtes par lot, pas par ligne"""
+
+    headers = ['first_name', 'last_name', 'gender', 'date_of_birth', 'marital_status',
+               'address', 'email', 'family', 'groups', 'ministries']
+
+    def dataset(self, count, start=0):
+        rows = []
+        for i in range(start, start + count):
+            rows.append([
+                f'Prenom{i}', f'Nom{i}', 'F' if i % 2 else 'M', '1990-05-17', 'single', 'Niamey',
+                f'membre{i}@example.com' if i % 3 == 0 else '',
+                f'Famille {i % 4}', 'Chorale, Jeunesse' if i % 2 else 'Chorale', 'Accueil',
+            ])
+        return tablib.Dataset(*rows, headers=self.headers)
+
+    def import_rows(self, count, start=0):
+        resource = MemberResource(create_accounts=False)
+        with CaptureQueriesContext(connection) as queries:
+            result = resource.import_data(self.dataset(count, start))
+        self.assertFalse(result.has_errors())
+        self.assertFalse(result.has_validation_errors())
+        return resource, len(queries)
+
+    def test_import_creates_members_and_relations(self):
+        resource, _ = self.import_rows(10)
+        self.assertEqual(Member.objects.count(), 10)
+        self.assertEqual(Family.objects.count(), 4)
+        self.assertEqual(Group.objects.count(), 2)
+        self.assertEqual(Ministry.objects.get().members.count(), 10)
+        self.assertEqual(Group.objects.get(name='Jeunesse').members.count(), 5)
+        self.assertEqual(Family.objects.get(name='Famille 1').members.count(), 3)
+        self.assertEqual(len(resource.created_member_ids), 10)
+        # Pas de signal post_save : ni compte ni email pendant l'import
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(OutboundEmail.objects.exists())
+
+    def test_member_ids_follow_existing_sequence(self):
+        year = timezone.now().year
+        make_member(0)
+        self.import_rows(3)
+        ids = sorted(Member.objects.values_list('member_id', flat=True))
+        self.assertEqual(ids, [f'M{year}{n:04d}' for n in range(1, 5)])
+
+    def test_query_count_does_not_grow_with_rows(self):
+        # Familles, groupes et ministères déjà connus après le premier import
+        self.import_rows(4)
+        _, small = self.import_rows(10, start=4)
+        _, large = self.import_rows(40, start=14)
+        self.assertEqual(small, large)
+
+    def test_invalid_rows_are_reported(self):
+        dataset = self.dataset(3)
+        dataset.append(['Prenom', 'Nom', 'X', '1990-05-17', 'single', 'Niamey', '', '', '', ''])
+        result = MemberResource(create_accounts=False).import_data(dataset, dry_run=True)
+        self.assertTrue(result.has_validation_errors())
+        self.assertEqual(result.invalid_rows[0].number, 4)
+
+    def test_accounts_are_deferred_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            MemberResource().import_data(self.dataset(3))
+        self.assertEqual(len(callbacks), 1)
+        self.assertFalse(User.objects.exists())
+
+    def test_create_member_accounts_in_batches(self):
+        resource, _ = self.import_rows(12)
+        count = create_member_accounts(resource.created_member_ids)
+        self.assertEqual(count, 4)
+        members = Member.objects.exclude(email='')
+        self.assertFalse(members.filter(user__isnull=True).exists())
+        self.assertEqual(OutboundEmail.objects.count(), 4)
+        self.assertEqual(User.objects.get(email='membre0@example.com').username, 'prenom0.nom0')
+        # Idempotent : les membres qui ont déjà un compte sont ignorés
+        self.assertEqual(create_member_accounts(resource.created_member_ids), 0)
+
+    def test_suffixed_usernames_already_taken(self):
+        for username in ('awa.moussa', 'awa', 'awa.moussa2'):
+            User.objects.create_user(username=username)
+        member = Member.objects.create(
+            first_name='Awa', last_name='Moussa', email='awa@example.com', gender='F',
+            date_of_birth=date(1990, 1, 1), marital_status='single', address='Niamey',
+        )
+        self.assertEqual(member.user.username, 'awa.moussa3')
+
+    def test_import_members_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as handle:
+            handle.write(self.dataset(5).export('csv'))
+        self.addCleanup(os.remove, handle.name)
+        out = StringIO()
+        call_command('import_members', handle.name, stdout=out)
+        self.assertEqual(Member.objects.count(), 5)
+        self.assertEqual(User.objects.count(), 2)
+        self.assertIn('5 membre(s) importé(s)', out.getvalue())
+
+
+class AudienceSegmentTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        today = timezone.now().date()
+        self.choir = Group.objects.create(name='Chorale', group_type='choir')
+        self.youth = Group.objects.create(name='Jeunesse', group_type='youth')
+        self.young = make_member(1, phone='90000001')
+        self.adult = make_member(2, phone='90000002')
+        # make_member fixe l'âge et le sexe : ajustés ensuite
+        Member.objects.filter(pk=self.young.pk).update(date_of_birth=today.replace(year=today.year - 20))
+        Member.objects.filter(pk=self.adult.pk).update(gender='F')
+        self.visitor = make_member(3, phone='', status='visitor')
+        self.young.groups.add(self.choir, self.youth)
+        self.adult.groups.add(self.choir)
+        Attendance.objects.create(member=self.adult, date=today - timedelta(days=3),
+                                  event_type='sunday_service', present=True)
+
+    def test_members_in_several_groups_counted_once(self):
+        segment = Segment(groups=[self.choir.pk, self.youth.pk])
+        self.assertEqual(segment.member_ids(), [self.young.pk, self.adult.pk])
+
+    def test_criteria_combined_in_one_query(self):
+        segment = Segment(statuses=['active'], groups=[self.choir.pk], max_age=30, channel='phone')
+        with self.assertNumQueries(1):
+            self.assertEqual(segment.member_ids(), [self.young.pk])
+        self.assertEqual(Segment(gender='F').member_ids(), [self.adult.pk])
+        self.assertEqual(Segment(min_age=30).member_ids(), [self.adult.pk, self.visitor.pk])
+        self.assertEqual(Segment(attended_within_days=7).member_ids(), [self.adult.pk])
+        self.assertEqual(Segment(channel='phone').count(), 2)
+
+    def test_ids_cached(self):
+        segment = Segment(groups=[self.choir.pk])
+        segment.count()
+        with self.assertNumQueries(0):
+            self.assertEqual(Segment(groups=(self.choir.pk,)).count(), 2)
+
+    def test_count_matches_normalized_recipients(self):
+        # Même numéro saisi sous deux formes : un seul envoi, l'aperçu compte un destinataire
+        twin = make_member(4, phone='+227 90 00 00 01')
+        twin.groups.add(self.youth)
+        segment = Segment(groups=[self.youth.pk], channel='phone')
+        self.assertEqual(segment.recipients(), [(self.young.pk, '+22790000001')])
+        self.assertEqual(segment.count(), 1)
+
+    def test_empty_selection_targets_nobody(self):
+        self.assertEqual(Segment.for_recipients('group').count(), 0)
+        self.assertEqual(Segment.for_recipients('all').count(), 2)
+
+    def test_contacts_streamed(self):
+        contacts = list(Segment(groups=[self.youth.pk]).contacts())
+        self.assertEqual(contacts, [{
+            'pk': self.young.pk, 'first_name': 'Prenom1', 'last_name': 'Nom1',
+            'phone': '90000001', 'email': '',
+        }])
@@ -1,4 +1,3 @@
-from django.core.mail import EmailMessage
 from django.template.loader import render_to_string
 import random
 import string
@@ -7,10 +6,11 @@ from urllib import request
 from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from accounts.permissions import require_role
 from django.contrib import messages
 from django.http import HttpResponse, JsonResponse
 from django.core.paginator import Paginator
-from django.db.models import Q, Count, Sum
+from django.db.models import Q, Count, Sum, OuterRef, Prefetch, Subquery, prefetch_related_objects
 from django.utils import timezone
 from datetime import datetime, timedelta
 from django.utils.crypto import get_random_string
@@ -44,12 +44,16 @@ import csv
 from datetime import datetime
 from django.views.generic import TemplateView
 from django.utils import timezone
-from events.models import Event, EventCategory
-
-@login_required
-def dashboard_home(request):
-    """Vue tableau de bord dynamique selon le rôle"""
+from events.models import Event, EventAttendance, EventCategory
+from events.recurrence import timeline
+from asgiref.sync import sync_to_async
+from apps import fanout
+from apps.fragments import cached_fragments, deferred, fragment_context
+
+def build_dashboard_context(request):
+    """Contexte du tableau de bord selon le rôle ; None si l'utilisateur n'a pas de profil membre"""
     user = request.user
+    access = user.permissions
     today = timezone.now().date()
     member = None
     if hasattr(user, 'member'):
@@ -57,82 +61,49 @@ def dashboard_home(request):
     context = {'title': 'Tableau de Bord', 'user': user ,'member': member, 'today': today}
 
     # ======== Gestion des accès =========
-    if user.has_admin_access() or user.has_membres_management_access():
-        # ---- STATISTIQUES GLOBALES ----
+    if access.has('admin', 'membres'):
+        # Widgets calculés au premier affichage (deferred) : rien n'est lu
+        # en base pour les fragments déjà en cache
+        active_members = Member.objects.filter(status='active')
         context.update({
             'has_admin_access': True,
-            'total_members': Member.objects.filter(status='active').count(),
-            'new_members_month': Member.objects.filter(
-                membership_date__year=timezone.now().year,
-                membership_date__month=timezone.now().month,
-                status='active'
-            ).count(),
-            'total_families': Family.objects.count(),
-            'total_ministries': Ministry.objects.count(),
-            'total_groups': Group.objects.count(),
+            'total_members': deferred(active_members.count),
+            'new_members_month': deferred(lambda: active_members.filter(
+                membership_date__year=today.year,
+                membership_date__month=today.month,
+            ).count()),
+            'total_families': deferred(Family.objects.count),
+            'total_ministries': deferred(Ministry.objects.count),
+            'total_groups': deferred(Group.objects.count),
+            # ---- Statistiques par genre et par tranche d'âge ----
+            'gender_stats': deferred(lambda: list(
+                active_members.values('gender').annotate(count=Count('id'))
+            )),
+            'age_groups': deferred(get_age_groups),
+            # ---- Activités récentes ----
+            'recent_members': deferred(lambda: list(active_members.order_by('-created_at')[:5])),
+            'recent_attendances': deferred(lambda: list(
+                Attendance.objects.select_related('member').order_by('-date')[:10]
+            )),
+            'upcoming_birthdays': deferred(lambda: get_upcoming_birthdays(10)),
         })
 
-        # ---- Statistiques par genre ----
-        gender_stats = Member.objects.filter(status='active').values('gender').annotate(count=Count('id'))
-        context['gender_stats'] = list(gender_stats)
-
-        # ---- Statistiques par tranche d'âge ----
-        age_groups = {
-            'Enfants (0-12)': 0,
-            'Adolescents (13-17)': 0,
-            'Jeunes Adultes (18-24)': 0,
-            'Adultes (25-64)': 0,
-            'Seniors (65+)': 0
-        }
-        members_with_age = Member.objects.filter(status='active').exclude(date_of_birth__isnull=True)
-        for member in members_with_age:
-            age = member.get_age()
-            if age <= 12:
-                age_groups['Enfants (0-12)'] += 1
-            elif age <= 17:
-                age_groups['Adolescents (13-17)'] += 1
-            elif age <= 24:
-                age_groups['Jeunes Adultes (18-24)'] += 1
-            elif age <= 64:
-                age_groups['Adultes (25-64)'] += 1
-            else:
-                age_groups['Seniors (65+)'] += 1
-        context['age_groups'] = age_groups
-
         # ---- Statistiques financières (si droit finance) ----
-        if user.has_finance_access():
-            current_month = timezone.now().replace(day=1)
-            monthly_income = FinancialTransaction.objects.filter(
-                date__gte=current_month,
-                category__category_type='income',
-                is_validated=True
-            ).aggregate(total=Sum('amount'))['total'] or 0
-
-            monthly_expense = FinancialTransaction.objects.filter(
-                date__gte=current_month,
-                category__category_type='expense',
-                is_validated=True
-            ).aggregate(total=Sum('amount'))['total'] or 0
-
-            context['financial_stats'] = {
-                'monthly_income': monthly_income,
-                'monthly_expense': monthly_expense,
-                'balance': monthly_income - monthly_expense,
-            }
-            context['has_finance_access'] = True
+        if access.finance:
+            context.update({
+                'has_finance_access': True,
+                'financial_stats': deferred(get_monthly_financial_stats),
+                'pending_transactions': deferred(
+                    FinancialTransaction.objects.filter(is_validated=False).count
+                ),
+                'recent_transactions': deferred(lambda: list(
+                    FinancialTransaction.objects.filter(is_validated=True)
+                    .select_related('category', 'member').order_by('-date')[:5]
+                )),
+            })
         else:
             context['has_finance_access'] = False
 
-        # ---- Activités récentes ----
-        context['recent_members'] = Member.objects.filter(status='active').order_by('-created_at')[:5]
-        if user.has_finance_access():
-            context['recent_transactions'] = FinancialTransaction.objects.filter(
-                is_validated=True
-            ).order_by('-date')[:5]
-
-        context['recent_attendances'] = Attendance.objects.select_related('member').order_by('-date')[:10]
-        context['upcoming_birthdays'] = get_upcoming_birthdays(10)
-
     # ======== Utilisateur simple (membre) =========
     elif hasattr(user, 'member_profile'):
         member = user.member_profile
@@ -140,36 +111,166 @@ def dashboard_home(request):
             'has_admin_access': False,
             'has_finance_access': False,
             'member': member,
+            'ministries_count': member.ministries.count(),
             'recent_attendances': Attendance.objects.filter(member=member).order_by('-date')[:10],
             'upcoming_birthdays': get_upcoming_birthdays(10),  # Optionnel, selon besoin
         })
 
     # ======== Cas utilisateur sans profil =========
     else:
-        messages.warning(
-            request,
-            'Votre profil membre n\'est pas encore créé. Veuillez contacter l\'administrateur.'
-        )
-        return redirect('accounts:profile')    
+        return None
     # ==== Événements pour le dashboard ====
     now = timezone.now()
-    context['upcoming_events'] = Event.objects.filter(
-        start_date__gte=now,
-        status__in=['published', 'scheduled']
-    ).order_by('start_date')[:5]
-    
-    for event in context['upcoming_events']:
-        event.days_until = (event.start_date - today).days
+    context['upcoming_events'] = deferred(lambda: get_upcoming_events(now, 5))
+    context['past_events'] = deferred(lambda: get_past_events(now, 5))
+    context['fragments'] = fragment_context(request, 'members', 'attendances', 'events', 'transactions')
+    return context
 
 
-    context['past_events'] = Event.objects.filter(
-        end_date__lt=now,
-        status__in=['published', 'ongoing']
-    ).order_by('-end_date')[:5]
-  
+def dashboard_widgets(user, context):
+    """
+    Fragments du gabarit members/dashboard.html affichés à cet utilisateur,
+    (nom, vary_on...) comme dans {% cache %}, avec les valeurs de contexte
+    qu'ils lisent
+    """
+    fragments = context['fragments']
+    role, versions, today = fragments['role'], fragments['versions'], context['today']
+    widgets = {
+        ('dashboard.events', role, today, versions['members'], versions['attendances'], versions['events']):
+            ('upcoming_events', 'past_events'),
+    }
+    if user.permissions.admin:
+        widgets.update({
+            ('dashboard.kpis', role, today, versions['members'], versions['transactions']):
+                ('total_members', 'new_members_month', 'total_families', 'financial_stats', 'pending_transactions'),
+            ('dashboard.charts', today, versions['members']): ('gender_stats',),
+            ('dashboard.members', today, versions['members']): ('recent_members', 'upcoming_birthdays'),
+            ('dashboard.transactions', role, versions['members'], versions['transactions']):
+                ('recent_transactions',),
+            ('dashboard.charts_data', today, versions['members']): ('gender_stats', 'age_groups'),
+            ('dashboard.total_members', versions['members']): ('total_members',),
+        })
+    return widgets
+
+
+def cold_widget_values(user, context):
+    """Valeurs différées lues par les fragments absents du cache"""
+    widgets = dashboard_widgets(user, context)
+    warm = cached_fragments(*widgets)
+    names = {name for fragment, names in widgets.items() if fragment not in warm for name in names}
+    return [context[name] for name in sorted(names) if callable(context.get(name))]
+
+
+def _missing_profile(request):
+    messages.warning(
+        request,
+        'Votre profil membre n\'est pas encore créé. Veuillez contacter l\'administrateur.'
+    )
+    return redirect('accounts:profile')
+
+
+@login_required
+def dashboard_home(request):
+    """Vue tableau de bord dynamique selon le rôle"""
+    context = build_dashboard_context(request)
+    if context is None:
+        return _missing_profile(request)
     return render(request, 'members/dashboard.html', context)
 
 
+@require_role()
+async def dashboard_home_async(request):
+    """
+    dashboard_home servie en ASGI : les widgets absents du cache sont
+    calculés en parallèle (apps.fanout) avant le rendu
+    """
+    context = await sync_to_async(build_dashboard_context)(request)
+    if context is None:
+        return _missing_profile(request)
+    await fanout.gather(*await sync_to_async(cold_widget_values)(request.user, context))
+    return await sync_to_async(render)(request, 'members/dashboard.html', context)
+
+
+def get_age_groups():
+    """Répartition des membres actifs par tranche d'âge"""
+    age_groups = {
+        'Enfants (0-12)': 0,
+        'Adolescents (13-17)': 0,
+        'Jeunes Adultes (18-24)': 0,
+        'Adultes (25-64)': 0,
+        'Seniors (65+)': 0
+    }
+    members_with_age = Member.objects.filter(status='active').exclude(date_of_birth__isnull=True)
+    for member in members_with_age.only('date_of_birth'):
+        age = member.get_age()
+        if age <= 12:
+            age_groups['Enfants (0-12)'] += 1
+        elif age <= 17:
+            age_groups['Adolescents (13-17)'] += 1
+        elif age <= 24:
+            age_groups['Jeunes Adultes (18-24)'] += 1
+        elif age <= 64:
+            age_groups['Adultes (25-64)'] += 1
+        else:
+            age_groups['Seniors (65+)'] += 1
+    return age_groups
+
+
+def get_monthly_financial_stats():
+    """Revenus, dépenses et solde validés du mois en cours, en une requête"""
+    current_month = timezone.now().date().replace(day=1)
+    totals = FinancialTransaction.objects.filter(
+        date__gte=current_month,
+        is_validated=True
+    ).aggregate(
+        income=Sum('amount', filter=Q(category__category_type='income')),
+        expense=Sum('amount', filter=Q(category__category_type='expense')),
+    )
+    monthly_income = totals['income'] or 0
+    monthly_expense = totals['expense'] or 0
+    return {
+        'monthly_income': monthly_income,
+        'monthly_expense': monthly_expense,
+        'balance': monthly_income - monthly_expense,
+    }
+
+
+def get_upcoming_events(now, limit=5):
+    """Prochains événements (séries déroulées), avec le nombre de jours restants"""
+    events = timeline(now, limit=limit)
+    for event in events:
+        event.days_until = (event.start_date - now.date()).days
+    return events
+
+
+def get_past_events(now, limit=5):
+    """
+    Derniers événements passés (séries déroulées) avec leurs statistiques de
+    présence et un aperçu des participants (5 premiers) : deux requêtes au total
+    """
+    preview = Prefetch(
+        'attendances',
+        queryset=EventAttendance.objects.filter(is_present=True)
+        .select_related('member').order_by('pk')[:5],
+        to_attr='attendees_preview',
+    )
+    events = timeline(now, past=True, limit=limit, queryset=Event.objects.annotate(
+        present_count=Count('attendances', filter=Q(attendances__is_present=True)),
+        absent_count=Count('attendances', filter=Q(attendances__is_present=False)),
+    ))
+    # Occurrences calculées : pas encore de ligne, donc aucune présence
+    saved = [event for event in events if event.pk]
+    prefetch_related_objects(saved, preview)
+    for event in events:
+        if not event.pk:
+            event.present_count = event.absent_count = 0
+            event.attendees_preview = []
+        event.total_attendees = event.present_count
+        if event.present_count or event.absent_count:
+            event.attendance_stats = {'present': event.present_count, 'absent': event.absent_count}
+    return events
+
+
 def get_upcoming_birthdays(limit=10):
     """Récupère les prochains anniversaires"""
     today = timezone.now().date()
@@ -201,18 +302,14 @@ def get_upcoming_birthdays(limit=10):
     birthdays.sort(key=lambda x: x['days_until'])
     return birthdays[:limit]
 
-@login_required
+@require_role('membres')
 def member_list(request):
     """Liste des membres avec filtres et recherche"""
-    if not request.user.has_membres_management_access():
-        messages.error(request, "Vous n'avez pas l'autorisation d'accéder à cette page.")
-        return redirect('dashboard')
-
     members = Member.objects.all().order_by('-created_at')
     context = {
         'members': members,
         'title': 'Liste des Membres',
-        'has_membres_management_access': request.user.has_membres_management_access(),  # pour le template
+        'has_membres_management_access': request.user.permissions.membres,  # pour le template
     }
     
     
@@ -285,9 +382,10 @@ def export_members(request):
     format_type = request.GET.get('format', 'csv')
 
     # Récupérer les membres selon les permissions
-    if hasattr(request.user, 'has_admin_access') and request.user.has_admin_access():
+    access = request.user.permissions
+    if access.admin:
         members = Member.objects.all().select_related('user', 'family')
-    elif hasattr(request.user, 'has_member_management_access') and request.user.has_member_management_access():
+    elif access.membres:
         # Si tu as un groupe géré par l'utilisateur
         members = Member.objects.filter(user=request.user).select_related('user', 'family')
     else:
@@ -473,13 +571,9 @@ def generate_random_password(length=8):
     return ''.join(random.choice(chars) for _ in range(length))
 
 
-@login_required
+@require_role('membres', message="Vous n'avez pas l'autorisation d'ajouter des membres.")
 def member_add(request):
     """Ajouter un nouveau membre et envoyer un email de notification"""
-    if not request.user.has_membres_management_access():
-        messages.error(request, "Vous n'avez pas l'autorisation d'ajouter des membres.")
-        return redirect('membres:list')
-
     if request.method == 'POST':
         form = MemberForm(request.POST, request.FILES)
         if form.is_valid():
@@ -488,33 +582,11 @@ def member_add(request):
             member.save()
             form.save_m2m()
 
-            # --- Création du User associé ---
-            password = get_random_string(length=8)  # mot de passe aléatoire
-            user = User.objects.create_user(
-                username=member.email,  # utiliser l'email comme username
-                email=member.email,
-                first_name=member.first_name,
-                last_name=member.last_name,
-                password=password
-            )
-
-            # --- Préparer le mail ---
-            context = {
-                'user': user,
-                'password': password,
-                'login_url': request.build_absolute_uri('/accounts/login/'),
-            }
-            message = render_to_string('membres/email_new_member.html', context)
-
-            mail = EmailMessage(
-                subject='Bienvenue sur la plateforme',
-                body=message,
-                to=[user.email],
-            )
-            mail.content_subtype = "html"
-            mail.send()
-
-            messages.success(request, f"Le membre a été ajouté et un email a été envoyé à {user.email}.")
+            # Le compte et l'email d'activation sont créés par le signal post_save
+            if member.email:
+                messages.success(request, f"Le membre a été ajouté et un email d'activation a été envoyé à {member.email}.")
+            else:
+                messages.success(request, "Le membre a été ajouté.")
             return redirect('membres:detail', member_id=member.id)
     else:
         form = MemberForm()
@@ -527,13 +599,9 @@ def member_add(request):
     return render(request, 'members/form.html', context)
 
 
-@login_required
+@require_role('membres', message="Vous n'avez pas l'autorisation de modifier des membres.")
 def member_edit(request, member_id):
     """Modifier un membre existant"""
-    if not request.user.has_membres_management_access():
-        messages.error(request, 'Vous n\'avez pas l\'autorisation de modifier des membres.')
-        return redirect('membres:list')
-    
     member = get_object_or_404(Member, pk=member_id)
     
     if request.method == 'POST':
@@ -554,17 +622,33 @@ def member_edit(request, member_id):
     
     return render(request, 'members/form.html', context)
 
-@login_required
-def member_detail(request, member_id):
-    """Détails d'un membre"""
+def get_member_with_relations(**lookup):
+    """
+    Membre prêt pour les fiches (détail, profil) : famille et compte joints,
+    ministères et groupes préchargés, taille de la famille annotée.
+    Les gabarits n'ont plus aucune requête à faire.
+    """
+    family_size = (Member.objects.filter(family=OuterRef('family'))
+                   .values('family').annotate(n=Count('pk')).values('n'))
     member = get_object_or_404(
         Member.objects.select_related('family', 'user')
-        .prefetch_related('ministries', 'groups', 'transactions', 'attendances'),
-        pk=member_id
+        .prefetch_related('ministries', 'groups')
+        .annotate(family_members_count=Subquery(family_size)),
+        **lookup
     )
+    if member.family:
+        member.family.members_count = member.family_members_count
+    return member
+
+
+@login_required
+def member_detail(request, member_id):
+    """Détails d'un membre"""
+    member = get_member_with_relations(pk=member_id)
 
     # Vérification des permissions
-    if not request.user.has_membres_management_access():
+    access = request.user.permissions
+    if not access.membres:
         if not hasattr(request.user, 'member_profile') or request.user.member_profile != member:
             messages.error(request, 'Vous n\'avez pas l\'autorisation de voir ce profil.')
             return redirect('dashboard')
@@ -578,15 +662,15 @@ def member_detail(request, member_id):
     attendance_rate = round((present_count / total_attendances) * 100, 1) if total_attendances else 0
 
     # Slice après le filtrage
-    recent_attendances = attendances_qs[:10]
+    recent_attendances = list(attendances_qs[:10])
 
     # Transactions récentes (si autorisé)
     recent_transactions = None
     total_contributions = 0
-    if request.user.has_finance_access():
-        recent_transactions = member.transactions.filter(
+    if access.finance:
+        recent_transactions = list(member.transactions.filter(
             is_validated=True
-        ).order_by('-date')[:5]
+        ).order_by('-date')[:5])
         total_contributions = member.transactions.filter(
             is_validated=True
         ).aggregate(total=Sum('amount'))['total'] or 0
@@ -608,13 +692,9 @@ def member_detail(request, member_id):
 
 
         
-@login_required
+@require_role('membres', message="Vous n'avez pas l'autorisation de supprimer des membres.")
 def member_delete(request, member_id):
     """Supprimer un membre"""
-    if not request.user.has_member_management_access():
-        messages.error(request, 'Vous n\'avez pas l\'autorisation de supprimer des membres.')
-        return redirect('membres:list')
-    
     member = get_object_or_404(Member, pk=member_id)
     
     if request.method == "POST":
@@ -663,7 +743,7 @@ def my_profile(request):
     member = None
     # Si tu relies User à Member via une relation OneToOne
     if hasattr(request.user, "member_profile"):
-        member = request.user.member_profile
+        member = get_member_with_relations(user=request.user)
 
     context = {
         "user": request.user,
@@ -676,8 +756,19 @@ def my_profile(request):
 
 
 def ministry_list(request):
-    ministries = Ministry.objects.all()  # Récupérer tous les ministères
-    return render(request, "members/ministry_list.html", {"ministries": ministries})
+    # Un seul SELECT : responsable joint et nombre de membres annoté
+    ministries = list(
+        Ministry.objects.select_related('leader')
+        .annotate(members_count=Count('members', distinct=True))
+    )
+
+    context = {
+        "ministries": ministries,
+        "total_ministry_members": sum(m.members_count for m in ministries),
+        "largest_ministry": max(ministries, key=lambda m: m.members_count, default=None),
+        "ministries_with_leaders": sum(1 for m in ministries if m.leader_id),
+    }
+    return render(request, "members/ministry_list.html", context)
 
 def ministry_add(request):
     if request.method == "POST":
@@ -712,28 +803,25 @@ def ministry_delete(request, ministry_id):
     return render(request, "members/ministry_delete.html", {"ministry": ministry})
 
 def group_list(request):
-    groups = Group.objects.all()
-    cell_groups_count = Group.objects.filter(group_type='cell').count()
-    youth_groups_count = Group.objects.filter(group_type='youth').count()
-    total_group_members = sum([g.members.count() for g in groups])
+    # Un seul SELECT : responsable joint et nombre de membres annoté
+    groups = list(
+        Group.objects.select_related('leader')
+        .annotate(members_count=Count('members', distinct=True))
+    )
 
     context = {
         "groups": groups,
-        "cell_groups_count": cell_groups_count,
-        "youth_groups_count": youth_groups_count,
-        "total_group_members": total_group_members,
+        "cell_groups_count": sum(1 for g in groups if g.group_type == 'cell'),
+        "youth_groups_count": sum(1 for g in groups if g.group_type == 'youth'),
+        "total_group_members": sum(g.members_count for g in groups),
     }
     return render(request, "members/group_list.html", context)
 
-@login_required
+@require_role('membres', redirect_to='membres:group_list', message="Vous n'avez pas les droits pour ajouter un groupe.")
 def group_add(request):
     """Vue pour ajouter un nouveau groupe"""
     user = request.user
     
-    if not user.has_membres_management_access():
-        messages.warning(request, "Vous n'avez pas les droits pour ajouter un groupe.")
-        return redirect('membres:group_list')
-    
     if request.method == "POST":
         form = GroupForm(request.POST)
         if form.is_valid():
@@ -769,18 +857,17 @@ def group_edit(request, group_id):
 
     return render(request, "members/group_edit.html", {"form": form, "group": group})
 
+@require_role('admin', redirect_to='membres:group_list', message="Vous n'avez pas la permission de supprimer ce groupe.")
 def group_delete(request, group_id):
-    if not request.user.is_staff:  # uniquement admin
-        messages.error(request, "Vous n'avez pas la permission de supprimer ce groupe.")
-        return redirect('membres:group_list')
-
     group = get_object_or_404(Group, id=group_id)
     group.delete()
     messages.success(request, "Le groupe a été supprimé avec succès.")
     return redirect('membres:group_list')
 
 def family_list(request):
-    families = Family.objects.all()
+    families = Family.objects.select_related('head').annotate(
+        members_count=Count('members', distinct=True)
+    )
     return render(request, "members/family_list.html", {"families": families})
 
 
@@ -800,16 +887,11 @@ def attendance_mark(request):
 
 
 
-@login_required
+@require_role('membres', redirect_to='membres:family_list', message="Vous n'avez pas les droits pour ajouter une famille.")
 def family_add(request):
     """Vue pour ajouter une nouvelle famille"""
     user = request.user
     
-    # Vérifie l'accès
-    if not user.has_membres_management_access():
-        messages.warning(request, "Vous n'avez pas les droits pour ajouter une famille.")
-        return redirect('membres:family_list')
-    
     if request.method == "POST":
         form = FamilyForm(request.POST)
         if form.is_valid():
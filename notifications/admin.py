@@ -0,0 +1,11 @@
+from django.contrib import admin
+
+from .models import OutboundEmail
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at']
+    list_filter = ['status']
+    search_fields = ['subject', 'to']
+    readonly_fields = ['created_at', 'sent_at', 'locked_at', 'last_error']
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from notifications.outbox import send_pending
+
+
+class Command(BaseCommand):
+    help = "Envoie les emails en file d'attente (une fois, ou en continu avec --loop)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--loop', action='store_true', help='Tourne en continu (mode worker)')
+        parser.add_argument('--interval', type=float, default=5,
+                            help="Pause en secondes quand la file est vide (avec --loop)")
+
+    def handle(self, *args, **options):
+        while True:
+            stats = send_pending(batch_size=options['batch_size'])
+            if stats['claimed']:
+                self.stdout.write(
+                    f"{stats['sent']} envoyé(s), {stats['retried']} replanifié(s), {stats['failed']} en échec"
+                )
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
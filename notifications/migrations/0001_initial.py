@@ -0,0 +1,40 @@
+# Generated by Django 5.0 on 2026-10-19 11:45
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboundEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=255, verbose_name='Sujet')),
+                ('body', models.TextField(verbose_name='Texte')),
+                ('html_body', models.TextField(blank=True, verbose_name='HTML')),
+                ('from_email', models.CharField(blank=True, max_length=255, verbose_name='Expéditeur')),
+                ('to', models.JSONField(default=list, verbose_name='Destinataires')),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('sending', "En cours d'envoi"), ('sent', 'Envoyé'), ('failed', 'Échec définitif')], default='pending', max_length=10, verbose_name='Statut')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Tentatives')),
+                ('max_attempts', models.PositiveSmallIntegerField(default=5)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Prochaine tentative')),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True, verbose_name='Dernière erreur')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Envoyé le')),
+            ],
+            options={
+                'verbose_name': 'Email sortant',
+                'verbose_name_plural': 'Emails sortants',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='notificatio_status_36aace_idx')],
+            },
+        ),
+    ]
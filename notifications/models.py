@@ -0,0 +1,45 @@
+"""
+File d'attente persistante des emails sortants (outbox)
+"""
+from django.db import models
+from django.utils import timezone
+
+
+class OutboundEmail(models.Model):
+    """
+    Email en attente d'envoi : écrit dans la même transaction que l'action
+    qui le déclenche, puis envoyé par lots par notifications.outbox.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'En attente'),
+        ('sending', 'En cours d\'envoi'),
+        ('sent', 'Envoyé'),
+        ('failed', 'Échec définitif'),
+    ]
+
+    subject = models.CharField(max_length=255, verbose_name="Sujet")
+    body = models.TextField(verbose_name="Texte")
+    html_body = models.TextField(blank=True, verbose_name="HTML")
+    from_email = models.CharField(max_length=255, blank=True, verbose_name="Expéditeur")
+    to = models.JSONField(default=list, verbose_name="Destinataires")
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', verbose_name="Statut")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Tentatives")
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name="Prochaine tentative")
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, verbose_name="Dernière erreur")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name="Envoyé le")
+
+    class Meta:
+        verbose_name = "Email sortant"
+        verbose_name_plural = "Emails sortants"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} → {', '.join(self.to)} ({self.get_status_display()})"
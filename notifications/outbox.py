@@ -0,0 +1,214 @@
+"""
+Envoi asynchrone des emails.
+
+queue_email() enregistre le message dans la transaction courante ; après le
+commit, un envoi est déclenché selon EMAIL_OUTBOX_DISPATCH :
+- 'thread' : un thread d'arrière-plan du processus vide la file, puis
+  programme un réveil à l'échéance du prochain message replanifié
+- 'worker' : rien, la commande send_queued_emails (cron ou --loop) s'en charge
+
+En mode 'thread', le réveil programmé vit dans le processus : après un
+redémarrage, les messages replanifiés attendent le prochain email mis en
+file. Planifier aussi send_queued_emails (cron) pour ne rien laisser en file.
+
+send_pending() envoie par lots sur une seule connexion SMTP, limite le débit
+(EMAIL_OUTBOX_RATE messages par seconde) et replanifie les échecs avec un
+délai exponentiel. Une panne SMTP ne fait donc plus échouer l'action
+d'origine : les messages restent en file jusqu'au retour du serveur.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import connections, transaction
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+# Un message resté « en cours » plus longtemps vient d'un worker interrompu
+STALE_LOCK = timedelta(minutes=10)
+
+_worker_lock = threading.Lock()
+# Réveil demandé pendant qu'un thread d'envoi tenait le verrou : il repasse avant de s'arrêter
+_wake_requested = threading.Event()
+_retry_timer = None
+_retry_timer_lock = threading.Lock()
+
+
+def queue_email(subject, body, to, html_body='', from_email=None):
+    """Met un email en file ; l'envoi est déclenché après le commit"""
+    if isinstance(to, str):
+        to = [to]
+    email = OutboundEmail.objects.create(
+        subject=subject,
+        body=body,
+        html_body=html_body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(to),
+    )
+    transaction.on_commit(wake_worker)
+    return email
+
+
+def queue_emails(messages):
+    """
+    Met plusieurs emails en file en une seule insertion.
+    `messages` : dicts avec les clés de queue_email (subject, body, to, ...)
+    """
+    emails = OutboundEmail.objects.bulk_create([
+        OutboundEmail(
+            subject=message['subject'],
+            body=message['body'],
+            html_body=message.get('html_body', ''),
+            from_email=message.get('from_email') or settings.DEFAULT_FROM_EMAIL,
+            to=[message['to']] if isinstance(message['to'], str) else list(message['to']),
+        )
+        for message in messages
+    ])
+    if emails:
+        transaction.on_commit(wake_worker)
+    return emails
+
+
+def wake_worker():
+    """Déclenche un envoi en arrière-plan si ce mode est configuré"""
+    if getattr(settings, 'EMAIL_OUTBOX_DISPATCH', 'thread') != 'thread':
+        return
+    _wake_requested.set()
+    # Un seul thread d'envoi par processus : celui en cours verra la demande
+    if not _worker_lock.acquire(blocking=False):
+        return
+    threading.Thread(target=_drain_in_thread, name='email-outbox', daemon=True).start()
+
+
+def _drain_in_thread():
+    """Vide la file ; appelé avec _worker_lock acquis, le libère en sortant"""
+    while True:
+        try:
+            _wake_requested.clear()
+            while send_pending()['claimed']:
+                pass
+            _schedule_retry()
+        except Exception:
+            logger.exception("Échec du vidage de la file d'emails")
+        finally:
+            connections.close_all()
+            _worker_lock.release()
+        # Demande arrivée pendant le dernier lot : si aucun autre thread ne l'a prise, on repasse
+        if not (_wake_requested.is_set() and _worker_lock.acquire(blocking=False)):
+            return
+
+
+def _schedule_retry():
+    """Programme un réveil à l'échéance du prochain message en attente"""
+    global _retry_timer
+    next_attempt = (OutboundEmail.objects.filter(status='pending')
+                    .aggregate(next=Min('next_attempt_at'))['next'])
+    with _retry_timer_lock:
+        if _retry_timer is not None:
+            _retry_timer.cancel()
+            _retry_timer = None
+        if next_attempt is None:
+            return
+        delay = max((next_attempt - timezone.now()).total_seconds(), 0)
+        _retry_timer = threading.Timer(delay, wake_worker)
+        _retry_timer.daemon = True
+        _retry_timer.start()
+
+
+def _claim(batch_size):
+    """Réserve un lot de messages dus (sans doublon entre workers)"""
+    now = timezone.now()
+    due = Q(status='pending', next_attempt_at__lte=now) | Q(status='sending', locked_at__lt=now - STALE_LOCK)
+    with transaction.atomic():
+        ids = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(due)
+            .order_by('next_attempt_at')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        OutboundEmail.objects.filter(pk__in=ids).update(status='sending', locked_at=now)
+    return list(OutboundEmail.objects.filter(pk__in=ids).order_by('next_attempt_at'))
+
+
+def _backoff(attempts):
+    base = getattr(settings, 'EMAIL_OUTBOX_RETRY_DELAY', 60)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), 6 * 3600))
+
+
+def _reschedule(email, error):
+    email.attempts += 1
+    email.last_error = str(error)[:2000]
+    email.locked_at = None
+    if email.attempts >= email.max_attempts:
+        email.status = 'failed'
+    else:
+        email.status = 'pending'
+        email.next_attempt_at = timezone.now() + _backoff(email.attempts)
+    email.save(update_fields=['attempts', 'last_error', 'locked_at', 'status', 'next_attempt_at'])
+    return email.status
+
+
+def send_pending(batch_size=None):
+    """
+    Envoie un lot de messages dus. Retourne le nombre de messages réservés,
+    envoyés, replanifiés et en échec définitif.
+    """
+    batch_size = batch_size or getattr(settings, 'EMAIL_OUTBOX_BATCH_SIZE', 50)
+    rate = getattr(settings, 'EMAIL_OUTBOX_RATE', 0)
+    interval = 1 / rate if rate else 0
+    stats = {'claimed': 0, 'sent': 0, 'retried': 0, 'failed': 0}
+
+    emails = _claim(batch_size)
+    stats['claimed'] = len(emails)
+    if not emails:
+        return stats
+
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as exc:
+        # Serveur injoignable : tout le lot est replanifié
+        logger.warning("Connexion SMTP impossible : %s", exc)
+        for email in emails:
+            stats['retried' if _reschedule(email, exc) == 'pending' else 'failed'] += 1
+        return stats
+
+    last_sent = 0.0
+    try:
+        for email in emails:
+            wait = interval - (time.monotonic() - last_sent)
+            if wait > 0:
+                time.sleep(wait)
+            message = EmailMultiAlternatives(
+                subject=email.subject,
+                body=email.body,
+                from_email=email.from_email,
+                to=email.to,
+                connection=connection,
+            )
+            if email.html_body:
+                message.attach_alternative(email.html_body, 'text/html')
+            try:
+                message.send()
+            except Exception as exc:
+                logger.warning("Échec d'envoi de l'email %s : %s", email.pk, exc)
+                stats['retried' if _reschedule(email, exc) == 'pending' else 'failed'] += 1
+            else:
+                email.status = 'sent'
+                email.sent_at = timezone.now()
+                email.attempts += 1
+                email.locked_at = None
+                email.save(update_fields=['status', 'sent_at', 'attempts', 'locked_at'])
+                stats['sent'] += 1
+            last_sent = time.monotonic()
+    finally:
+        connection.close()
+
+    return stats
@@ -0,0 +1,129 @@
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from membres.models import Member
+from .models import OutboundEmail
+from . import outbox
+from .outbox import queue_email, send_pending
+
+
+class FailingBackend(BaseEmailBackend):
+    """Simule un serveur SMTP en panne"""
+    def send_messages(self, email_messages):
+        raise ConnectionRefusedError('SMTP indisponible')
+
+
+@override_settings(EMAIL_OUTBOX_DISPATCH='worker', EMAIL_OUTBOX_RATE=0)
+class OutboxTests(TestCase):
+    def test_queue_email_is_sent_after_commit_only(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            email = queue_email('Sujet', 'Texte', 'membre@example.com', html_body='<p>Texte</p>')
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(email.status, 'pending')
+        self.assertEqual(email.to, ['membre@example.com'])
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_send_pending_sends_batch(self):
+        for i in range(3):
+            queue_email(f'Sujet {i}', 'Texte', [f'membre{i}@example.com'], html_body='<p>Texte</p>')
+        stats = send_pending()
+        self.assertEqual(stats['sent'], 3)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+        self.assertFalse(OutboundEmail.objects.exclude(status='sent').exists())
+
+    @override_settings(EMAIL_BACKEND='notifications.tests.FailingBackend', EMAIL_OUTBOX_RETRY_DELAY=60)
+    def test_failure_is_retried_with_backoff(self):
+        email = queue_email('Sujet', 'Texte', ['membre@example.com'])
+        with self.assertLogs('notifications.outbox', 'WARNING'):
+            stats = send_pending()
+        self.assertEqual(stats['retried'], 1)
+        email.refresh_from_db()
+        self.assertEqual(email.status, 'pending')
+        self.assertEqual(email.attempts, 1)
+        self.assertIn('SMTP indisponible', email.last_error)
+        self.assertGreater(email.next_attempt_at, timezone.now() + timedelta(seconds=50))
+        # Pas encore dû : rien n'est réservé
+        self.assertEqual(send_pending()['claimed'], 0)
+
+    @override_settings(EMAIL_BACKEND='notifications.tests.FailingBackend')
+    def test_failure_becomes_final_after_max_attempts(self):
+        email = queue_email('Sujet', 'Texte', ['membre@example.com'])
+        OutboundEmail.objects.filter(pk=email.pk).update(attempts=4)
+        with self.assertLogs('notifications.outbox', 'WARNING'):
+            self.assertEqual(send_pending()['failed'], 1)
+        email.refresh_from_db()
+        self.assertEqual(email.status, 'failed')
+
+    def test_stale_sending_rows_are_reclaimed(self):
+        email = queue_email('Sujet', 'Texte', ['membre@example.com'])
+        OutboundEmail.objects.filter(pk=email.pk).update(
+            status='sending', locked_at=timezone.now() - timedelta(hours=1),
+        )
+        self.assertEqual(send_pending()['sent'], 1)
+
+
+@override_settings(EMAIL_OUTBOX_DISPATCH='thread')
+class OutboxWakeTests(TestCase):
+    """Réveils du thread d'envoi : aucune demande perdue, replanifications reprises"""
+
+    def tearDown(self):
+        with outbox._retry_timer_lock:
+            if outbox._retry_timer is not None:
+                outbox._retry_timer.cancel()
+                outbox._retry_timer = None
+
+    def test_wake_during_last_batch_is_not_lost(self):
+        calls = []
+
+        def send_pending_stub():
+            calls.append(1)
+            if len(calls) == 1:
+                # Email mis en file pendant que le thread termine : le verrou est encore tenu
+                outbox.wake_worker()
+            return {'claimed': 0}
+
+        self.assertTrue(outbox._worker_lock.acquire(blocking=False))
+        with mock.patch.object(outbox, 'send_pending', side_effect=send_pending_stub), \
+                mock.patch.object(outbox, '_schedule_retry'):
+            thread = threading.Thread(target=outbox._drain_in_thread)
+            thread.start()
+            thread.join(5)
+        self.assertEqual(len(calls), 2)
+        self.assertFalse(outbox._worker_lock.locked())
+
+    def test_retry_scheduled_for_next_attempt(self):
+        email = queue_email('Sujet', 'Texte', ['membre@example.com'])
+        OutboundEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now() + timedelta(seconds=60))
+        outbox._schedule_retry()
+        self.assertAlmostEqual(outbox._retry_timer.interval, 60, delta=5)
+
+        OutboundEmail.objects.update(status='sent')
+        outbox._schedule_retry()
+        self.assertIsNone(outbox._retry_timer)
+
+
+@override_settings(EMAIL_OUTBOX_DISPATCH='worker', EMAIL_OUTBOX_RATE=0)
+class OutboxCallersTests(TestCase):
+    def test_member_creation_queues_welcome_email(self):
+        Member.objects.create(
+            first_name='Awa', last_name='Moussa', gender='F', date_of_birth='1990-01-01',
+            phone='+22790000001', address='Niamey', email='awa@example.com',
+        )
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertTrue(OutboundEmail.objects.filter(to=['awa@example.com'], status='pending').exists())
+
+    def test_password_reset_queues_code(self):
+        User.objects.create_user(username='awa', email='awa@example.com', password='secret')
+        response = self.client.post(reverse('accounts:password_reset_request'), {'email': 'awa@example.com'})
+        self.assertRedirects(response, reverse('accounts:password_reset_verify'))
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboundEmail.objects.get().subject, "Code de réinitialisation de mot de passe")
@@ -1,17 +1,33 @@
 # settings_app/context_processors.py
 
+from django.utils.functional import SimpleLazyObject, lazy
+
 from .models import ChurchSettings
 
+
 def church_settings(request):
     """
     Ajoute automatiquement les paramètres de l'église (couleurs, logo, etc.)
     dans le contexte de tous les templates.
+
+    Les valeurs sont paresseuses : une page qui ne les affiche pas
+    ne consulte ni le cache ni la base.
     """
-    try:
-        settings = ChurchSettings.objects.first()
-    except ChurchSettings.DoesNotExist:
-        settings = None
+    settings = SimpleLazyObject(ChurchSettings.get_settings)
+
+    def colors():
+        return {
+            'primary': settings.primary_color,
+            'secondary': settings.secondary_color,
+            'accent': settings.accent_color,
+            'success': settings.success_color,
+            'danger': settings.danger_color,
+            'warning': settings.warning_color,
+        }
 
     return {
-        'church_settings': settings
+        'church_settings': settings,
+        'church_name': lazy(lambda: settings.church_name, str)(),
+        'church_logo': SimpleLazyObject(lambda: settings.logo),
+        'church_colors': SimpleLazyObject(colors),
     }
@@ -1,11 +1,23 @@
 """
 Modèles pour les paramètres et personnalisation de l'église
 """
+import copy
+import hashlib
+
 from django.db import models
+from django.template.loader import render_to_string
+from django.utils.functional import cached_property
 from django.core.validators import RegexValidator
-from django.core.cache import cache
 from colorfield.fields import ColorField
 
+from apps import caching
+
+
+SETTINGS_CACHE_NAMESPACE = 'church_settings'
+
+# Cache en mémoire du processus : [version, instance]
+_settings_cache = [None, None]
+
 
 class ChurchSettings(models.Model):
     """
@@ -292,26 +304,54 @@ class ChurchSettings(models.Model):
         
         super().save(*args, **kwargs)
         
-        # Vider le cache après modification
-        cache.delete('church_settings')
+        # La feuille du thème sera recompilée avec les nouvelles couleurs
+        self.__dict__.pop('theme_css', None)
+        self.__dict__.pop('theme_css_hash', None)
+        
+        # Invalider le cache de tous les processus après modification
+        self.invalidate_cache()
+    
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        self.invalidate_cache()
+        return result
+    
+    @classmethod
+    def invalidate_cache(cls):
+        """
+        Change la version partagée : chaque processus rechargera les
+        paramètres au prochain appel de get_settings()
+        """
+        caching.invalidate(SETTINGS_CACHE_NAMESPACE)
     
     @classmethod
     def get_settings(cls):
         """
         Récupérer les paramètres (avec cache)
+        
+        L'instance est gardée en mémoire dans le processus ; seule la version
+        est lue dans le cache partagé pour détecter une modification faite
+        par un autre processus. Une copie est renvoyée pour qu'un formulaire
+        ne modifie pas l'instance partagée.
         """
-        settings = cache.get('church_settings')
+        version = caching.version(SETTINGS_CACHE_NAMESPACE)
         
-        if settings is None:
+        cached_version, settings = _settings_cache
+        if settings is None or cached_version != version:
             settings, created = cls.objects.get_or_create(
                 pk=1,
                 defaults={
                     'church_name': 'Église Manager',
                 }
             )
-            cache.set('church_settings', settings, 3600)  # Cache 1h
+            if created:
+                # La création passe par save() qui a déjà changé la version
+                version = caching.version(SETTINGS_CACHE_NAMESPACE)
+            # Compilée une fois par version : les copies héritent du résultat
+            settings.theme_css_hash
+            _settings_cache[:] = [version, settings]
         
-        return settings
+        return copy.copy(settings)
     
     def get_colors_css(self):
         """
@@ -327,6 +367,20 @@ class ChurchSettings(models.Model):
             --color-warning: {self.warning_color};
         }}
         """
+    
+    @cached_property
+    def theme_css(self):
+        """
+        Feuille de style complète du thème (variables + classes utilitaires)
+        """
+        return render_to_string('settings/theme.css', {'colors_css': self.get_colors_css()})
+    
+    @cached_property
+    def theme_css_hash(self):
+        """
+        Empreinte du contenu, utilisée dans l'URL de la feuille de style
+        """
+        return hashlib.sha256(self.theme_css.encode('utf-8')).hexdigest()[:12]
 
 
 class ThemePreset(models.Model):
@@ -3,7 +3,8 @@ from settings.models import ChurchSettings
 
 register = template.Library()
 
-@register.simple_tag
-def get_church_settings():
+@register.simple_tag(takes_context=True)
+def get_church_settings(context):
     """Charge les paramètres de l'église pour les templates"""
-    return ChurchSettings.get_settings()
+    # Réutilise l'objet du context processor quand il est présent
+    return context.get('church_settings') or ChurchSettings.get_settings()
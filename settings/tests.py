@@ -1,3 +1,385 @@
-from django.test import TestCase
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, connections, transaction
+from django.db.backends.sqlite3.base import DatabaseWrapper as SQLiteDatabaseWrapper
+from django.template import engines
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from apps import caching, database, fanout, ratelimit
+from apps.testing import seed_congregation
+from apps.fragments import fragment_context, fragment_role, fragment_versions
+from apps.instrumentation import TemplateQueryTracker, slow_requests
+from membres.models import Family
+from .context_processors import church_settings
+from .models import ChurchSettings, ThemePreset
+
+
+@override_settings(
+    REQUEST_PROFILING_SAMPLE_RATE=1,
+    MIDDLEWARE=['apps.instrumentation.RequestProfilingMiddleware'] + [
+        m for m in settings.MIDDLEWARE if m != 'apps.instrumentation.RequestProfilingMiddleware'
+    ],
+)
+class RequestProfilingTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='secret', role='admin')
+        self.client.force_login(self.admin)
+        slow_requests.clear()
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('membres:group_list'))
+        header = response['Server-Timing']
+        self.assertIn('total;dur=', header)
+        self.assertIn('sql;dur=', header)
+        self.assertIn('tpl;dur=', header)
+
+    def test_slow_requests_visible_to_admin(self):
+        self.client.get(reverse('membres:group_list'))
+        response = self.client.get(reverse('settings:performance'))
+        self.assertEqual(response.status_code, 200)
+        paths = [entry['path'] for entry in response.context['slow_requests']]
+        self.assertIn(reverse('membres:group_list'), paths)
+
+    def test_buffer_keeps_slowest(self):
+        slow_requests.clear()
+        for total in range(slow_requests.size + 10):
+            slow_requests.add({'total_ms': float(total)})
+        entries = slow_requests.entries()
+        self.assertEqual(len(entries), slow_requests.size)
+        self.assertEqual(entries[0]['total_ms'], float(slow_requests.size + 9))
+
+
+class TemplateQueryTrackerTests(TestCase):
+    def setUp(self):
+        for index in range(3):
+            User.objects.create_user(username=f'u{index}', password='secret')
+        self.template = engines['django'].from_string(
+            '{% for user in users %}{{ user.groups.count }}{% endfor %}'
+        )
+
+    def test_loop_queries_are_reported(self):
+        tracker = TemplateQueryTracker()
+        with connection.execute_wrapper(tracker):
+            self.template.render({'users': User.objects.all()})
+        # 1 requête pour la liste + 3 COUNT, les COUNT répétés sur la même ligne
+        self.assertEqual(tracker.count, 4)
+        self.assertEqual(len(tracker.repeated), 1)
+        origin, sql, count = tracker.repeated[0]
+        self.assertTrue(origin.endswith(':1'))
+        self.assertEqual(count, 3)
+
+    def test_queries_outside_templates_ignored(self):
+        tracker = TemplateQueryTracker()
+        with connection.execute_wrapper(tracker):
+            users = list(User.objects.all())
+            self.template.render({'users': []})
+        self.assertEqual(len(users), 3)
+        self.assertEqual(tracker.count, 0)
+
+
+class SharedCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        caching.metrics.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return self.calls
+
+    def test_value_computed_once(self):
+        self.assertEqual(caching.get_or_set('essai', 'cle', self.compute), 1)
+        self.assertEqual(caching.get_or_set('essai', 'cle', self.compute), 1)
+        self.assertEqual(caching.metrics.get('essai', 'misses'), 1)
+        self.assertEqual(caching.metrics.get('essai', 'hits'), 1)
+
+    def test_invalidate_namespace(self):
+        caching.get_or_set('essai', 'cle', self.compute)
+        caching.get_or_set('autre', 'cle', self.compute)
+        caching.invalidate('essai')
+        self.assertEqual(caching.get_or_set('essai', 'cle', self.compute), 3)
+        self.assertEqual(caching.get_or_set('autre', 'cle', self.compute), 2)
+
+    def test_waits_for_value_computed_by_lock_holder(self):
+        key = caching.make_key('essai', 'cle')
+        cache.add(f'{key}:lock', 1)
+        # Le détenteur du verrou publie la valeur pendant l'attente
+        with mock.patch('apps.caching.time.sleep',
+                        side_effect=lambda seconds: cache.set(key, ('calculée ailleurs', 0.1, 1e12))):
+            self.assertEqual(caching.get_or_set('essai', 'cle', self.compute), 'calculée ailleurs')
+        self.assertEqual(self.calls, 0)
+        self.assertEqual(caching.metrics.get('essai', 'lock_waits'), 1)
+
+    def test_computes_when_lock_holder_is_too_slow(self):
+        cache.add(f"{caching.make_key('essai', 'cle')}:lock", 1)
+        self.assertEqual(caching.get_or_set('essai', 'cle', self.compute, lock_wait=0), 1)
+
+    def test_early_refresh_near_expiry(self):
+        cache.set(caching.make_key('essai', 'cle'), ('ancienne', 10.0, time.time() + 1))
+        # Calcul de 10 s, expiration dans 1 s : recalcul anticipé presque certain
+        with mock.patch('apps.caching.random.random', return_value=0.5):
+            self.assertEqual(caching.get_or_set('essai', 'cle', self.compute), 1)
+        self.assertEqual(caching.metrics.get('essai', 'early_refreshes'), 1)
+
+    def test_backend_failure_falls_back_to_compute(self):
+        with mock.patch('apps.caching.cache.get', side_effect=ConnectionError), \
+                mock.patch('apps.caching.cache.get_many', side_effect=ConnectionError), \
+                mock.patch('apps.caching.cache.add', side_effect=ConnectionError), \
+                mock.patch('apps.caching.cache.set', side_effect=ConnectionError):
+            self.assertEqual(caching.get_or_set('essai', 'cle', self.compute), 1)
+        self.assertGreater(caching.metrics.get('essai', 'errors'), 0)
+
+    def test_metrics_on_performance_page(self):
+        admin = User.objects.create_user(username='admin', password='secret', role='admin')
+        self.client.force_login(admin)
+        caching.get_or_set('essai', 'cle', self.compute)
+        response = self.client.get(reverse('settings:performance'))
+        rows = {row['namespace']: row for row in response.context['cache_metrics']}
+        self.assertEqual(rows['essai']['misses'], 1)
+
+
+class SlidingWindowTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.window = ratelimit.SlidingWindow('essai', limit=3, window=60)
+
+    def test_limit_reached_within_window(self):
+        for _ in range(3):
+            self.assertFalse(self.window.exceeded('cle', now=1000))
+            self.window.hit('cle', now=1000)
+        self.assertTrue(self.window.exceeded('cle', now=1000))
+        self.assertFalse(self.window.exceeded('autre', now=1000))
+
+    def test_previous_window_weighted_by_overlap(self):
+        for _ in range(3):
+            self.window.hit('cle', now=1190)  # fin de la fenêtre [1140, 1200[
+        # 15 s dans la fenêtre suivante : les 3 tentatives comptent encore pour 3/4
+        self.assertEqual(self.window.count('cle', now=1215), 2.25)
+        self.assertFalse(self.window.exceeded('cle', now=1215))
+        self.assertEqual(self.window.count('cle', now=1260), 0)
+
+    def test_reset(self):
+        self.window.hit('cle', now=1000)
+        self.window.reset('cle', now=1000)
+        self.assertEqual(self.window.count('cle', now=1000), 0)
+
+    @override_settings(RATE_LIMITS={'login': {'account': (10, 300)}, 'password_reset': {'account': None}})
+    def test_settings_override_only_given_limits(self):
+        self.assertEqual(ratelimit.limits_for('login'), {'ip': (20, 300), 'account': (10, 300)})
+        self.assertEqual(ratelimit.limits_for('password_reset'), {'ip': (10, 3600)})
+        self.assertEqual(ratelimit.limits_for('password_reset_verify'),
+                         ratelimit.DEFAULT_RATE_LIMITS['password_reset_verify'])
+
+    def test_cache_failure_does_not_block(self):
+        request = RequestFactory().post('/')
+        with mock.patch('apps.ratelimit.cache.get_many', side_effect=ConnectionError):
+            self.assertFalse(ratelimit.is_limited('login', request, account='awa'))
+
+
+class CongregationGeneratorTests(TestCase):
+    def test_real_transaction_saved_after_seeding(self):
+        from finance.models import FinancialTransaction
+
+        seed_congregation(members=20, families=5, groups=2, ministries=2, transactions=500,
+                          events=2, attendances_per_event=5)
+        self.assertFalse(FinancialTransaction.objects.filter(transaction_id__startswith='T').exists())
+        now = timezone.now()
+        transaction_record = FinancialTransaction.objects.create(
+            date=now.date(), transaction_type='offering', amount=1000, payment_method='cash',
+        )
+        self.assertEqual(transaction_record.transaction_id, f'T{now.year}{now.month:02d}0001')
+
+
+class DatabaseSettingsTests(TestCase):
+    def test_sqlite_connections_use_wal(self):
+        with tempfile.TemporaryDirectory() as directory:
+            wrapper = SQLiteDatabaseWrapper(
+                dict(connections.settings['default'], NAME=os.path.join(directory, 'eglise.sqlite3')),
+                alias='wal',
+            )
+            try:
+                with wrapper.cursor() as cursor:
+                    cursor.execute('PRAGMA journal_mode')
+                    self.assertEqual(cursor.fetchone()[0], 'wal')
+            finally:
+                wrapper.close()
+
+    def test_postgres_without_persistent_connections_reported(self):
+        with mock.patch.dict(connections.settings['default'], {
+            'ENGINE': 'django.db.backends.postgresql', 'CONN_MAX_AGE': 0, 'OPTIONS': {},
+        }):
+            ids = [warning.id for warning in database.check_persistent_connections()]
+        self.assertEqual(ids, ['apps.W001'])
+
+
+class FanoutTests(TransactionTestCase):
+    """Requêtes des vues async : en parallèle hors transaction, en séquence dedans"""
+
+    def current_thread(self):
+        return threading.current_thread().name
+
+    def test_fan_out_uses_worker_threads(self):
+        Family.objects.create(name='Famille Garba')
+        names, count = async_to_sync(fanout.gather)(self.current_thread, Family.objects.count)
+        self.assertTrue(names.startswith('fanout'))
+        self.assertEqual(count, 1)
+
+    def test_atomic_block_runs_on_request_connection(self):
+        with transaction.atomic():
+            Family.objects.create(name='Famille Garba')
+            names, count = async_to_sync(fanout.gather)(self.current_thread, Family.objects.count)
+        self.assertEqual(names, self.current_thread())
+        self.assertEqual(count, 1)
+
+    @override_settings(FANOUT_MAX_WORKERS=0)
+    def test_disabled_runs_sequentially(self):
+        names, = async_to_sync(fanout.gather)(self.current_thread)
+        self.assertEqual(names, self.current_thread())
+
+
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.template = engines['django'].from_string(
+            "{% load cache %}{% cache fragments.ttl 'widget' fragments.role fragments.versions.members %}"
+            "{{ content }}{% endcache %}"
+        )
+
+    def render(self, user, content):
+        request = RequestFactory().get('/')
+        request.user = user
+        return self.template.render({'fragments': fragment_context(request, 'members'), 'content': content})
+
+    def test_fragments_separated_by_access(self):
+        treasurer = User.objects.create_user(username='tresorier', password='secret', role='treasurer')
+        secretary = User.objects.create_user(username='secretaire', password='secret', role='secretary')
+        self.assertEqual(fragment_role(treasurer), 'finance')
+        self.assertEqual(fragment_role(secretary), 'membres')
+        self.assertEqual(self.render(treasurer, '1 500 000 FCFA'), '1 500 000 FCFA')
+        self.assertEqual(self.render(secretary, 'sans montants'), 'sans montants')
+        # Même profil : le fragment est réutilisé
+        other_treasurer = User.objects.create_user(username='tresorier2', password='secret', role='treasurer')
+        self.assertEqual(self.render(other_treasurer, 'recalculé'), '1 500 000 FCFA')
+
+    def test_save_changes_only_its_scope(self):
+        before = fragment_versions('members', 'transactions')
+        with self.captureOnCommitCallbacks(execute=True):
+            Family.objects.create(name='Famille Issa')
+        after = fragment_versions('members', 'transactions')
+        self.assertNotEqual(before['members'], after['members'])
+        self.assertEqual(before['transactions'], after['transactions'])
+
+    def test_version_changes_once_on_commit(self):
+        before = fragment_versions('members')
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Family.objects.create(name='Famille Issa')
+            Family.objects.create(name='Famille Moussa')
+            # Pas encore validé : la version n'a pas changé
+            self.assertEqual(fragment_versions('members'), before)
+        self.assertEqual(len(callbacks), 1)
+        self.assertNotEqual(fragment_versions('members'), before)
+
+    def test_rolled_back_save_scheduled_again(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            try:
+                with transaction.atomic():
+                    Family.objects.create(name='Famille annulée')
+                    raise ValueError
+            except ValueError:
+                pass
+            Family.objects.create(name='Famille Issa')
+        self.assertEqual(len(callbacks), 1)
+
+
+class RequestProfilingDisabledTests(TestCase):
+    def test_no_header_when_sampling_off(self):
+        response = self.client.get(reverse('accounts:login'))
+        self.assertNotIn('Server-Timing', response)
+
+
+class ChurchSettingsCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        ChurchSettings.invalidate_cache()
+
+    def test_settings_served_from_process_cache(self):
+        ChurchSettings.get_settings()
+        with self.assertNumQueries(0):
+            ChurchSettings.get_settings()
+
+    def test_save_bumps_version(self):
+        church = ChurchSettings.get_settings()
+        church.church_name = 'Église de Niamey'
+        church.save()
+        self.assertEqual(ChurchSettings.get_settings().church_name, 'Église de Niamey')
+
+    def test_changes_from_another_process(self):
+        ChurchSettings.get_settings()
+        # Un autre processus modifie la base puis change la version partagée
+        ChurchSettings.objects.filter(pk=1).update(church_name='Autre nom')
+        ChurchSettings.invalidate_cache()
+        self.assertEqual(ChurchSettings.get_settings().church_name, 'Autre nom')
+
+    def test_returned_instance_is_a_copy(self):
+        church = ChurchSettings.get_settings()
+        church.church_name = 'Modifié sans sauvegarde'
+        self.assertNotEqual(ChurchSettings.get_settings().church_name, 'Modifié sans sauvegarde')
+
+    def test_apply_theme_refreshes_colors(self):
+        theme = ThemePreset.objects.create(
+            name='Océan', primary_color='#0EA5E9', secondary_color='#0369A1', accent_color='#F97316',
+        )
+        ChurchSettings.get_settings()
+        theme.apply_to_settings()
+        self.assertEqual(ChurchSettings.get_settings().primary_color, '#0EA5E9')
+
+    def test_context_processor_is_lazy(self):
+        ChurchSettings.get_settings()
+        request = RequestFactory().get('/')
+        with self.assertNumQueries(0):
+            context = church_settings(request)
+        ChurchSettings.invalidate_cache()
+        with self.assertNumQueries(1):
+            self.assertEqual(str(context['church_name']), 'Église Manager')
+            self.assertEqual(context['church_colors']['primary'], context['church_settings'].primary_color)
+
+
+class ThemeCssTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        ChurchSettings.invalidate_cache()
+
+    def test_theme_css_served_with_far_future_headers(self):
+        church = ChurchSettings.get_settings()
+        response = self.client.get(reverse('settings:theme_css', args=[church.theme_css_hash]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/css; charset=utf-8')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn(f'--color-primary: {church.primary_color};', response.content.decode())
+
+    def test_hash_changes_with_colors(self):
+        church = ChurchSettings.get_settings()
+        old_hash = church.theme_css_hash
+        church.primary_color = '#111111'
+        church.save()
+        new_hash = ChurchSettings.get_settings().theme_css_hash
+        self.assertNotEqual(old_hash, new_hash)
+
+        response = self.client.get(reverse('settings:theme_css', args=[old_hash]))
+        self.assertRedirects(response, reverse('settings:theme_css', args=[new_hash]))
+
+    def test_base_template_links_hashed_css(self):
+        church = ChurchSettings.get_settings()
+        self.client.force_login(User.objects.create_user(username='admin', password='secret', role='admin'))
+        response = self.client.get(reverse('settings:dashboard'))
+        self.assertContains(response, reverse('settings:theme_css', args=[church.theme_css_hash]))
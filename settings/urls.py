@@ -16,4 +16,10 @@ urlpatterns = [
     
     # Aperçu couleurs
     path('colors/preview/', views.preview_colors, name='color_preview'),
+    
+    # Feuille de style du thème (URL versionnée)
+    path('theme/<slug:css_hash>.css', views.theme_css, name='theme_css'),
+
+    # Performances (requêtes lentes)
+    path('performance/', views.performance_view, name='performance'),
 ]
\ No newline at end of file
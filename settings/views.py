@@ -2,27 +2,23 @@ from venv import logger
 from django.forms import ValidationError
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
+from accounts.permissions import RoleRequiredMixin, require_role
 from django.contrib import messages
 from django.views.generic import UpdateView
-from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.urls import reverse_lazy
 from .models import ChurchSettings, ThemePreset
 from .forms import ChurchSettingsForm
 
 
-class AdminRequiredMixin(UserPassesTestMixin):
+class AdminRequiredMixin(RoleRequiredMixin):
     """Vérifie les droits d'administration"""
-    def test_func(self):
-        return self.request.user.is_authenticated and self.request.user.has_admin_access()
+    required_roles = ('admin',)
+    permission_denied_message = "Accès non autorisé."
 
 
-@login_required
+@require_role('admin', message="Accès non autorisé.")
 def settings_dashboard(request):
     """Tableau de bord des paramètres"""
-    if not request.user.has_admin_access():
-        messages.error(request, "Accès non autorisé.")
-        return redirect('dashboard')
-    
     settings = ChurchSettings.get_settings()
     
     context = {
@@ -31,13 +27,9 @@ def settings_dashboard(request):
     return render(request, 'settings/dashboard.html', context)
 
 
-@login_required
+@require_role('admin', message="Accès non autorisé.")
 def update_settings(request):
     """Mettre à jour les paramètres de l'église"""
-    if not request.user.has_admin_access():
-        messages.error(request, "Accès non autorisé.")
-        return redirect('settings:dashboard')
-    
     settings = ChurchSettings.get_settings()
     
     if request.method == 'POST':
@@ -72,7 +64,8 @@ def update_settings(request):
 
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control
 from .models import ThemePreset, ChurchSettings
 
 @login_required
@@ -85,23 +78,14 @@ def theme_gallery(request):
     return render(request, 'settings/theme_gallery.html', context)
 
 
-@login_required
+@require_role('admin', message="Accès non autorisé.")
 def apply_theme(request, theme_id):
     """Appliquer un thème pré-défini"""
-    if not request.user.has_admin_access():
-        messages.error(request, "Accès non autorisé.")
-        return redirect('settings:dashboard')
-    
     try:
         theme = ThemePreset.objects.get(pk=theme_id)
         if theme.is_active:
-            settings = ChurchSettings.get_settings()
-            settings.primary_color = theme.primary_color
-            settings.secondary_color = theme.secondary_color
-            settings.accent_color = theme.accent_color
-
-            settings.save()
-            cache.delete('church_settings')  # Vide le cache pour refresh immédiat
+            # save() change la version du cache : tous les processus rechargent
+            theme.apply_to_settings()
             messages.success(request, f'✅ Thème "{theme.name}" appliqué ! Rechargez la page pour voir les changements.')
         else:
             messages.error(request, "Ce thème est désactivé.")
@@ -111,13 +95,9 @@ def apply_theme(request, theme_id):
     return redirect('settings:theme_gallery')
 
 
-@login_required
+@require_role('admin', message="Accès non autorisé.")
 def preview_colors(request):
     """Aperçu en temps réel des couleurs"""
-    if not request.user.has_admin_access():
-        messages.error(request, "Accès non autorisé.")
-        return redirect('dashboard')
-    
     settings = ChurchSettings.get_settings()
     
     # Récupérer les couleurs du POST ou utiliser les actuelles
@@ -133,3 +113,42 @@ def preview_colors(request):
     }
     return render(request, 'settings/color_preview.html', context)
 
+
+def theme_css(request, css_hash):
+    """
+    Feuille de style du thème, compilée une fois par version des paramètres.
+    L'URL contient le hash du contenu : le navigateur la garde indéfiniment
+    et ne la recharge qu'après un vrai changement de couleurs.
+    """
+    settings = ChurchSettings.get_settings()
+    if css_hash != settings.theme_css_hash:
+        # Ancienne URL (page en cache) : renvoyer vers la version courante
+        return redirect('settings:theme_css', css_hash=settings.theme_css_hash)
+    
+    response = HttpResponse(settings.theme_css, content_type='text/css; charset=utf-8')
+    patch_cache_control(response, public=True, max_age=60 * 60 * 24 * 365, immutable=True)
+    return response
+
+
+@require_role('admin', message="Accès non autorisé.")
+def performance_view(request):
+    """Requêtes les plus lentes et compteurs du cache de ce processus"""
+    from django.conf import settings as django_settings
+    from apps import caching
+    from apps.instrumentation import slow_requests
+
+    if request.method == 'POST':
+        slow_requests.clear()
+        caching.metrics.clear()
+        messages.success(request, 'Historique des requêtes lentes et compteurs du cache vidés.')
+        return redirect('settings:performance')
+
+    context = {
+        'title': 'Performances',
+        'slow_requests': slow_requests.entries(),
+        'cache_metrics': caching.metrics.snapshot(),
+        'cache_backend': django_settings.CACHES['default']['BACKEND'].rsplit('.', 1)[-1],
+        'sample_rate': django_settings.REQUEST_PROFILING_SAMPLE_RATE,
+        'slow_threshold': django_settings.REQUEST_PROFILING_SLOW_MS,
+    }
+    return render(request, 'settings/performance.html', context)
@@ -0,0 +1,85 @@
+"""
+Vérifications système : aucun gabarit ne doit charger de ressource depuis un CDN.
+Le CSS Tailwind et les bibliothèques front sont produits au build
+(npm run build) et servis localement, y compris sans accès internet.
+
+En déploiement (check --deploy), les fichiers de VENDOR_ASSETS doivent
+exister : sans eux, collectstatic n'inscrit pas leurs entrées au manifeste
+et chaque page échoue au rendu.
+"""
+import re
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.checks import Error, Tags, register
+
+CDN_HOSTS = (
+    'cdn.tailwindcss.com',
+    'cdn.jsdelivr.net',
+    'cdnjs.cloudflare.com',
+    'unpkg.com',
+    'fonts.googleapis.com',
+    'fonts.gstatic.com',
+    'code.jquery.com',
+)
+
+# Copiés de node_modules par scripts/vendor.js (versions fixées dans package.json)
+VENDOR_ASSETS = (
+    'vendor/alpinejs/alpine.min.js',
+    'vendor/chart.js/chart.umd.js',
+    'vendor/fontawesome/css/all.min.css',
+    'vendor/inter/index.css',
+)
+
+CDN_PATTERN = re.compile(
+    r'''(?:src|href)\s*=\s*["']?(?:https?:)?//(%s)|@import\s+url\(\s*["']?(?:https?:)?//(%s)'''
+    % (('|'.join(map(re.escape, CDN_HOSTS)),) * 2),
+    re.IGNORECASE,
+)
+
+
+def template_dirs():
+    dirs = [Path(d) for engine in settings.TEMPLATES for d in engine.get('DIRS', [])]
+    dirs += [Path(app.path) / 'templates' for app in apps.get_app_configs()
+             if not app.name.startswith('django.')]
+    return [d for d in dirs if d.is_dir() and Path(settings.BASE_DIR) in d.resolve().parents]
+
+
+def find_cdn_references(path):
+    """(numéro de ligne, hôte) de chaque ressource CDN référencée par un gabarit"""
+    references = []
+    for number, line in enumerate(Path(path).read_text(encoding='utf-8').splitlines(), 1):
+        match = CDN_PATTERN.search(line)
+        if match:
+            references.append((number, match.group(1) or match.group(2)))
+    return references
+
+
+@register(Tags.templates)
+def check_no_cdn_assets(app_configs=None, **kwargs):
+    errors = []
+    for directory in template_dirs():
+        for path in directory.rglob('*.html'):
+            for number, host in find_cdn_references(path):
+                errors.append(Error(
+                    f"{path.relative_to(settings.BASE_DIR)}:{number} charge une ressource depuis {host}",
+                    hint="Servir le fichier depuis theme/static (npm run build) avec {% static %}.",
+                    obj=str(path),
+                    id='theme.E001',
+                ))
+    return errors
+
+
+@register(Tags.staticfiles, deploy=True)
+def check_vendor_assets(app_configs=None, **kwargs):
+    return [
+        Error(
+            f"Fichier statique absent : {name}",
+            hint="Lancer python manage.py tailwind install puis tailwind build (npm run build).",
+            id='theme.E002',
+        )
+        for name in VENDOR_ASSETS
+        if not finders.find(name)
+    ]
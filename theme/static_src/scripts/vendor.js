@@ -0,0 +1,27 @@
+/**
+ * Copie les bibliothèques front (Alpine.js, Chart.js, Font Awesome, police Inter)
+ * de node_modules vers theme/static/vendor : elles sont servies par WhiteNoise
+ * avec le reste des fichiers statiques, sans CDN.
+ */
+const fs = require("fs");
+const path = require("path");
+
+const modules = path.resolve(__dirname, "../node_modules");
+const vendor = path.resolve(__dirname, "../../static/vendor");
+
+const files = [
+  ["alpinejs/dist/cdn.min.js", "alpinejs/alpine.min.js"],
+  ["chart.js/dist/chart.umd.js", "chart.js/chart.umd.js"],
+  ["@fortawesome/fontawesome-free/css/all.min.css", "fontawesome/css/all.min.css"],
+  ["@fortawesome/fontawesome-free/webfonts", "fontawesome/webfonts"],
+  ["@fontsource-variable/inter/index.css", "inter/index.css"],
+  ["@fontsource-variable/inter/files", "inter/files"],
+];
+
+for (const [source, target] of files) {
+  const from = path.join(modules, source);
+  const to = path.join(vendor, target);
+  fs.mkdirSync(path.dirname(to), { recursive: true });
+  fs.cpSync(from, to, { recursive: true });
+  console.log(`${source} -> static/vendor/${target}`);
+}
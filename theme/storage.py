@@ -0,0 +1,17 @@
+"""
+Stockage des fichiers statiques : noms hachés et compressés par WhiteNoise
+(CompressedManifestStaticFilesStorage) après collectstatic.
+
+Sans manifeste (développement, tests, collectstatic pas encore lancé), les
+URL gardent le nom d'origine au lieu de lever « Missing staticfiles
+manifest entry » sur chaque page. Dès qu'un manifeste existe, un fichier
+absent reste une erreur.
+"""
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+class StaticFilesStorage(CompressedManifestStaticFilesStorage):
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
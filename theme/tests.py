@@ -0,0 +1,58 @@
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from .checks import VENDOR_ASSETS, check_no_cdn_assets, check_vendor_assets, find_cdn_references
+from .storage import StaticFilesStorage
+
+
+class CdnCheckTests(SimpleTestCase):
+    def test_templates_do_not_use_cdns(self):
+        self.assertEqual(check_no_cdn_assets(), [])
+
+    def test_cdn_references_detected(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'page.html'
+            path.write_text(
+                '<script src="https://cdn.tailwindcss.com"></script>\n'
+                '<link href="{% static \'css/dist/styles.css\' %}" rel="stylesheet">\n'
+                '<link rel="stylesheet" href="//cdnjs.cloudflare.com/ajax/libs/font-awesome/all.min.css">\n'
+                '<style>@import url("https://fonts.googleapis.com/css2?family=Inter");</style>\n',
+                encoding='utf-8',
+            )
+            self.assertEqual(find_cdn_references(path), [
+                (1, 'cdn.tailwindcss.com'), (3, 'cdnjs.cloudflare.com'), (4, 'fonts.googleapis.com'),
+            ])
+
+
+class VendorAssetsCheckTests(SimpleTestCase):
+    def test_missing_vendor_files_reported(self):
+        with mock.patch('theme.checks.finders.find', return_value=None):
+            errors = check_vendor_assets()
+        self.assertEqual([error.id for error in errors], ['theme.E002'] * len(VENDOR_ASSETS))
+
+    def test_built_vendor_files_accepted(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for name in VENDOR_ASSETS:
+                path = Path(directory) / name
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_text('', encoding='utf-8')
+            with override_settings(STATICFILES_DIRS=[directory]):
+                self.assertEqual(check_vendor_assets(), [])
+
+
+class StaticFilesStorageTests(SimpleTestCase):
+    def test_unhashed_url_without_manifest(self):
+        with tempfile.TemporaryDirectory() as directory:
+            storage = StaticFilesStorage(location=directory, base_url='/static/')
+            self.assertEqual(storage.url('css/dist/styles.css'), '/static/css/dist/styles.css')
+
+    def test_missing_entry_fails_once_collected(self):
+        with tempfile.TemporaryDirectory() as directory:
+            storage = StaticFilesStorage(location=directory, base_url='/static/')
+            storage.hashed_files = {'css/dist/styles.css': 'css/dist/styles.0123abcd.css'}
+            self.assertEqual(storage.url('css/dist/styles.css'), '/static/css/dist/styles.0123abcd.css')
+            with self.assertRaises(ValueError):
+                storage.url('vendor/absent.js')